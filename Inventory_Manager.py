@@ -3,9 +3,25 @@ import pandas as pd
 import os
 from datetime import datetime
 import random
-import barcode
-from barcode.writer import ImageWriter
 import io
+import hashlib
+from inventory_io import (
+    BASE_DIR, INVENTORY_FOLDER, VISIBLE_FIELDS, clean_nans, force_all_columns_to_string, clean_barcode, format_rrp,
+    list_inventory_files, prepare_for_save,
+)
+from inventory_writer import file_signature, get_writer
+from shared_inventory import get_shared_inventory
+from file_watcher import watch_in_page
+from barcode_images import render_barcode
+from job_runner import DONE, get_job_runner
+from job_panel import show_job
+from inventory_jobs import export_excel, prerender_barcodes, read_upload, reconcile_stock_count
+from audit_log import ChangeSet, get_audit_log, row_record
+from data_quality import key_counts
+from archive_store import DELETED, get_archive_store, legacy_archive_file
+from perf_panel import finish_rerun, start_rerun, timed_dataframe
+
+rerun_started = start_rerun()
 
 # --- Custom CSS for green buttons and narrower textfields ---
 st.markdown("""
@@ -32,34 +48,7 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-def clean_nans(df):
-    return df.replace([pd.NA, 'nan'], '', regex=True)
-
-def force_all_columns_to_string(df):
-    for col in df.columns:
-        df[col] = df[col].astype(str)
-    return df
-
-def clean_barcode(val):
-    if pd.isnull(val) or val == "":
-        return ""
-    s = str(val).strip().replace('\u200b','').replace('\u00A0','')
-    try:
-        f = float(s)
-        s = str(int(f))
-    except ValueError:
-        pass
-    return s
-
-def format_rrp(val):
-    try:
-        f = float(str(val).replace("$", "").strip())
-        return f"${f:.2f}"
-    except Exception:
-        return "$0.00"
-
-INVENTORY_FOLDER = os.path.join(os.path.dirname(__file__), "Inventory")
-inventory_files = [f for f in os.listdir(INVENTORY_FOLDER) if f.lower().endswith(('.xlsx', '.csv'))]
+inventory_files = list_inventory_files()
 
 if not inventory_files:
     st.error("No inventory files found in the 'Inventory' folder.")
@@ -70,49 +59,41 @@ if len(inventory_files) > 1:
     selected_file = st.selectbox("Select inventory file to use:", inventory_files)
 
 INVENTORY_FILE = os.path.join(INVENTORY_FOLDER, selected_file)
-ARCHIVE_FOLDER = INVENTORY_FOLDER
-ARCHIVE_FILE = os.path.join(ARCHIVE_FOLDER, "archive_inventory.xlsx")
 
 st.set_page_config(page_title="Inventory Manager", layout="wide")
 
 def load_inventory():
+    # The process-wide snapshot: every session shares one frame and its display table
     if os.path.exists(INVENTORY_FILE):
-        if INVENTORY_FILE.lower().endswith('.xlsx'):
-            df = pd.read_excel(INVENTORY_FILE)
-        elif INVENTORY_FILE.lower().endswith('.csv'):
-            df = pd.read_csv(INVENTORY_FILE)
-        else:
+        try:
+            return get_shared_inventory().get(INVENTORY_FILE)
+        except ValueError:
             st.error("Unsupported inventory file type.")
             st.stop()
-        df = force_all_columns_to_string(df)
-        df.rename(columns={"FRAME NO.": "FRAMENUM"}, inplace=True)
-        if "BARCODE" in df.columns:
-            df["BARCODE"] = df["BARCODE"].map(clean_barcode)
-            cols = list(df.columns)
-            cols.insert(0, cols.pop(cols.index("BARCODE")))
-            df = df[cols]
-        if "RRP" in df.columns:
-            df["RRP"] = df["RRP"].apply(lambda x: str(x).replace("$", "").strip())
-        return df
     else:
         st.error(f"Inventory file '{INVENTORY_FILE}' not found.")
         st.stop()
 
-def load_archive_inventory():
-    if os.path.exists(ARCHIVE_FILE):
-        df = pd.read_excel(ARCHIVE_FILE)
-        df = force_all_columns_to_string(df)
-        df.rename(columns={"FRAME NO.": "FRAMENUM"}, inplace=True)
-        if "BARCODE" in df.columns:
-            df["BARCODE"] = df["BARCODE"].map(clean_barcode)
-            cols = list(df.columns)
-            cols.insert(0, cols.pop(cols.index("BARCODE")))
-            df = df[cols]
-        if "RRP" in df.columns:
-            df["RRP"] = df["RRP"].apply(lambda x: str(x).replace("$", "").strip())
-        return df
-    else:
-        return pd.DataFrame()
+def save_inventory(mutation, changes=None, after_commit=None):
+    # Queue the change with the shared background writer and wait for it to commit.
+    # Mutations run against the latest committed file, so concurrent sessions don't overwrite each other.
+    # The committed frame is handed to the shared snapshot, so the file is not read back.
+    committed = {}
+    def on_commit(frame):
+        committed["signature"] = file_signature(INVENTORY_FILE)
+        if changes is not None:
+            changes.commit()
+        if after_commit is not None:
+            after_commit()
+    frame = get_writer().apply(INVENTORY_FILE, lambda current: prepare_for_save(mutation(current)), on_commit=on_commit)
+    snapshot = get_shared_inventory().seed(INVENTORY_FILE, frame, committed["signature"])
+    return (snapshot or load_inventory()).frame
+
+def locate_product(current, barcode_val, framecode_val):
+    matches = current.index[(current["BARCODE"] == barcode_val) & (current["FRAMENUM"] == framecode_val)]
+    if len(matches) == 0:
+        raise LookupError("This product was changed or removed by another user. Please try again.")
+    return matches[0]
 
 def generate_unique_barcode(df):
     while True:
@@ -138,16 +119,11 @@ def generate_framecode(supplier, df):
 
 def generate_barcode_image(code):
     try:
-        CODE128 = barcode.get_barcode_class('code128')
         code = str(code)
         if not code:
             st.error("Barcode value cannot be empty.")
             return None
-        my_code = CODE128(code, writer=ImageWriter())
-        buffer = io.BytesIO()
-        my_code.write(buffer, options={"write_text": False})
-        buffer.seek(0)
-        return buffer
+        return io.BytesIO(render_barcode(code, write_text=False))
     except Exception as e:
         st.error(f"Error generating barcode image: {e}")
         return None
@@ -185,12 +161,6 @@ def get_smart_default(header, df):
         return ""
     return ""
 
-VISIBLE_FIELDS = [
-    "BARCODE", "LOCATION", "FRAMENUM", "MANUFACT", "MODEL", "SIZE",
-    "FCOLOUR", "FRAMETYPE", "F GROUP", "SUPPLIER", "QUANTITY", "F TYPE", "TEMPLE",
-    "DEPTH", "DIAG", "BASECURVE", "RRP", "EXCOSTPR", "COST PRICE", "TAXPC",
-    "FRSTATUS", "AVAILFROM", "NOTE"
-]
 FREE_TEXT_FIELDS = [
     "FCOLOUR", "F GROUP", "BASECURVE"
 ]
@@ -221,9 +191,18 @@ if "supplier_for_framecode" not in st.session_state:
     st.session_state["supplier_for_framecode"] = ""
 if "last_deleted_product" not in st.session_state:
     st.session_state["last_deleted_product"] = None
-
-df = load_inventory()
-archive_df = load_archive_inventory()
+if "prefill_values" not in st.session_state:
+    st.session_state["prefill_values"] = {}
+
+# A supplier catalogue match picked on the Stocktake page opens here ready to add
+prefill_product = st.session_state.pop("prefill_product", None)
+if prefill_product:
+    st.session_state["barcode_textinput"] = prefill_product.get("BARCODE", "")
+    st.session_state["supplier_for_framecode"] = prefill_product.get("SUPPLIER", "")
+    st.session_state["prefill_values"] = {k: v for k, v in prefill_product.items() if v}
+    st.session_state["add_product_expanded"] = True
+
+df = load_inventory().frame
 columns = list(df.columns)
 barcode_col = "BARCODE"
 framecode_col = "FRAMENUM"
@@ -276,7 +255,7 @@ with st.expander("➕ Add a New Product", expanded=st.session_state["add_product
         for idx, header in enumerate(row):
             with cols[idx]:
                 unique_key = f"textinput_{header}"
-                smart_suggestion = get_smart_default(header, df)
+                smart_suggestion = st.session_state["prefill_values"].get(header) or get_smart_default(header, df)
                 if header == barcode_col:
                     input_values[header] = st.text_input(
                         "BARCODE", key="barcode_textinput", help="Unique product barcode"
@@ -334,13 +313,13 @@ with st.expander("➕ Add a New Product", expanded=st.session_state["add_product
             missing = [field for field in required_fields if field in visible_headers and not input_values.get(field)]
             barcode_cleaned = clean_barcode(st.session_state["barcode_textinput"])
             framecode_cleaned = clean_barcode(st.session_state["framecode"])
-            df_barcodes_cleaned = df[barcode_col].map(clean_barcode)
-            df_framecodes_cleaned = df[framecode_col].map(clean_barcode)
+            # Cleaned key counts are built once per inventory version, not per submit
+            existing_keys = load_inventory().derived("key_counts", key_counts)
             if missing:
                 st.warning(f"⚠️ {', '.join(missing)} are required.")
-            elif barcode_cleaned in df_barcodes_cleaned.values:
+            elif barcode_cleaned in existing_keys.get(barcode_col, {}):
                 st.error("❌ This barcode already exists in inventory!")
-            elif framecode_cleaned in df_framecodes_cleaned.values:
+            elif framecode_cleaned in existing_keys.get(framecode_col, {}):
                 st.error("❌ This framecode already exists in inventory!")
             else:
                 new_row = {}
@@ -360,73 +339,99 @@ with st.expander("➕ Add a New Product", expanded=st.session_state["add_product
                     new_row[col] = val
                 if "Timestamp" in df.columns:
                     new_row["Timestamp"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df = clean_nans(df)
-                df = force_all_columns_to_string(df)
-                df[barcode_col] = df[barcode_col].map(clean_barcode)
-                if "RRP" in df.columns:
-                    df["RRP"] = df["RRP"].apply(format_rrp)
-                if INVENTORY_FILE.lower().endswith('.xlsx'):
-                    df.to_excel(INVENTORY_FILE, index=False)
-                else:
-                    df.to_csv(INVENTORY_FILE, index=False)
-                st.success(f"✅ Product added successfully!")
+                changes = ChangeSet(INVENTORY_FILE)
+                def add_new_row(current):
+                    # Re-check against the committed file in case another session added it first
+                    if barcode_cleaned in current[barcode_col].map(clean_barcode).values:
+                        raise ValueError("This barcode already exists in inventory!")
+                    if framecode_cleaned in current[framecode_col].map(clean_barcode).values:
+                        raise ValueError("This framecode already exists in inventory!")
+                    updated = pd.concat([current, pd.DataFrame([new_row])], ignore_index=True)
+                    changes.add("add", barcode_cleaned, after=row_record(updated, updated.index[-1]), current=current)
+                    return updated
+                try:
+                    df = save_inventory(add_new_row, changes)
+                    st.session_state["prefill_values"] = {}
+                    st.success(f"✅ Product added successfully!")
+                except (ValueError, OSError, TimeoutError) as e:
+                    st.error(f"❌ {e}")
                 # No auto-clear; user can clear fields manually if needed
 
 # --- The rest of your script (INVENTORY TABLE, DOWNLOADS, EDIT/DELETE, etc.) ---
 
 st.markdown('### Current Inventory')
-df_display = df.copy()
-if "RRP" in df_display.columns:
-    df_display["RRP"] = df_display["RRP"].apply(format_rrp).astype(str)
-if "BARCODE" in df_display.columns:
-    df_display["BARCODE"] = df_display["BARCODE"].map(clean_barcode)
-st.dataframe(clean_nans(df_display), width='stretch')
+inventory = load_inventory()
+df_display = inventory.display()
+
+watch_in_page(INVENTORY_FILE, inventory.version)
+timed_dataframe(df_display, "inventory", width='stretch')
 
 download_date_str = datetime.now().strftime("%Y-%m-%d")
 custom_download_name = f"fil-{selected_file.split('.')[0]}_{download_date_str}-downloaded"
-excel_buffer = io.BytesIO()
-df_display["RRP"] = df_display["RRP"].astype(str)
-clean_nans(df_display).to_excel(excel_buffer, index=False)
-excel_buffer.seek(0)
-st.download_button(
-    label="📄 Download as Excel",
-    data=excel_buffer,
-    file_name=f"{custom_download_name}.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
-st.download_button(
-    label="🗂️ Download as CSV",
-    data=clean_nans(df_display).to_csv(index=False).encode('utf-8'),
-    file_name=f"{custom_download_name}.csv",
-    mime="text/csv"
-)
-
-if not archive_df.empty:
+jobs = get_job_runner()
+# Exports and label sheets run in the background; each is built once per inventory version
+excel_key = ("export_excel", INVENTORY_FILE, inventory.version)
+labels_key = ("barcode_labels", INVENTORY_FILE, inventory.version)
+export_col1, export_col2, export_col3 = st.columns(3)
+with export_col1:
+    if st.button("📄 Prepare Excel Download", key="prepare_excel_btn"):
+        jobs.submit("export", export_excel, df_display, label="Excel export", cache_key=excel_key)
+with export_col2:
+    st.download_button(
+        label="🗂️ Download as CSV",
+        data=inventory.derived("display_csv", lambda frame: inventory.display().to_csv(index=False).encode('utf-8')),
+        file_name=f"{custom_download_name}.csv",
+        mime="text/csv"
+    )
+with export_col3:
+    if st.button("🏷️ Pre-render Barcode Labels", key="prerender_labels_btn"):
+        jobs.submit("barcodes", prerender_barcodes, df_display[barcode_col].tolist(), label="Barcode labels", cache_key=labels_key)
+if jobs.find(excel_key) is not None:
+    show_job(jobs.find(excel_key), "excel_export", f"{custom_download_name}.xlsx",
+             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+if jobs.find(labels_key) is not None:
+    show_job(jobs.find(labels_key), "barcode_labels", f"{custom_download_name}-labels.zip", "application/zip")
+
+archive_store = get_archive_store()
+archive_partitions = archive_store.partitions()
+# The old single-workbook archive, if it is still around; it can be moved into the store
+legacy_archive = legacy_archive_file()
+if not archive_partitions.empty or legacy_archive:
     st.markdown("### Archive Inventory")
-    archive_df_display = archive_df.copy()
-    if "RRP" in archive_df_display.columns:
-        archive_df_display["RRP"] = archive_df_display["RRP"].apply(format_rrp).astype(str)
-    if "BARCODE" in archive_df_display.columns:
-        archive_df_display["BARCODE"] = archive_df_display["BARCODE"].map(clean_barcode)
-    st.dataframe(clean_nans(archive_df_display), width='stretch')
-    archive_download_name = f"fil-archive_{download_date_str}-downloaded"
-    arch_col1, arch_col2 = st.columns([1, 1])
-    with arch_col1:
-        st.download_button(
-            label="📄 Archive Excel",
-            data=open(ARCHIVE_FILE, "rb").read(),
-            file_name=f"{archive_download_name}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    with arch_col2:
-        archive_csv_bytes = clean_nans(archive_df_display).to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="🗂️ Archive CSV",
-            data=archive_csv_bytes,
-            file_name=f"{archive_download_name}.csv",
-            mime="text/csv"
-        )
+    if legacy_archive and st.button(f"📦 Move {os.path.relpath(legacy_archive, BASE_DIR)} into the archive", key="import_archive_btn"):
+        try:
+            _, imported = archive_store.import_legacy()
+            st.success(f"✅ Moved {imported:,} archived products into the archive.")
+            archive_partitions = archive_store.partitions()
+        except (ValueError, OSError) as e:
+            st.error(f"❌ {e}")
+    # Only the partition list is loaded here; rows are read for the months picked below
+    st.caption(f"{archive_store.total_rows():,} deleted and sold-out products, stored by the month they were archived.")
+    st.dataframe(archive_partitions, width='stretch', hide_index=True)
+    arch_col1, arch_col2 = st.columns([2, 1])
+    archive_months = arch_col1.multiselect("Show months", archive_partitions["MONTH"].tolist(), key="archive_months")
+    archive_barcode = arch_col2.text_input("Find barcode", key="archive_barcode")
+    if archive_months or archive_barcode:
+        # A barcode search with no month picked looks through every partition
+        archive_df_display = archive_store.query(archive_months or None, archive_barcode or None)
+        timed_dataframe(archive_df_display, "archive", width='stretch')
+        archive_download_name = f"fil-archive_{download_date_str}-downloaded"
+        archive_key = ("archive_excel", tuple(archive_months), archive_barcode, archive_store.total_rows())
+        arch_col1, arch_col2 = st.columns([1, 1])
+        with arch_col1:
+            if st.button("📄 Prepare Archive Excel", key="prepare_archive_excel_btn"):
+                jobs.submit("export", export_excel, archive_df_display, "Archive", label="Archive export", cache_key=archive_key)
+        with arch_col2:
+            archive_csv_bytes = archive_df_display.to_csv(index=False).encode('utf-8')
+            st.download_button(
+                label="🗂️ Archive CSV",
+                data=archive_csv_bytes,
+                file_name=f"{archive_download_name}.csv",
+                mime="text/csv"
+            )
+        if jobs.find(archive_key) is not None:
+            show_job(jobs.find(archive_key), "archive_excel", f"{archive_download_name}.xlsx",
+                     "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
 with st.expander("✏️ Edit or 🗑 Delete Products", expanded=st.session_state["edit_delete_expanded"]):
     if len(df) > 0:
@@ -518,41 +523,53 @@ with st.expander("✏️ Edit or 🗑 Delete Products", expanded=st.session_stat
                         edit_values["AVAILFROM"] = edit_values["AVAILFROM"].strftime('%Y-%m-%d')
                     edit_barcode_cleaned = clean_barcode(edit_values[barcode_col])
                     edit_framecode_cleaned = clean_barcode(edit_values[framecode_col])
-                    df_barcodes_cleaned = df[barcode_col].map(clean_barcode)
-                    df_framecodes_cleaned = df[framecode_col].map(clean_barcode)
-                    duplicate_barcode = (df_barcodes_cleaned == edit_barcode_cleaned) & (df.index != selected_row)
-                    duplicate_framecode = (df_framecodes_cleaned == edit_framecode_cleaned) & (df.index != selected_row)
-                    if duplicate_barcode.any():
+                    existing_keys = load_inventory().derived("key_counts", key_counts)
+                    def used_elsewhere(col, value):
+                        # The edited row itself accounts for one use of its current value
+                        own = clean_barcode(df.at[selected_row, col]) == value
+                        return existing_keys.get(col, {}).get(value, 0) > (1 if own else 0)
+                    if used_elsewhere(barcode_col, edit_barcode_cleaned):
                         st.error("❌ Another product with this barcode already exists!")
-                    elif duplicate_framecode.any():
+                    elif used_elsewhere(framecode_col, edit_framecode_cleaned):
                         st.error("❌ Another product with this framecode already exists!")
                     else:
-                        for h in headers:
-                            if h in edit_values:
-                                val = edit_values[h]
-                                if h == "AVAILFROM" and isinstance(val, (datetime, pd.Timestamp)):
-                                    val = val.strftime('%Y-%m-%d')
-                                if h == "BARCODE":
-                                    val = clean_barcode(val)
-                                if h == "RRP":
-                                    val = format_rrp(val)
-                                df.at[selected_row, h] = val
-                            else:
-                                df.at[selected_row, h] = ""
-                        if "Timestamp" in df.columns:
-                            df.at[selected_row, "Timestamp"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        df = clean_nans(df)
-                        df = force_all_columns_to_string(df)
-                        df[barcode_col] = df[barcode_col].map(clean_barcode)
-                        if "RRP" in df.columns:
-                            df["RRP"] = df["RRP"].apply(format_rrp)
-                        if INVENTORY_FILE.lower().endswith('.xlsx'):
-                            df.to_excel(INVENTORY_FILE, index=False)
+                        original_barcode = df.at[selected_row, barcode_col]
+                        original_framecode = df.at[selected_row, framecode_col]
+                        changes = ChangeSet(INVENTORY_FILE)
+                        def apply_edit(current):
+                            row = locate_product(current, original_barcode, original_framecode)
+                            others = current.index != row
+                            if ((current[barcode_col].map(clean_barcode) == edit_barcode_cleaned) & others).any():
+                                raise ValueError("Another product with this barcode already exists!")
+                            if ((current[framecode_col].map(clean_barcode) == edit_framecode_cleaned) & others).any():
+                                raise ValueError("Another product with this framecode already exists!")
+                            before = row_record(current, row)
+                            baseline = current
+                            current = current.copy()
+                            for h in headers:
+                                if h in edit_values:
+                                    val = edit_values[h]
+                                    if h == "AVAILFROM" and isinstance(val, (datetime, pd.Timestamp)):
+                                        val = val.strftime('%Y-%m-%d')
+                                    if h == "BARCODE":
+                                        val = clean_barcode(val)
+                                    if h == "RRP":
+                                        val = format_rrp(val)
+                                    current.at[row, h] = val
+                                else:
+                                    current.at[row, h] = ""
+                            if "Timestamp" in current.columns:
+                                current.at[row, "Timestamp"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                            changes.add("edit", original_barcode, before=before, after=row_record(current, row), current=baseline)
+                            return current
+                        try:
+                            df = save_inventory(apply_edit, changes)
+                        except (ValueError, LookupError, OSError, TimeoutError) as e:
+                            st.error(f"❌ {e}")
                         else:
-                            df.to_csv(INVENTORY_FILE, index=False)
-                        st.success("✅ Product updated successfully!")
-                        st.session_state["edit_delete_expanded"] = True
-                        st.rerun()
+                            st.success("✅ Product updated successfully!")
+                            st.session_state["edit_delete_expanded"] = True
+                            st.rerun()
                 if submit_delete:
                     st.session_state["pending_delete_index"] = selected_row
 
@@ -564,17 +581,24 @@ if st.session_state.get("pending_delete_index") is not None:
     confirm_col, cancel_col = st.columns(2)
     with confirm_col:
         if st.button("Confirm Delete", key="confirm_delete_btn"):
-            df = df.drop(st.session_state["pending_delete_index"]).reset_index(drop=True)
-            df = clean_nans(df)
-            df = force_all_columns_to_string(df)
-            df[barcode_col] = df[barcode_col].map(clean_barcode)
-            if "RRP" in df.columns:
-                df["RRP"] = df["RRP"].apply(format_rrp)
-            if INVENTORY_FILE.lower().endswith('.xlsx'):
-                df.to_excel(INVENTORY_FILE, index=False)
-            else:
-                df.to_csv(INVENTORY_FILE, index=False)
-            st.success("✅ Product deleted successfully!")
+            delete_index = st.session_state["pending_delete_index"]
+            original_barcode = df.at[delete_index, barcode_col]
+            original_framecode = df.at[delete_index, framecode_col]
+            changes = ChangeSet(INVENTORY_FILE)
+            def apply_delete(current):
+                row = locate_product(current, original_barcode, original_framecode)
+                changes.add("delete", original_barcode, before=row_record(current, row), current=current)
+                deleted.append(current.loc[[row]])
+                return current.drop(row).reset_index(drop=True)
+            deleted = []
+            try:
+                # Archived only once the delete has committed, with the rest of the writer's flush
+                df = save_inventory(
+                    apply_delete, changes, after_commit=lambda: get_archive_store().queue(deleted[-1], DELETED, INVENTORY_FILE)
+                )
+                st.success("✅ Product deleted and moved to the archive.")
+            except (LookupError, OSError, TimeoutError) as e:
+                st.error(f"❌ {e}")
             st.session_state["edit_product_index"] = None
             st.session_state["edit_delete_expanded"] = True
             st.session_state["pending_delete_index"] = None
@@ -583,55 +607,85 @@ if st.session_state.get("pending_delete_index") is not None:
         if st.button("Cancel", key="cancel_delete_btn"):
             st.session_state["pending_delete_index"] = None
 
+with st.expander("🕘 Change History"):
+    audit = get_audit_log()
+    history_page_size = 50
+    history_col1, history_col2 = st.columns(2)
+    history_barcode = history_col1.text_input("Filter by barcode", key="history_barcode")
+    history_page = history_col2.number_input("Page", min_value=1, value=1, step=1, key="history_page")
+    history, history_total = audit.query(
+        file=INVENTORY_FILE,
+        barcode=clean_barcode(history_barcode) or None,
+        page=history_page - 1,
+        page_size=history_page_size,
+    )
+    st.caption(f"{history_total} recorded changes · page {history_page} of {max(1, -(-history_total // history_page_size))}")
+    st.dataframe(history, width='stretch', hide_index=True)
+    st.markdown("**Rebuild the inventory as it was at:**")
+    rebuild_col1, rebuild_col2 = st.columns(2)
+    rebuild_date = rebuild_col1.date_input("Date", value=datetime.now().date(), key="history_rebuild_date")
+    rebuild_time = rebuild_col2.time_input("Time", value=datetime.now().time(), key="history_rebuild_time")
+    if st.button("Rebuild Inventory", key="history_rebuild_btn"):
+        try:
+            past_df = audit.reconstruct(INVENTORY_FILE, datetime.combine(rebuild_date, rebuild_time))
+        except LookupError as e:
+            st.warning(f"⚠️ {e}")
+        else:
+            st.dataframe(clean_nans(past_df), width='stretch')
+            st.download_button(
+                label="🗂️ Download Rebuilt Inventory (CSV)",
+                data=past_df.to_csv(index=False).encode('utf-8'),
+                file_name=f"fil-{selected_file.split('.')[0]}_{rebuild_date}-rebuilt.csv",
+                mime="text/csv"
+            )
+
 with st.expander("📦 Stock Count"):
     st.write("Upload a file (CSV, Excel, or TXT) of scanned barcodes from your stock count.")
     uploaded_file = st.file_uploader("Upload scanned barcodes", type=["csv", "xlsx", "txt"])
     if uploaded_file is not None:
-        try:
-            if uploaded_file.name.endswith(".csv"):
-                scanned_df = pd.read_csv(uploaded_file)
-            elif uploaded_file.name.endswith(".xlsx"):
-                scanned_df = pd.read_excel(uploaded_file)
-            elif uploaded_file.name.endswith(".txt"):
-                scanned_df = pd.read_csv(uploaded_file, delimiter=None)
-            else:
-                st.error("❌ Unsupported file type.")
-                scanned_df = None
-        except Exception as e:
-            st.error(f"❌ Error reading file: {e}")
-            scanned_df = None
-
-        if scanned_df is not None:
-            scanned_df = force_all_columns_to_string(scanned_df)
-            scanned_df[barcode_col] = scanned_df[barcode_col].map(clean_barcode)
-            st.write("Preview of your uploaded file:")
-            st.dataframe(clean_nans(scanned_df.head()), width='stretch')
-            barcode_candidates = [
-                col for col in scanned_df.columns
-                if "barcode" in col.lower() or "ean" in col.lower() or "upc" in col.lower() or "code" in col.lower()
-            ]
-            if not barcode_candidates:
-                barcode_candidates = scanned_df.columns.tolist()
-            barcode_column = st.selectbox(
-                "Select the column containing barcodes", barcode_candidates
+        upload_data = uploaded_file.getvalue()
+        upload_digest = hashlib.sha1(upload_data).hexdigest()
+        if not uploaded_file.name.lower().endswith((".csv", ".xlsx", ".txt")):
+            st.error("❌ Unsupported file type.")
+        else:
+            read_job = show_job(
+                jobs.submit("import", read_upload, upload_data, uploaded_file.name,
+                            label=f"Reading {uploaded_file.name}", cache_key=("read_upload", upload_digest)),
+                "stock_count_read",
             )
-            inventory_barcodes = set(df[barcode_col].map(clean_barcode))
-            scanned_barcodes = set(scanned_df[barcode_column].map(clean_barcode))
-            matched = inventory_barcodes & scanned_barcodes
-            missing = inventory_barcodes - scanned_barcodes
-            unexpected = scanned_barcodes - inventory_barcodes
-            st.success(f"✅ Matched items: {len(matched)}")
-            st.warning(f"⚠️ Missing items: {len(missing)}")
-            st.error(f"❌ Unexpected items: {len(unexpected)}")
-            if matched:
-                st.write("✅ Present items:")
-                st.dataframe(clean_nans(df[df[barcode_col].map(clean_barcode).isin(matched)]), width='stretch')
-            if missing:
-                st.write("❌ Missing items:")
-                st.dataframe(clean_nans(df[df[barcode_col].map(clean_barcode).isin(missing)]), width='stretch')
-            if unexpected:
-                st.write("⚠️ Unexpected items (not in system):")
-                st.write(list(unexpected))
+            if read_job is not None and read_job.status == DONE:
+                scanned_df = read_job.result
+                st.write("Preview of your uploaded file:")
+                st.dataframe(scanned_df.head(), width='stretch')
+                barcode_candidates = [
+                    col for col in scanned_df.columns
+                    if "barcode" in col.lower() or "ean" in col.lower() or "upc" in col.lower() or "code" in col.lower()
+                ]
+                if not barcode_candidates:
+                    barcode_candidates = scanned_df.columns.tolist()
+                barcode_column = st.selectbox(
+                    "Select the column containing barcodes", barcode_candidates
+                )
+                reconcile_job = show_job(
+                    jobs.submit("reconcile", reconcile_stock_count, inventory.frame, barcode_col, scanned_df, barcode_column,
+                                label="Stock count reconciliation",
+                                cache_key=("reconcile", upload_digest, barcode_column, INVENTORY_FILE, inventory.version)),
+                    "stock_count_reconcile",
+                )
+                if reconcile_job is not None and reconcile_job.status == DONE:
+                    counted = reconcile_job.result
+                    st.success(f"✅ Matched items: {counted['matched_count']}")
+                    st.warning(f"⚠️ Missing items: {counted['missing_count']}")
+                    st.error(f"❌ Unexpected items: {len(counted['unexpected'])}")
+                    if not counted["matched"].empty:
+                        st.write("✅ Present items:")
+                        st.dataframe(counted["matched"], width='stretch')
+                    if not counted["missing"].empty:
+                        st.write("❌ Missing items:")
+                        st.dataframe(counted["missing"], width='stretch')
+                    if counted["unexpected"]:
+                        st.write("⚠️ Unexpected items (not in system):")
+                        st.write(counted["unexpected"])
 
 with st.expander("🔍 Quick Stock Check (Scan Barcode)"):
     st.write("Place your cursor below, scan a barcode, and instantly see product details!")
@@ -677,3 +731,5 @@ with st.expander("🔍 Quick Stock Check (Scan Barcode)"):
             st.markdown('</div></div>', unsafe_allow_html=True)
         else:
             st.error("❌ Barcode not found in inventory.")
+
+finish_rerun("inventory_manager", rerun_started)
@@ -0,0 +1,348 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from inventory_io import BASE_DIR, INVENTORY_FOLDER, clean_barcode, prepare_for_save, read_table
+from inventory_writer import atomic_write, file_lock, get_writer
+from perf_metrics import span
+
+# Rows that leave the inventory (deleted, sold out) are kept here instead of being
+# dropped. The store is a folder of compressed Parquet files partitioned by the month
+# they were archived in. A small JSON manifest lists the partitions with their row
+# counts, so the app can show what is in the archive without opening it and a query
+# only reads the months it asks for.
+#
+# Rows are queued when the inventory write that removes them commits, and everything
+# queued for a file is written as one part when the writer's flush finishes, so a
+# write the writer skips or fails never archives anything. Once a month has more than
+# COMPACT_AFTER parts they are merged into one in the background.
+ARCHIVE_FOLDER = os.path.join(BASE_DIR, "archive")
+MANIFEST_NAME = "_partitions.json"
+COMPRESSION = "zstd"
+ARCHIVE_FIELDS = ["ARCHIVED_AT", "REASON", "SOURCE"]
+DELETED = "deleted"
+SOLD_OUT = "sold out"
+COMPACT_AFTER = 16
+# The old single-workbook archive, next to the app or in the inventory folder
+LEGACY_ARCHIVE_NAME = "archive_inventory.xlsx"
+LEGACY_ARCHIVE_FILES = [os.path.join(BASE_DIR, LEGACY_ARCHIVE_NAME), os.path.join(INVENTORY_FOLDER, LEGACY_ARCHIVE_NAME)]
+
+log = logging.getLogger(__name__)
+
+def legacy_archive_file():
+    return next((path for path in LEGACY_ARCHIVE_FILES if os.path.exists(path)), None)
+
+def part_name(month):
+    return f"month={month}/part-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+
+
+class ArchiveStore:
+    def __init__(self, folder=ARCHIVE_FOLDER):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, MANIFEST_NAME)
+        self._manifest = None
+        self._manifest_signature = None
+        self._lock = threading.Lock()
+        self._queued = {}
+        self._queue_lock = threading.Lock()
+        self._compact_pending = set()
+        self._compactor = None
+
+    # --- Manifest ---
+    def _signature(self):
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_manifest(self):
+        # Cached until another process or thread rewrites it
+        signature = self._signature()
+        with self._lock:
+            if self._manifest is None or signature != self._manifest_signature:
+                if signature is None:
+                    self._manifest = {"partitions": {}}
+                else:
+                    with open(self.manifest_path, encoding="utf-8") as f:
+                        self._manifest = json.load(f)
+                self._manifest_signature = signature
+            return self._manifest
+
+    def _copy_manifest(self):
+        manifest = self._read_manifest()
+        return {"partitions": {m: list(files) for m, files in manifest["partitions"].items()}}
+
+    def _write_manifest(self, manifest):
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=1)
+        atomic_write(self.manifest_path, write)
+
+    def rebuild_manifest(self):
+        # From the Parquet footers alone, e.g. after copying partitions in by hand
+        os.makedirs(self.folder, exist_ok=True)
+        with file_lock(self.manifest_path):
+            manifest = {"partitions": {}}
+            for entry in sorted(os.listdir(self.folder)):
+                if not entry.startswith("month="):
+                    continue
+                month = entry[len("month="):]
+                for name in sorted(os.listdir(os.path.join(self.folder, entry))):
+                    if name.endswith(".parquet"):
+                        path = os.path.join(self.folder, entry, name)
+                        manifest["partitions"].setdefault(month, []).append({
+                            "file": f"{entry}/{name}",
+                            "rows": pq.read_metadata(path).num_rows,
+                            "bytes": os.path.getsize(path),
+                            "ts": os.path.getmtime(path),
+                            "reasons": {},
+                        })
+            self._write_manifest(manifest)
+        return manifest
+
+    # --- Writing ---
+    def _stamp(self, rows, reason, source=None, ts=None):
+        stamp = datetime.fromtimestamp(ts or time.time())
+        frame = prepare_for_save(rows.copy()).reset_index(drop=True)
+        frame["ARCHIVED_AT"] = stamp.strftime("%Y-%m-%d %H:%M:%S")
+        frame["REASON"] = reason
+        frame["SOURCE"] = os.path.basename(source) if source else ""
+        return frame
+
+    def _write_part(self, month, frame):
+        relative = part_name(month)
+        path = os.path.join(self.folder, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(frame.fillna("").astype(str), preserve_index=False)
+        atomic_write(path, lambda tmp_path: pq.write_table(table, tmp_path, compression=COMPRESSION))
+        return {"file": relative, "rows": len(frame), "bytes": os.path.getsize(path), "ts": time.time()}
+
+    def _write_parts(self, frame):
+        # One new part per archive month in `frame`, then one manifest update
+        with span("archive_append"):
+            written = {}
+            for month, rows in frame.groupby(frame["ARCHIVED_AT"].str[:7], sort=True):
+                written[month] = self._write_part(month, rows)
+                written[month]["reasons"] = {str(k): int(v) for k, v in rows["REASON"].value_counts().items()}
+            with file_lock(self.manifest_path):
+                manifest = self._copy_manifest()
+                for month, part in written.items():
+                    manifest["partitions"].setdefault(month, []).append(part)
+                self._write_manifest(manifest)
+        crowded = [month for month, files in manifest["partitions"].items() if len(files) > COMPACT_AFTER]
+        if crowded:
+            self._compact_soon(crowded)
+        return len(frame)
+
+    def append(self, rows, reason, source=None, ts=None):
+        # Written straight away as its own part; returns rows archived
+        if rows is None or rows.empty:
+            return 0
+        return self._write_parts(self._stamp(rows, reason, source, ts))
+
+    def queue(self, rows, reason, source):
+        # For a writer on_commit: the rows have left `source` and are written with
+        # everything else archived in the same flush
+        if rows is None or rows.empty:
+            return
+        with self._queue_lock:
+            self._queued.setdefault(os.path.abspath(source), []).append(self._stamp(rows, reason, source))
+
+    def committed(self, path, frame):
+        # Writer commit listener; runs once per flush of `path`
+        key = os.path.abspath(path)
+        with self._queue_lock:
+            frames = self._queued.pop(key, None)
+        if not frames:
+            return
+        try:
+            self._write_parts(pd.concat(frames, ignore_index=True))
+        except (OSError, pa.ArrowException) as e:
+            # Kept for the next flush of this file
+            log.warning("Archiving %d rows from %s failed: %s", sum(len(f) for f in frames), path, e)
+            with self._queue_lock:
+                self._queued[key] = frames + self._queued.get(key, [])
+
+    def import_workbook(self, path, reason="imported"):
+        # Brings an old archive_inventory.xlsx (or .csv) into the store as one part
+        frame = read_table(path)
+        frame.rename(columns={"FRAME NO.": "FRAMENUM"}, inplace=True)
+        return self.append(frame, reason, source=path)
+
+    def import_legacy(self):
+        # Moves the old archive workbook in, if there is one; returns (path, rows)
+        path = legacy_archive_file()
+        if path is None:
+            return None, 0
+        imported = self.import_workbook(path)
+        os.replace(path, path + ".imported")
+        return path, imported
+
+    # --- Compaction ---
+    def _compact_soon(self, months):
+        with self._queue_lock:
+            self._compact_pending.update(months)
+            if self._compactor is not None:
+                return
+            self._compactor = threading.Thread(target=self._run_compaction, name="archive-compact", daemon=True)
+            self._compactor.start()
+
+    def _run_compaction(self):
+        while True:
+            with self._queue_lock:
+                if not self._compact_pending:
+                    self._compactor = None
+                    return
+                month = self._compact_pending.pop()
+            try:
+                self.compact(month)
+            except (OSError, pa.ArrowException) as e:
+                log.warning("Compacting archive month %s failed: %s", month, e)
+
+    def compact(self, month):
+        # Merges a month's parts into one. The merged part is written before the manifest
+        # swaps it in and the old parts are removed after, so a reader always finds every
+        # row exactly once. Returns the number of parts merged.
+        parts = list(self._read_manifest()["partitions"].get(month, []))
+        if len(parts) < 2:
+            return 0
+        with span("archive_compact"):
+            frames = [pq.read_table(os.path.join(self.folder, part["file"])).to_pandas() for part in parts]
+            merged = self._write_part(month, pd.concat(frames, ignore_index=True))
+            merged["ts"] = max(part["ts"] for part in parts)
+            merged["reasons"] = {}
+            for part in parts:
+                for reason, count in part.get("reasons", {}).items():
+                    merged["reasons"][reason] = merged["reasons"].get(reason, 0) + count
+            merged_files = {part["file"] for part in parts}
+            with file_lock(self.manifest_path):
+                manifest = self._copy_manifest()
+                current = manifest["partitions"].get(month, [])
+                if not merged_files <= {part["file"] for part in current}:
+                    os.remove(os.path.join(self.folder, merged["file"]))  # compacted elsewhere meanwhile
+                    return 0
+                manifest["partitions"][month] = [merged] + [part for part in current if part["file"] not in merged_files]
+                self._write_manifest(manifest)
+            for name in merged_files:
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except FileNotFoundError:
+                    pass
+        return len(parts)
+
+    # --- Reading ---
+    def partitions(self):
+        # Metadata only; no partition file is opened
+        rows = []
+        for month, files in self._read_manifest()["partitions"].items():
+            reasons = {}
+            for part in files:
+                for reason, count in part.get("reasons", {}).items():
+                    reasons[reason] = reasons.get(reason, 0) + count
+            rows.append({
+                "MONTH": month,
+                "ROWS": sum(part["rows"] for part in files),
+                "FILES": len(files),
+                "SIZE KB": round(sum(part["bytes"] for part in files) / 1024, 1),
+                "LAST ARCHIVED": datetime.fromtimestamp(max(part["ts"] for part in files)).strftime('%Y-%m-%d %H:%M'),
+                "REASONS": ", ".join(f"{reason} {count:,}" for reason, count in sorted(reasons.items())),
+            })
+        columns = ["MONTH", "ROWS", "FILES", "SIZE KB", "LAST ARCHIVED", "REASONS"]
+        return pd.DataFrame(rows, columns=columns).sort_values("MONTH", ascending=False, ignore_index=True)
+
+    def total_rows(self):
+        return sum(part["rows"] for files in self._read_manifest()["partitions"].values() for part in files)
+
+    def _read_parts(self, partitions, months, filters):
+        # None when a part has gone since the manifest was read
+        frames = []
+        for month in months:
+            for part in partitions[month]:
+                try:
+                    table = pq.read_table(os.path.join(self.folder, part["file"]), filters=filters or None)
+                except FileNotFoundError:
+                    return None
+                except pa.ArrowInvalid:
+                    continue  # no such column to filter on
+                if table.num_rows:
+                    frames.append(table.to_pandas())
+        return frames
+
+    def query(self, months=None, barcode=None, reason=None):
+        # Reads only the partitions for `months` (all when None); the barcode and reason
+        # filters are pushed down into the Parquet reader
+        filters = []
+        if barcode:
+            filters.append(("BARCODE", "=", clean_barcode(barcode)))
+        if reason:
+            filters.append(("REASON", "=", reason))
+        frames = []
+        with span("archive_query"):
+            for _ in range(3):
+                # Retried when compaction merged a part away while it was being read
+                partitions = self._read_manifest()["partitions"]
+                selected = sorted(partitions) if months is None else [m for m in sorted(months) if m in partitions]
+                frames = self._read_parts(partitions, selected, filters)
+                if frames is not None:
+                    break
+        if not frames:
+            return pd.DataFrame(columns=["BARCODE"] + ARCHIVE_FIELDS)
+        result = pd.concat(frames, ignore_index=True).fillna("")
+        cols = list(result.columns)
+        for field in reversed(ARCHIVE_FIELDS):
+            cols.insert(0, cols.pop(cols.index(field)))
+        return result[cols].sort_values("ARCHIVED_AT", ascending=False, ignore_index=True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_archive_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArchiveStore()
+            get_writer().add_commit_listener(_store.committed)
+    return _store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or fill the partitioned inventory archive.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show the partitions")
+    show = sub.add_parser("show", help="Print archived rows")
+    show.add_argument("--month", nargs="+")
+    show.add_argument("--barcode")
+    imp = sub.add_parser("import", help="Add an old archive workbook to the store")
+    imp.add_argument("path", nargs="?", help="Defaults to archive_inventory.xlsx next to the app or in Inventory/")
+    compact = sub.add_parser("compact", help="Merge each month's files into one")
+    compact.add_argument("--month", nargs="+")
+    sub.add_parser("rebuild", help="Rebuild the partition list from the files")
+    args = parser.parse_args()
+
+    store = get_archive_store()
+    if args.command == "import":
+        if args.path:
+            print(f"Archived {store.import_workbook(args.path):,} rows from {args.path}")
+        else:
+            path, imported = store.import_legacy()
+            print(f"Archived {imported:,} rows from {path}" if path else "No archive_inventory.xlsx found.")
+    elif args.command == "compact":
+        for month in args.month or sorted(store.partitions()["MONTH"]):
+            print(f"{month}: merged {store.compact(month)} files")
+    elif args.command == "rebuild":
+        store.rebuild_manifest()
+    if args.command == "show":
+        print(store.query(args.month, args.barcode).to_string(index=False))
+    else:
+        print(store.partitions().to_string(index=False))
@@ -0,0 +1,449 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import pandas as pd
+
+from inventory_io import state_path, prepare_for_save
+from inventory_writer import get_writer
+
+AUDIT_DB_NAME = "audit_log.db"
+SNAPSHOT_EVERY = 500      # changes per file between full snapshots
+BATCH_LATENCY = 0.25      # seconds a record may wait before being written
+BATCH_SIZE = 1000
+KEY_SEPARATOR = "\x1f"
+RETRY_DELAYS = [0.5, 1, 2, 5, 10, 30]  # seconds between attempts while the database refuses writes
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    file TEXT NOT NULL,
+    action TEXT NOT NULL,
+    barcode TEXT,
+    diff TEXT NOT NULL,
+    batch TEXT,
+    framenum TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_file_id ON changes (file, id);
+CREATE INDEX IF NOT EXISTS changes_file_ts ON changes (file, ts);
+CREATE INDEX IF NOT EXISTS changes_barcode ON changes (barcode);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    file TEXT NOT NULL,
+    change_id INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_file_ts ON snapshots (file, ts);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    file TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    description TEXT,
+    rows INTEGER
+);
+CREATE INDEX IF NOT EXISTS batches_file_ts ON batches (file, ts);
+"""
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    columns = [col[1] for col in conn.execute("PRAGMA table_info(changes)")]
+    # Logs written before these columns existed; their rows replay by barcode alone
+    if "batch" not in columns:
+        conn.execute("ALTER TABLE changes ADD COLUMN batch TEXT")
+    if "framenum" not in columns:
+        conn.execute("ALTER TABLE changes ADD COLUMN framenum TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS changes_batch ON changes (batch)")
+    if "rows" not in [col[1] for col in conn.execute("PRAGMA table_info(batches)")]:
+        conn.execute("ALTER TABLE batches ADD COLUMN rows INTEGER")
+    return conn
+
+# --- Row diffs ---
+def row_record(frame, row):
+    # Row as it is stored on disk, so before/after values compare like for like
+    return prepare_for_save(frame.loc[[row]].copy()).iloc[0].to_dict()
+
+def field_diff(before, after):
+    before = before or {}
+    after = after or {}
+    diff = {}
+    for field in list(before) + [f for f in after if f not in before]:
+        old = before.get(field)
+        new = after.get(field)
+        if (old or "") != (new or ""):
+            diff[field] = [old, new]
+    return diff
+
+def find_rows(frame, barcode, framenum=None):
+    # Same key as Inventory_Manager.locate_product: barcode plus framecode, so duplicated
+    # or empty barcodes still find the right row. Records without a framecode fall back
+    # to the barcode alone.
+    if "BARCODE" not in frame.columns:
+        return frame.index[:0]
+    match = frame["BARCODE"] == (barcode or "")
+    if framenum is not None and "FRAMENUM" in frame.columns:
+        match &= frame["FRAMENUM"] == framenum
+    return frame.index[match]
+
+def row_keys(frame):
+    # Barcode and framecode as one string per row, the key bulk records match on
+    framenums = frame["FRAMENUM"] if "FRAMENUM" in frame.columns else pd.Series("", index=frame.index)
+    return frame["BARCODE"].fillna("").astype(str) + KEY_SEPARATOR + framenums.fillna("").astype(str)
+
+def is_bulk(diff):
+    return any(isinstance(values, dict) for values in diff.values())
+
+def describe_diff(diff):
+    return "; ".join(
+        f"{field}: {len(values['barcode']):,} rows" if isinstance(values, dict)
+        else f"{field}: {values[0] or ''} → {values[1] or ''}"
+        for field, values in diff.items()
+    )
+
+def bulk_keys(change):
+    return [f"{b}{KEY_SEPARATOR}{f}" for b, f in zip(change["barcode"], change["framenum"])]
+
+def apply_bulk_change(frame, diff, action=None):
+    # {field: {"barcode": [...], "framenum": [...], "before": [...], "after": [...]}}, set
+    # with column operations. Like a single change, only the first row with a key is set,
+    # or for a bulk delete, dropped.
+    keys = row_keys(frame)
+    first = ~keys.duplicated()
+    if action == "delete":
+        gone = set().union(*(bulk_keys(change) for change in diff.values()))
+        return frame[~(first & keys.isin(gone))].reset_index(drop=True)
+    frame = frame.copy()
+    for field, change in diff.items():
+        lookup = dict(zip(bulk_keys(change), change["after"]))
+        values = keys.map(lookup).where(first)
+        hit = values.notna()
+        if field not in frame.columns:
+            frame[field] = ""
+        frame.loc[hit, field] = values[hit]
+    return frame
+
+def apply_change(frame, action, barcode, diff, framenum=None):
+    if is_bulk(diff):
+        return apply_bulk_change(frame, diff, action)
+    if action == "add":
+        row = {field: values[1] for field, values in diff.items()}
+        return pd.concat([frame, pd.DataFrame([row])], ignore_index=True).fillna("")
+    matches = find_rows(frame, barcode, framenum)
+    if len(matches) == 0:
+        return frame
+    if action == "delete":
+        return frame.drop(matches[0]).reset_index(drop=True)
+    frame = frame.copy()
+    for field, values in diff.items():
+        if field not in frame.columns:
+            frame[field] = ""
+        frame.at[matches[0], field] = "" if values[1] is None else values[1]
+    return frame
+
+def encode_frame(frame):
+    return zlib.compress(frame.to_json(orient="split", index=False).encode("utf-8"))
+
+def decode_frame(data):
+    payload = json.loads(zlib.decompress(data).decode("utf-8"))
+    # Blanks as "", the form row_record gives, so replayed keys compare like for like
+    return pd.DataFrame(payload["data"], columns=payload["columns"], dtype=str).fillna("")
+
+
+class ChangeSet:
+    # Collects change records inside a writer mutation. They are only queued for the
+    # audit log once the writer reports the mutation as committed. Bulk changes pass a
+    # batch (id, kind, description) so they can be listed and undone as one.
+    def __init__(self, file, audit=None, batch=None):
+        self.file = os.path.abspath(file)
+        self.audit = audit or get_audit_log()
+        self.batch = batch
+        self.records = []
+        self.rows = 0
+        self.baseline = None
+        self.baseline_ts = None
+
+    def _keep_baseline(self, current):
+        if current is not None and self.baseline is None and not self.audit.has_baseline(self.file):
+            self.baseline = current
+            self.baseline_ts = time.time()
+
+    def add(self, action, barcode, before=None, after=None, current=None, framenum=None):
+        # `framenum` is the row's framecode before the change; taken from `before` (or
+        # `after` for adds) when the caller does not pass it
+        self._keep_baseline(current)
+        diff = field_diff(before, after)
+        if action == "edit" and not diff:
+            return
+        if framenum is None:
+            framenum = (before or after or {}).get("FRAMENUM")
+        batch_id = self.batch[0] if self.batch else None
+        self.records.append((time.time(), self.file, action, barcode, json.dumps(diff, default=str), batch_id, framenum))
+        self.rows += 1
+
+    def add_bulk(self, action, field, barcodes, framenums, before, after, current=None):
+        # One record for a change to one field on many rows, replayed with column operations.
+        # With action "delete" the rows are removed; `field` then records their last value.
+        self._keep_baseline(current)
+        diff = {field: {"barcode": list(barcodes), "framenum": list(framenums), "before": list(before), "after": list(after)}}
+        if not diff[field]["barcode"]:
+            return
+        batch_id = self.batch[0] if self.batch else None
+        self.records.append((time.time(), self.file, action, None, json.dumps(diff, default=str), batch_id, None))
+        self.rows += len(diff[field]["barcode"])
+
+    def commit(self, frame=None):
+        if self.baseline is not None:
+            self.audit.snapshot(self.file, self.baseline, ts=self.baseline_ts)
+        if self.batch and self.records:
+            self.audit.record_batch(self.batch[0], self.file, self.batch[1], self.batch[2], self.rows)
+        self.audit.record_many(self.records)
+
+
+class AuditLog:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or state_path(AUDIT_DB_NAME)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._baselines = set()
+        self._pending = {}  # file -> changes since last snapshot
+        self._last_change = {}  # file -> id of the last change this log wrote for it
+        with connect(self.db_path) as conn:
+            for (file,) in conn.execute("SELECT DISTINCT file FROM snapshots"):
+                self._baselines.add(file)
+        conn.close()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+                self._thread.start()
+
+    def has_baseline(self, file):
+        return os.path.abspath(file) in self._baselines
+
+    def record_many(self, records):
+        for record in records:
+            self._queue.put(("change", record))
+        self._ensure_started()
+
+    def record_batch(self, batch_id, file, kind, description, rows=None):
+        self._queue.put(("batch", (batch_id, time.time(), os.path.abspath(file), kind, description, rows)))
+        self._ensure_started()
+
+    def snapshot(self, file, frame, ts=None):
+        self._baselines.add(os.path.abspath(file))
+        self._queue.put(("snapshot", (os.path.abspath(file), frame, ts)))
+        self._ensure_started()
+
+    def checkpoint(self, file, frame):
+        # Writer commit listener: snapshot the committed frame once enough changes have piled up
+        self._queue.put(("checkpoint", (os.path.abspath(file), frame)))
+        self._ensure_started()
+
+    def flush(self, timeout=30):
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        self._ensure_started()
+        done.wait(timeout)
+
+    def _collect(self, batch):
+        deadline = time.monotonic() + BATCH_LATENCY
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = None
+        failed = []  # records from a batch the database refused, retried ahead of new ones
+        attempt = 0
+        while True:
+            batch = self._collect(failed or [self._queue.get()])
+            records = [item for item in batch if item[0] != "flush"]
+            waiters = [payload for kind, payload in batch if kind == "flush"]
+            try:
+                if conn is None:
+                    conn = connect(self.db_path)
+                self._write(conn, records)
+            except sqlite3.Error as e:
+                # Nothing is dropped: the batch stays queued and is retried with a growing
+                # delay. Flush waiters are released so the UI never blocks on the log.
+                delay = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)]
+                log.warning("Audit log write of %d records failed (%s); retrying in %ss", len(records), e, delay)
+                failed = records
+                attempt += 1
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                for done in waiters:
+                    done.set()
+                time.sleep(delay)
+                continue
+            failed = []
+            attempt = 0
+            for done in waiters:
+                done.set()
+
+    def _write(self, conn, records):
+        # One transaction; snapshot bookkeeping is only kept once it has committed
+        pending = dict(self._pending)
+        last_change = dict(self._last_change)
+        with conn:
+            for kind, payload in records:
+                if kind == "change":
+                    cursor = conn.execute(
+                        "INSERT INTO changes (ts, file, action, barcode, diff, batch, framenum) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        payload,
+                    )
+                    pending[payload[1]] = pending.get(payload[1], 0) + 1
+                    last_change[payload[1]] = cursor.lastrowid
+                elif kind == "batch":
+                    conn.execute(
+                        "INSERT OR IGNORE INTO batches (id, ts, file, kind, description, rows) VALUES (?, ?, ?, ?, ?, ?)", payload
+                    )
+                elif kind == "snapshot":
+                    self._write_snapshot(conn, pending, last_change, *payload)
+                elif kind == "checkpoint":
+                    file, frame = payload
+                    if pending.get(file, 0) >= SNAPSHOT_EVERY:
+                        self._write_snapshot(conn, pending, last_change, file, frame)
+        self._pending = pending
+        self._last_change = last_change
+
+    def _write_snapshot(self, conn, pending, last_change, file, frame, ts=None):
+        # Baselines can arrive as loaded (RRP 12.50, blanks missing); stored as saved, the
+        # form row_record gives changes in, so replay compares like for like
+        frame = prepare_for_save(frame)
+        # The frame covers the changes queued ahead of it here, and no more: another
+        # process's changes logged since are replayed on top. Until this log has written
+        # a change for the file, everything logged so far is taken as covered.
+        change_id = last_change.get(file)
+        if change_id is None:
+            change_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM changes WHERE file = ?", (file,)).fetchone()[0]
+        conn.execute(
+            "INSERT INTO snapshots (ts, file, change_id, data) VALUES (?, ?, ?, ?)",
+            (ts or time.time(), file, change_id, encode_frame(frame)),
+        )
+        pending[file] = 0
+        last_change[file] = change_id
+
+    # --- Queries ---
+    def query(self, file=None, barcode=None, action=None, page=0, page_size=50):
+        clauses, params = [], []
+        if file:
+            clauses.append("file = ?")
+            params.append(os.path.abspath(file))
+        if barcode:
+            clauses.append("barcode = ?")
+            params.append(barcode)
+        if action:
+            clauses.append("action = ?")
+            params.append(action)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = connect(self.db_path)
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM changes {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT id, ts, file, action, barcode, diff FROM changes {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                params + [page_size, page * page_size],
+            ).fetchall()
+        finally:
+            conn.close()
+        history = pd.DataFrame(rows, columns=["id", "timestamp", "file", "action", "barcode", "changes"])
+        history["timestamp"] = history["timestamp"].map(lambda ts: datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'))
+        history["file"] = history["file"].map(os.path.basename)
+        history["barcode"] = history["barcode"].fillna("")  # bulk records cover many barcodes
+        history["changes"] = history["changes"].map(lambda d: describe_diff(json.loads(d)))
+        return history, total
+
+    def batches(self, file, kind=None, limit=20):
+        clauses, params = ["b.file = ?"], [os.path.abspath(file)]
+        if kind:
+            clauses.append("b.kind = ?")
+            params.append(kind)
+        conn = connect(self.db_path)
+        try:
+            rows = conn.execute(
+                f"SELECT b.id, b.ts, b.kind, b.description, COALESCE(b.rows, COUNT(c.id)) FROM batches b "
+                f"LEFT JOIN changes c ON c.batch = b.id WHERE {' AND '.join(clauses)} "
+                f"GROUP BY b.id ORDER BY b.ts DESC LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        finally:
+            conn.close()
+        batches = pd.DataFrame(rows, columns=["id", "timestamp", "kind", "description", "changes"])
+        batches["timestamp"] = batches["timestamp"].map(lambda ts: datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'))
+        return batches
+
+    def batch_changes(self, batch_id):
+        # (barcode, framenum, diff) for every change recorded under one batch, in order;
+        # a bulk record has no barcode and a diff for many rows
+        conn = connect(self.db_path)
+        try:
+            rows = conn.execute(
+                "SELECT barcode, framenum, diff FROM changes WHERE batch = ? ORDER BY id", (batch_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [(barcode, framenum, json.loads(diff)) for barcode, framenum, diff in rows]
+
+    def reconstruct(self, file, at):
+        # Latest snapshot at or before `at`, then replay only the changes recorded after it
+        file = os.path.abspath(file)
+        at_ts = at.timestamp() if isinstance(at, datetime) else float(at)
+        conn = connect(self.db_path)
+        try:
+            snap = conn.execute(
+                "SELECT change_id, data FROM snapshots WHERE file = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+                (file, at_ts),
+            ).fetchone()
+            if snap is None:
+                raise LookupError("No audit history exists for this file before that time.")
+            frame = decode_frame(snap[1])
+            changes = conn.execute(
+                "SELECT action, barcode, diff, framenum FROM changes WHERE file = ? AND id > ? AND ts <= ? ORDER BY id",
+                (file, snap[0], at_ts),
+            )
+            for action, barcode, diff, framenum in changes:
+                frame = apply_change(frame, action, barcode, json.loads(diff), framenum)
+        finally:
+            conn.close()
+        return frame
+
+
+_audit_log = None
+_audit_lock = threading.Lock()
+
+def get_audit_log():
+    global _audit_log
+    with _audit_lock:
+        if _audit_log is None:
+            _audit_log = AuditLog()
+            get_writer().add_commit_listener(_audit_log.checkpoint)
+            atexit.register(_flush_at_exit)
+    return _audit_log
+
+def _flush_at_exit():
+    # Pending writes queue their audit records on commit, so drain the writer first
+    get_writer().flush()
+    _audit_log.flush()
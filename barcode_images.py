@@ -0,0 +1,36 @@
+import collections
+import io
+import threading
+
+from perf_metrics import span
+
+CACHE_SIZE = 5000
+
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+def render_barcode(code, write_text=True):
+    # Code128 PNG bytes, kept in a bounded LRU so labels that were pre-rendered are instant
+    key = (str(code), write_text)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    if not key[0]:
+        raise ValueError("Barcode value cannot be empty.")
+    # python-barcode pulls in PIL; imported on first render so page startup doesn't pay for it
+    import barcode
+    from barcode.writer import ImageWriter
+    buffer = io.BytesIO()
+    with span("render_barcode"):
+        barcode.get_barcode_class('code128')(key[0], writer=ImageWriter()).write(buffer, options={"write_text": write_text})
+    png = buffer.getvalue()
+    with _cache_lock:
+        _cache[key] = png
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return png
+
+def is_rendered(code, write_text=True):
+    return (str(code), write_text) in _cache
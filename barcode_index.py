@@ -0,0 +1,203 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+from inventory_io import clean_barcode, clean_barcode_series
+from inventory_writer import atomic_write, file_lock, file_signature
+
+# On-disk layout (little endian), one file so it can be swapped with a single os.replace:
+#   header   MAGIC, count, source mtime_ns, source size, fields length
+#   fields   JSON list of column names
+#   keys     count x int64, sorted
+#   offsets  (count + 1) x int64 into the records block
+#   records  JSON arrays of row values, packed back to back
+MAGIC = b"BCIDX002"  # 002: text barcode keys stored exactly; older files are rebuilt
+HEADER = struct.Struct("<8sqqqq")
+
+def barcode_key(code):
+    # Numeric barcodes map to themselves; anything else to a negative 63-bit hash
+    if code.isascii() and code.isdigit() and len(code) < 19:
+        return int(code)
+    digest = hashlib.blake2b(code.encode("utf-8"), digest_size=8).digest()
+    return -(int.from_bytes(digest, "little") >> 1) - 1
+
+def barcode_keys(codes):
+    # Filled as a numpy array: assigning hashes through a Series went via float64 and
+    # lost their low bits, so text barcodes were never found
+    numeric = codes.str.fullmatch(r"[0-9]{1,18}").fillna(False).to_numpy(dtype=bool)
+    keys = np.zeros(len(codes), dtype=np.int64)
+    keys[numeric] = codes[numeric].astype("int64").to_numpy()
+    keys[~numeric] = np.fromiter((barcode_key(code) for code in codes[~numeric]), dtype=np.int64, count=int((~numeric).sum()))
+    return keys
+
+def json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def find_barcode_column(columns):
+    for idx, header in enumerate(columns):
+        if str(header).lower() == "barcode":
+            return idx
+    return None
+
+def barcode_matches(value, code, text=None):
+    # With `text`, the stored barcode must read exactly as scanned ("00123" is not
+    # "123"); otherwise both sides are compared after clean_barcode
+    if text is not None:
+        return str(value).strip() == text
+    return clean_barcode(value) == code
+
+def build_index(frame, index_path, source_signature=None):
+    col = find_barcode_column(frame.columns)
+    if col is None:
+        raise ValueError("Inventory has no barcode column to index.")
+    codes = clean_barcode_series(frame.iloc[:, col])
+    present = codes.ne("").to_numpy()
+    frame, codes = frame[present], codes[present]
+    keys = barcode_keys(codes)
+    order = np.argsort(keys, kind="stable")
+    values = frame.astype(object).where(frame.notna(), None).to_numpy()[order]
+    records = [json.dumps(row, default=json_default, separators=(",", ":")).encode("utf-8") for row in values.tolist()]
+    offsets = np.zeros(len(records) + 1, dtype="<i8")
+    offsets[1:] = np.cumsum([len(r) for r in records])
+    fields = json.dumps([str(c) for c in frame.columns]).encode("utf-8")
+    mtime_ns, size = source_signature or (0, 0)
+
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(records), mtime_ns, size, len(fields)))
+            f.write(fields)
+            f.write(b"\0" * (-f.tell() % 8))  # keep the int64 arrays aligned
+            f.write(keys[order].astype("<i8").tobytes())
+            f.write(offsets.tobytes())
+            f.write(b"".join(records))
+    atomic_write(index_path, write)
+
+
+class BarcodeIndex:
+    # Read-only view of an index file. Every process maps the same pages, so the
+    # lookup table costs next to nothing per worker.
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._identity = None
+        self._view = None
+        self.count = 0
+
+    def _open(self):
+        st = os.stat(self.index_path)
+        identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if identity == self._identity:
+            return
+        f = open(self.index_path, "rb")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, mtime_ns, size, fields_len = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            data.close()
+            f.close()
+            raise ValueError(f"{self.index_path} is not a barcode index.")
+        f.close()  # the mapping keeps its own reference to the file
+        pos = HEADER.size
+        fields = json.loads(data[pos:pos + fields_len])
+        pos += fields_len
+        pos += -pos % 8
+        keys = np.frombuffer(data, dtype="<i8", count=count, offset=pos)
+        pos += count * 8
+        offsets = np.frombuffer(data, dtype="<i8", count=count + 1, offset=pos)
+        # Swapped in one assignment; lookups already holding the old view keep a valid mapping
+        previous, self._view = self._view, (fields, find_barcode_column(fields), keys, offsets, data, pos + (count + 1) * 8)
+        self.count = count
+        self.source_signature = (mtime_ns, size)
+        self._identity = identity
+        if previous is not None:
+            old_data = previous[4]
+            previous = None  # drops the old key and offset arrays, which pin the mapping
+            try:
+                old_data.close()
+            except BufferError:
+                pass  # a lookup is still reading it; it is unmapped when that lookup lets go
+
+    def refresh(self):
+        with self._lock:
+            self._open()
+
+    def lookup(self, barcode, exact=False):
+        # Candidates come from the cleaned key either way; `exact` only narrows the match
+        code = clean_barcode(barcode)
+        text = str(barcode).strip() if exact else None
+        if not code:
+            return None
+        key = barcode_key(code)
+        fields, barcode_col, keys, offsets, data, start = self._view
+        lo = int(np.searchsorted(keys, key, side="left"))
+        hi = int(np.searchsorted(keys, key, side="right"))
+        for i in range(lo, hi):
+            row = json.loads(data[start + int(offsets[i]):start + int(offsets[i + 1])])
+            if barcode_matches(row[barcode_col], code, text):
+                return dict(zip(fields, row))
+        return None
+
+    def lookup_many(self, barcodes, exact=False):
+        # Batch form of lookup: one view and one vectorised search for the whole list.
+        # Batches are small, so keys are computed in Python rather than through pandas.
+        codes = [clean_barcode(b) for b in barcodes]
+        texts = [str(b).strip() if exact else None for b in barcodes]
+        results = [None] * len(codes)
+        positions = [pos for pos, code in enumerate(codes) if code]
+        if not positions:
+            return results
+        fields, barcode_col, keys, offsets, data, start = self._view
+        wanted = np.fromiter((barcode_key(codes[pos]) for pos in positions), dtype="<i8", count=len(positions))
+        los = np.searchsorted(keys, wanted, side="left").tolist()
+        his = np.searchsorted(keys, wanted, side="right").tolist()
+        for pos, lo, hi in zip(positions, los, his):
+            for i in range(lo, hi):
+                row = json.loads(data[start + int(offsets[i]):start + int(offsets[i + 1])])
+                if barcode_matches(row[barcode_col], codes[pos], texts[pos]):
+                    results[pos] = dict(zip(fields, row))
+                    break
+        return results
+
+def index_path_for(source_path):
+    folder, name = os.path.split(os.path.abspath(source_path))
+    return os.path.join(folder, f".{name}.barcodes.idx")
+
+def ensure_index(source_path, loader, index_path=None):
+    # Rebuild when the source file changed; the lock makes sure only one worker builds
+    index_path = index_path or index_path_for(source_path)
+    signature = file_signature(source_path)
+
+    def current():
+        if not os.path.exists(index_path):
+            return False
+        with open(index_path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return False
+        magic, _, mtime_ns, size, _ = HEADER.unpack(header)
+        return magic == MAGIC and (mtime_ns, size) == signature
+
+    if not current():
+        with file_lock(index_path):
+            if not current():
+                build_index(loader(source_path), index_path, signature)
+    return index_path
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_barcode_index(source_path, loader):
+    index_path = ensure_index(source_path, loader)
+    with _indexes_lock:
+        index = _indexes.get(index_path)
+        if index is None:
+            index = _indexes[index_path] = BarcodeIndex(index_path)
+    index.refresh()
+    return index
@@ -1,12 +1,36 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-import openpyxl
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, g
+import gzip
+import json
 import os
+import pandas as pd
+import threading
+import time
+from datetime import datetime
+
+from barcode_index import get_barcode_index
+from file_watcher import get_file_watcher
+from inventory_io import (
+    INVENTORY_FOLDER, SCANNED_FILE, UNFOUND_FILE, clean_barcode, list_inventory_files,
+    read_scanned_frame, read_unfound_frame,
+)
+from inventory_writer import get_writer
+from perf_metrics import get_metrics, load_published, prometheus_text, span
+from sales_ingest import get_sales_ingestor
+from stock_analytics import get_stock_analytics
+from sync_feed import get_sync_feed
 
 app = Flask(__name__)
 
 EXCEL_PATH = 'inventory.xlsx'
+MAX_BATCH = 1000
+
+# Keyed by path: (watcher data version, value). Refreshed only when the version moves.
+_indexes = {}
+_feed_versions = {}
+_warm = {"state": "cold", "seconds": None, "error": None}
 
 def get_inventory_headers(excel_path=EXCEL_PATH):
+    import openpyxl  # pandas loads it anyway once the workbook is read; not needed to start serving
     if not os.path.exists(excel_path):
         wb = openpyxl.Workbook()
         ws = wb.active
@@ -19,21 +43,78 @@ def get_inventory_headers(excel_path=EXCEL_PATH):
     headers = [cell.value for cell in next(ws.iter_rows(max_row=1))]
     return headers
 
+def read_inventory_workbook(excel_path):
+    return pd.read_excel(excel_path, dtype=object)
+
+def current_index(excel_path=EXCEL_PATH):
+    # The shared memory-mapped index, rebuilt once each time the workbook changes
+    if not os.path.exists(excel_path):
+        get_inventory_headers(excel_path)
+    version = get_file_watcher().version(excel_path)
+    cached = _indexes.get(excel_path)
+    if cached is None or cached[0] != version:
+        cached = _indexes[excel_path] = (version, get_barcode_index(excel_path, read_inventory_workbook))
+    return cached[1]
+
 def find_product_by_barcode(barcode, excel_path=EXCEL_PATH):
-    wb = openpyxl.load_workbook(excel_path)
-    ws = wb.active
-    headers = [cell.value for cell in next(ws.iter_rows(max_row=1))]
-    barcode_column = None
-    for idx, header in enumerate(headers):
-        if str(header).lower() == "barcode":
-            barcode_column = idx
-            break
-    if barcode_column is None:
+    # Matches the barcode cell's text exactly, as scanned ("00123" does not find "123")
+    try:
+        index = current_index(excel_path)
+    except ValueError:
         return None
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        if str(row[barcode_column]).strip() == str(barcode).strip():
-            return dict(zip(headers, row))
-    return None
+    with span("barcode_lookup"):
+        return index.lookup(barcode, exact=True)
+
+def find_products_by_barcodes(barcodes, excel_path=EXCEL_PATH):
+    try:
+        index = current_index(excel_path)
+    except ValueError:
+        return [None] * len(barcodes)
+    with span("barcode_lookup_batch"):
+        return index.lookup_many(barcodes, exact=True)
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None and request.endpoint not in (None, "metrics", "healthz", "static"):
+        get_metrics().observe(f"http {request.endpoint}", time.perf_counter() - started)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text: this server's spans plus whatever the Streamlit process last published
+    spans = {"barcode_server": get_metrics().snapshot(), "streamlit": load_published("streamlit")}
+    writer = get_writer().metrics()
+    gauges = {
+        "inventory_writer_queue_depth": writer["queue_depth"],
+        "inventory_writer_last_flush_ms": writer["last_flush_ms"],
+    }
+    counters = {
+        "inventory_writer_flushes_total": writer["flushes"],
+        "inventory_writer_mutations_total": writer["mutations"],
+        "inventory_writer_failed_mutations_total": writer["failed_mutations"],
+    }
+    return Response(prometheus_text(spans, gauges, counters), mimetype="text/plain; version=0.0.4")
+
+def warm_index(excel_path=EXCEL_PATH):
+    # Builds (or maps) the barcode index before the first scanner asks for it
+    _warm["state"] = "warming"
+    started = time.perf_counter()
+    try:
+        current_index(excel_path)
+        _warm["state"] = "ready"
+    except Exception as e:
+        _warm["state"], _warm["error"] = "failed", str(e)
+    _warm["seconds"] = time.perf_counter() - started
+
+@app.route('/healthz')
+def healthz():
+    # Liveness is the 200 itself; "index" says whether lookups are served warm yet
+    return jsonify({"status": "ok", "index": _warm["state"], "index_seconds": _warm["seconds"], "error": _warm["error"]})
 
 @app.route('/scan')
 def scan():
@@ -49,6 +130,113 @@ def save_barcode():
     else:
         return jsonify({"error": "Barcode not found in inventory."})
 
+@app.route('/lookup_batch', methods=['POST'])
+def lookup_batch():
+    # Many barcodes in one round trip, answered in request order
+    data = request.get_json(silent=True) or {}
+    barcodes = data.get("barcodes", [])
+    if not isinstance(barcodes, list):
+        return jsonify({"error": "'barcodes' must be a list."}), 400
+    if len(barcodes) > MAX_BATCH:
+        return jsonify({"error": f"At most {MAX_BATCH} barcodes per request."}), 400
+    products = find_products_by_barcodes([str(b) for b in barcodes])
+    return jsonify({"results": [
+        {"barcode": barcode, "fields": product} if product else {"barcode": barcode, "error": "Barcode not found in inventory."}
+        for barcode, product in zip(barcodes, products)
+    ]})
+
+@app.route('/sync')
+def sync():
+    # Change feed for offline scanners: only rows changed or deleted after `since`
+    since = request.args.get('since', 0, type=int)
+    feed = get_sync_feed()
+    if not os.path.exists(EXCEL_PATH):
+        get_inventory_headers(EXCEL_PATH)
+    data_version = get_file_watcher().version(EXCEL_PATH)
+    cached = _feed_versions.get(EXCEL_PATH)
+    if cached is None or cached[0] != data_version:
+        cached = _feed_versions[EXCEL_PATH] = (data_version, feed.refresh(EXCEL_PATH, read_inventory_workbook))
+    version = cached[1]
+    etag = f'"{version}"'
+    if since == version and request.if_none_match.contains(str(version)):
+        return Response(status=304, headers={"ETag": etag})
+    body = json.dumps(feed.changes_since(EXCEL_PATH, since)).encode("utf-8")
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype="application/json", headers=headers)
+
+@app.route('/sync/scans', methods=['POST'])
+def upload_scans():
+    # Bulk upload of scans queued while a handheld was offline
+    data = request.get_json(silent=True) or {}
+    scans = data.get("scans", [])
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    found, unfound = [], []
+    queued = []
+    for scan_item in scans:
+        code = clean_barcode(scan_item.get("barcode") if isinstance(scan_item, dict) else scan_item)
+        if code:
+            queued.append((code, scan_item.get("timestamp", now) if isinstance(scan_item, dict) else now))
+    for (code, timestamp), product in zip(queued, find_products_by_barcodes([code for code, _ in queued])):
+        if product:
+            found.append(code)
+        else:
+            unfound.append({"barcode": code, "timestamp": timestamp})
+    writer = get_writer()
+    tickets = []
+    if found:
+        def add_scanned(current):
+            existing = current["barcode"].astype(str).tolist()
+            seen = set(existing)
+            new = [code for code in dict.fromkeys(found) if code not in seen]
+            return pd.DataFrame({"barcode": existing + new})
+        tickets.append(writer.submit(SCANNED_FILE, add_scanned, loader=read_scanned_frame))
+    if unfound:
+        tickets.append(writer.submit(
+            UNFOUND_FILE,
+            lambda current: pd.concat([current, pd.DataFrame(unfound)], ignore_index=True),
+            loader=read_unfound_frame,
+        ))
+    try:
+        for ticket in tickets:
+            ticket.wait()
+    except (OSError, TimeoutError) as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({"received": len(scans), "found": len(found), "unfound": len(unfound)})
+
+def resolve_inventory_file(name):
+    # Only files inside the Inventory folder can be targeted
+    if not name:
+        return None
+    name = os.path.basename(name)
+    if name not in list_inventory_files():
+        raise ValueError(f"Unknown inventory file '{name}'.")
+    return os.path.join(INVENTORY_FOLDER, name)
+
+@app.route('/sales', methods=['POST'])
+def ingest_sales():
+    key = request.headers.get('Idempotency-Key')
+    ingestor = get_sales_ingestor()
+    try:
+        inventory_file = resolve_inventory_file(request.args.get('file'))
+        if 'file' in request.files:
+            upload = request.files['file']
+            result = ingestor.ingest_bytes(upload.read(), upload.filename, key, inventory_file)
+        elif request.is_json:
+            data = request.get_json()
+            records = data.get("lines", []) if isinstance(data, dict) else data
+            result = ingestor.ingest_records(records, key, inventory_file)
+        else:
+            result = ingestor.ingest_bytes(request.get_data(), "sales.csv", key, inventory_file)
+    except TimeoutError as e:
+        # The batch may still commit; retrying with the same key is safe
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
 # Updated route: Guide the user to use the Streamlit app for adding products
 @app.route('/add_product_page', methods=['GET'])
 def add_product_page():
@@ -65,4 +253,6 @@ def add_product_page():
     """
 
 if __name__ == '__main__':
+    threading.Thread(target=warm_index, name="index-warmup", daemon=True).start()
+    get_stock_analytics()  # sales and scans committed here keep the analytics totals current
     app.run(port=5001)
\ No newline at end of file
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory_io import VISIBLE_FIELDS
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# (manufacturer, supplier, model prefix, GS1 company prefix, RRP range)
+BRANDS = [
+    ("RAY-BAN", "LUXOTTICA", "RB", "8056597", (189, 329)),
+    ("OAKLEY", "LUXOTTICA", "OX", "0888392", (219, 399)),
+    ("PRADA", "LUXOTTICA", "VPR", "8056597", (399, 649)),
+    ("VOGUE", "LUXOTTICA", "VO", "8056597", (149, 249)),
+    ("GUCCI", "KERING EYEWEAR", "GG", "8895482", (449, 799)),
+    ("SAINT LAURENT", "KERING EYEWEAR", "SL", "8895482", (429, 749)),
+    ("TOM FORD", "MARCOLIN", "FT", "8897618", (459, 699)),
+    ("GUESS", "MARCOLIN", "GU", "8897618", (159, 259)),
+    ("SILHOUETTE", "SILHOUETTE", "SIL", "9004192", (399, 699)),
+    ("LINDBERG", "LINDBERG", "LB", "5709301", (699, 1199)),
+    ("OROTON", "SPECTACULAR EYEWEAR", "OR", "9351234", (199, 329)),
+    ("HUMMINGBIRD", "HUMMINGBIRD", "HB", "9312345", (99, 179)),
+]
+BRAND_WEIGHTS = np.array([18, 10, 6, 8, 5, 3, 4, 6, 4, 2, 7, 9], dtype=float)
+COLOURS = ["BLACK", "TORTOISE", "HAVANA", "GOLD", "SILVER", "GUNMETAL", "CRYSTAL", "NAVY", "BURGUNDY", "ROSE GOLD"]
+FRAMETYPES = ["MEN", "WOMEN", "KIDS", "UNISEX"]
+F_GROUPS = ["OPTICAL", "SUN", "SPORT", "READERS"]
+FRSTATUS = ["CONSIGNMENT OWNED", "PRACTICE OWNED"]
+LOCATIONS = ["FRONT WALL", "BACK WALL", "WINDOW", "DRAWER 1", "DRAWER 2", "KIDS STAND", "STOREROOM"]
+
+def ean13(body12):
+    # Appends the EAN-13 check digit to a Series of 12-digit strings
+    digits = np.frombuffer("".join(body12).encode("ascii"), dtype=np.uint8).reshape(-1, 12).astype(int) - 48
+    total = digits[:, 0::2].sum(axis=1) + 3 * digits[:, 1::2].sum(axis=1)
+    return body12 + pd.Series((10 - total % 10) % 10, index=body12.index).astype(str)
+
+def generate_inventory(rows, seed=0, dirty_rate=0.03, duplicate_rate=0.002):
+    rng = np.random.default_rng(seed)
+    brand_idx = rng.choice(len(BRANDS), size=rows, p=BRAND_WEIGHTS / BRAND_WEIGHTS.sum())
+    brands = [BRANDS[i] for i in brand_idx]
+
+    # Most frames carry the supplier's EAN-13; about a quarter get an in-house code like the app generates
+    in_house = rng.random(rows) < 0.25
+    company = pd.Series([b[3][:6] for b in brands])
+    items = pd.Series(rng.permutation(max(rows, 10 ** 6))[:rows]).map("{:06d}".format)
+    barcodes = ean13(company + items).astype(object)
+    barcodes[in_house] = (10000 + np.arange(int(in_house.sum()))).astype(str)
+
+    # The spellings clean_barcode exists for: Excel floats, padding, invisible spaces
+    dirty = rng.random(rows) < dirty_rate
+    styles = rng.integers(0, 3, size=rows)
+    barcodes[dirty & (styles == 0)] = barcodes[dirty & (styles == 0)] + ".0"
+    barcodes[dirty & (styles == 1)] = " " + barcodes[dirty & (styles == 1)] + " "
+    barcodes[dirty & (styles == 2)] = barcodes[dirty & (styles == 2)] + chr(0xA0)
+    duplicates = rng.random(rows) < duplicate_rate
+    barcodes[duplicates] = barcodes.sample(int(duplicates.sum()), random_state=seed, replace=True).to_numpy()
+
+    low = np.array([b[4][0] for b in brands])
+    high = np.array([b[4][1] for b in brands])
+    rrp = np.round((low + rng.random(rows) * (high - low)) / 10) * 10 - 0.05
+    cost = np.round(rrp * rng.uniform(0.35, 0.55, size=rows) / 1.1, 2)
+    suppliers = np.array([b[1] for b in brands], dtype=object)
+    prefixes = pd.Series(suppliers).str[:3]
+    framenums = prefixes + (pd.Series(suppliers).groupby(suppliers).cumcount() + 1).map("{:06d}".format)
+    eye = rng.integers(44, 60, size=rows)
+    bridge = rng.integers(14, 22, size=rows)
+    avail = pd.Timestamp("2019-01-01") + pd.to_timedelta(rng.integers(0, 6 * 365, size=rows), unit="D")
+
+    frame = pd.DataFrame({
+        "BARCODE": barcodes.to_numpy(),
+        "LOCATION": rng.choice(LOCATIONS, size=rows),
+        "FRAMENUM": framenums.to_numpy(),
+        "MANUFACT": [b[0] for b in brands],
+        "MODEL": [f"{b[2]}{m}" for b, m in zip(brands, rng.integers(1000, 9999, size=rows))],
+        "SIZE": [f"{e:02d}-{b:02d}" for e, b in zip(eye, bridge)],
+        "FCOLOUR": rng.choice(COLOURS, size=rows),
+        "FRAMETYPE": rng.choice(FRAMETYPES, size=rows, p=[0.35, 0.4, 0.1, 0.15]),
+        "F GROUP": rng.choice(F_GROUPS, size=rows, p=[0.7, 0.22, 0.05, 0.03]),
+        "SUPPLIER": suppliers,
+        "QUANTITY": rng.choice([0, 1, 1, 1, 1, 2, 3], size=rows).astype(str),
+        "F TYPE": rng.choice(FRAMETYPES, size=rows),
+        "TEMPLE": rng.choice([135, 140, 145, 150], size=rows).astype(str),
+        "DEPTH": rng.integers(30, 50, size=rows).astype(str),
+        "DIAG": rng.integers(45, 62, size=rows).astype(str),
+        "BASECURVE": rng.choice(["2", "4", "6", "8"], size=rows),
+        "RRP": np.char.mod("%.2f", rrp),
+        "EXCOSTPR": np.char.mod("%.2f", cost),
+        "COST PRICE": np.char.mod("%.2f", np.round(cost * 1.1, 2)),
+        "TAXPC": "GST 10%",
+        "FRSTATUS": rng.choice(FRSTATUS, size=rows, p=[0.2, 0.8]),
+        "AVAILFROM": avail.strftime("%Y-%m-%d"),
+        "NOTE": np.where(rng.random(rows) < 0.05, "DISPLAY ONLY", ""),
+    })
+    return frame[VISIBLE_FIELDS]
+
+def dataset_path(rows, fmt="csv", seed=0):
+    return os.path.join(DATA_FOLDER, f"inventory_{rows}_{seed}.{fmt}")
+
+def ensure_dataset(rows, fmt="csv", seed=0):
+    # Generated once and reused, so runs compare like with like
+    path = dataset_path(rows, fmt, seed)
+    if not os.path.exists(path):
+        os.makedirs(DATA_FOLDER, exist_ok=True)
+        frame = generate_inventory(rows, seed)
+        tmp_path = path + ".tmp"
+        if fmt == "xlsx":
+            with open(tmp_path, "wb") as f:
+                frame.to_excel(f, index=False, engine="openpyxl")
+        else:
+            frame.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic optical-frame inventory.")
+    parser.add_argument("rows", type=int, nargs="+")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for rows in args.rows:
+        print(ensure_dataset(rows, args.format, args.seed))
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory_io import clean_barcode, clean_barcode_series, load_inventory_file
+
+# Simulates a fleet of handheld scanners hitting a running barcode_server.py. Every
+# simulated scanner holds one keep-alive connection and sends its next request as soon
+# as the previous answer arrives, like a scanner operator working through a shelf.
+DEFAULT_SERVER = "http://localhost:5001"
+MISS_PREFIX = "29"  # GS1 restricted-circulation range, never on a supplier barcode
+
+
+class BarcodePicker:
+    # Draws barcodes with a Zipf-like skew (a few fast sellers are scanned far more
+    # often) and a configurable share of codes the inventory does not have
+    def __init__(self, barcodes, hit_ratio=0.9, skew=1.0, seed=0):
+        self.barcodes = list(dict.fromkeys(b for b in barcodes if b))
+        if not self.barcodes and hit_ratio > 0:
+            raise ValueError("No barcodes to draw hits from.")
+        self.known = set(self.barcodes)
+        self.hit_ratio = hit_ratio
+        self.rng = np.random.default_rng(seed)
+        weights = 1.0 / np.arange(1, len(self.barcodes) + 1) ** skew
+        self.weights = weights / weights.sum()
+        self.rng.shuffle(self.barcodes)  # so the popular codes are not the first rows of the file
+
+    def miss(self):
+        while True:
+            code = MISS_PREFIX + "".join(self.rng.choice(list("0123456789"), 11))
+            if code not in self.known:
+                return code
+
+    def pick(self, count):
+        hits = self.rng.random(count) < self.hit_ratio
+        chosen = self.rng.choice(len(self.barcodes), size=int(hits.sum()), p=self.weights) if self.barcodes else []
+        chosen = iter(chosen)
+        return [self.barcodes[next(chosen)] if hit else self.miss() for hit in hits]
+
+
+def barcodes_from_server(server):
+    # The server's own change feed, so hits really are hits for what it serves
+    req = urllib.request.Request(f"{server}/sync?since=0", headers={"Accept-Encoding": "gzip"})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        body = resp.read()
+        if resp.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+    feed = json.loads(body)
+    col = next((i for i, f in enumerate(feed["fields"]) if str(f).lower() == "barcode"), None)
+    if col is None:
+        raise ValueError("The server's inventory has no barcode column.")
+    return [clean_barcode(row[col]) for row in feed["changed"]]
+
+def barcodes_from_file(path):
+    frame = load_inventory_file(path)
+    col = next((c for c in frame.columns if str(c).lower() == "barcode"), None)
+    if col is None:
+        raise ValueError(f"{path} has no barcode column.")
+    return clean_barcode_series(frame[col]).tolist()
+
+
+class Connection:
+    # Minimal HTTP/1.1 keep-alive client on asyncio streams; reconnects when the server closes
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def post_json(self, path, payload):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8")
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode("ascii") + body
+        )
+        await self.writer.drain()
+        return await asyncio.wait_for(self._read_response(), self.timeout)
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection.")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read()
+        if headers.get("connection", "").lower() == "close" or "content-length" not in headers \
+                or status_line.startswith(b"HTTP/1.0"):
+            await self.close()
+        return status, body
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.requests = 0
+        self.lookups = 0
+        self.found = 0
+        self.errors = 0
+
+    def summary(self, elapsed):
+        ordered = sorted(self.latencies)
+        def pct(fraction):
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000 if ordered else 0.0
+        return {
+            "requests": self.requests,
+            "lookups": self.lookups,
+            "errors": self.errors,
+            "hit_rate": self.found / self.lookups if self.lookups else 0.0,
+            "seconds": elapsed,
+            "requests_per_s": self.requests / elapsed if elapsed else 0.0,
+            "lookups_per_s": self.lookups / elapsed if elapsed else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+            "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        }
+
+
+async def scanner(connection, picker, mode, batch_size, deadline, budget, stats):
+    while time.monotonic() < deadline and budget[0] > 0:
+        budget[0] -= 1
+        size = batch_size if mode == "batch" else 1
+        codes = picker.pick(size)
+        started = time.perf_counter()
+        try:
+            if mode == "batch":
+                status, body = await connection.post_json("/lookup_batch", {"barcodes": codes})
+                found = sum(1 for result in json.loads(body)["results"] if "fields" in result) if status == 200 else 0
+            else:
+                status, body = await connection.post_json("/save_barcode", {"barcode": codes[0]})
+                found = 1 if status == 200 and "fields" in json.loads(body) else 0
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+            await connection.close()
+            continue
+        stats.latencies.append(time.perf_counter() - started)
+        stats.requests += 1
+        if status != 200:
+            stats.errors += 1
+            continue
+        stats.lookups += size
+        stats.found += found
+
+async def run_load(server, picker, mode="single", concurrency=32, duration=30.0, requests=None,
+                   batch_size=50, timeout=10.0, warmup=2.0):
+    url = urllib.parse.urlsplit(server)
+    host, port = url.hostname or "localhost", url.port or 80
+    connections = [Connection(host, port, timeout) for _ in range(concurrency)]
+    try:
+        if warmup:
+            # Opens the connections and lets the server build its index before anything is counted
+            await asyncio.gather(*(
+                scanner(c, picker, mode, batch_size, time.monotonic() + warmup, [10 ** 9], Stats())
+                for c in connections
+            ))
+        stats = Stats()
+        budget = [requests if requests else 10 ** 12]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            scanner(c, picker, mode, batch_size, time.monotonic() + duration, budget, stats)
+            for c in connections
+        ))
+        return stats.summary(time.perf_counter() - started)
+    finally:
+        await asyncio.gather(*(c.close() for c in connections))
+
+def print_summary(mode, concurrency, result):
+    print(
+        f"{mode:<6} x{concurrency:<4} {result['requests']:>8,} req {result['requests_per_s']:>9,.0f} req/s "
+        f"{result['lookups_per_s']:>9,.0f} lookups/s  p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+        f"p99 {result['p99_ms']:7.2f} ms  hit {result['hit_rate']:.0%}  errors {result['errors']}",
+        flush=True,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test a running barcode_server.py with simulated scanners.")
+    parser.add_argument("--server", default=DEFAULT_SERVER)
+    parser.add_argument("--inventory", help="Draw barcodes from this file instead of the server's /sync feed")
+    parser.add_argument("--synthetic", type=int, metavar="ROWS", help="Draw barcodes from a synthetic inventory of this size")
+    parser.add_argument("--mode", choices=["single", "batch", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[32], help="One run per value, e.g. 1 8 32 128")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per run")
+    parser.add_argument("--requests", type=int, help="Stop each run after this many requests")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--hit-ratio", type=float, default=0.9)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent; 0 scans every barcode equally often")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    if args.inventory:
+        barcodes = barcodes_from_file(args.inventory)
+    elif args.synthetic:
+        from generate_inventory import generate_inventory
+        barcodes = clean_barcode_series(generate_inventory(args.synthetic, args.seed)["BARCODE"]).tolist()
+    else:
+        barcodes = barcodes_from_server(args.server.rstrip("/"))
+    picker = BarcodePicker(barcodes, args.hit_ratio, args.skew, args.seed)
+    print(f"{len(picker.barcodes):,} distinct barcodes, hit ratio {args.hit_ratio:.0%}, skew {args.skew}")
+
+    modes = ["single", "batch"] if args.mode == "both" else [args.mode]
+    results = []
+    for mode in modes:
+        for concurrency in args.concurrency:
+            result = asyncio.run(run_load(
+                args.server.rstrip("/"), picker, mode, concurrency, args.duration, args.requests,
+                args.batch_size, args.timeout, args.warmup,
+            ))
+            print_summary(mode, concurrency, result)
+            results.append({"mode": mode, "concurrency": concurrency,
+                            "batch_size": args.batch_size if mode == "batch" else 1, **result})
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"server": args.server, "hit_ratio": args.hit_ratio, "skew": args.skew, "runs": results}, f, indent=2)
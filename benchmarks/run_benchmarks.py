@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from generate_inventory import ensure_dataset
+from inventory_io import (
+    clean_barcode, clean_barcode_series, format_inventory_table, load_inventory_file,
+    prepare_for_save, scanned_products,
+)
+from inventory_writer import InventoryWriter
+from barcode_index import build_index, get_barcode_index
+from shared_inventory import display_frame
+from inventory_jobs import export_excel, reconcile_stock_count
+from job_runner import Job
+
+RESULTS_FOLDER = os.path.join(BENCH_DIR, "results")
+LOOKUPS = 1000
+SCAN_FRACTION = 0.1
+CONCURRENT_SAVES = 20
+
+BENCHMARKS = []
+
+def benchmark(name, needs_xlsx=False, per=None):
+    # per: how many operations one timed call covers, to also report a per-op time
+    def register(fn):
+        BENCHMARKS.append((name, fn, needs_xlsx, per))
+        return fn
+    return register
+
+
+class Context:
+    # One dataset size: the generated files plus a scratch folder for anything that writes
+    def __init__(self, rows, xlsx_max_rows):
+        self.rows = rows
+        self.csv_path = ensure_dataset(rows, "csv")
+        self.xlsx_path = ensure_dataset(rows, "xlsx") if rows <= xlsx_max_rows else None
+        self.work = tempfile.mkdtemp(prefix=f"inventory-bench-{rows}-")
+        self.raw = pd.read_csv(self.csv_path, dtype=str, keep_default_na=False)
+        self.frame = load_inventory_file(self.csv_path)
+        rng = np.random.default_rng(1)
+        codes = self.frame["BARCODE"]
+        self.lookup_codes = codes.sample(LOOKUPS, replace=True, random_state=1).tolist()
+        self.scanned = codes.sample(max(1, int(len(codes) * SCAN_FRACTION)), random_state=2).tolist()
+        self.edit_codes = iter(codes.iloc[rng.permutation(len(codes))].tolist())
+
+    def scratch_copy(self, source):
+        path = os.path.join(self.work, os.path.basename(source))
+        shutil.copyfile(source, path)
+        return path
+
+    def close(self):
+        shutil.rmtree(self.work, ignore_errors=True)
+
+
+# --- Load ---
+@benchmark("load_inventory_csv")
+def bench_load_csv(ctx):
+    return lambda: load_inventory_file(ctx.csv_path)
+
+@benchmark("load_inventory_xlsx", needs_xlsx=True)
+def bench_load_xlsx(ctx):
+    return lambda: load_inventory_file(ctx.xlsx_path)
+
+# --- Barcode normalisation ---
+@benchmark("clean_barcode_map")
+def bench_clean_barcode_map(ctx):
+    return lambda: ctx.raw["BARCODE"].map(clean_barcode)
+
+@benchmark("clean_barcode_series")
+def bench_clean_barcode_series(ctx):
+    return lambda: clean_barcode_series(ctx.raw["BARCODE"])
+
+# --- Lookup ---
+@benchmark("barcode_index_build")
+def bench_index_build(ctx):
+    index_path = os.path.join(ctx.work, "bench.idx")
+    return lambda: build_index(ctx.frame, index_path)
+
+@benchmark("find_product_by_barcode", needs_xlsx=True, per=LOOKUPS)
+def bench_find_product(ctx):
+    import barcode_server
+    path = ctx.scratch_copy(ctx.xlsx_path)
+    barcode_server.find_product_by_barcode(ctx.lookup_codes[0], excel_path=path)  # builds the index once
+    return lambda: [barcode_server.find_product_by_barcode(code, excel_path=path) for code in ctx.lookup_codes]
+
+@benchmark("barcode_index_lookup", per=LOOKUPS)
+def bench_index_lookup(ctx):
+    index = get_barcode_index(ctx.scratch_copy(ctx.csv_path), load_inventory_file)
+    return lambda: [index.lookup(code) for code in ctx.lookup_codes]
+
+# --- Persistence through the background writer, the way the pages save ---
+def persist(ctx, mutation):
+    path = ctx.scratch_copy(ctx.csv_path)
+    writer = InventoryWriter()
+    writer.apply(path, lambda current: prepare_for_save(current))  # warm the writer's frame cache
+    return lambda: writer.apply(path, lambda current: prepare_for_save(mutation(current)))
+
+@benchmark("persist_add")
+def bench_persist_add(ctx):
+    counter = iter(range(10 ** 9))
+    def add(current):
+        row = {col: "" for col in current.columns}
+        row.update(BARCODE=f"BENCH{next(counter)}", FRAMENUM="BEN000001", RRP="$199.95")
+        return pd.concat([current, pd.DataFrame([row])], ignore_index=True)
+    return persist(ctx, add)
+
+@benchmark("persist_edit")
+def bench_persist_edit(ctx):
+    def edit(current):
+        code = next(ctx.edit_codes)
+        updated = current.copy()  # the writer's cached frame is not changed in place, as on the pages
+        updated.loc[updated["BARCODE"] == code, "QUANTITY"] = "0"
+        return updated
+    return persist(ctx, edit)
+
+@benchmark("persist_delete")
+def bench_persist_delete(ctx):
+    def delete(current):
+        code = next(ctx.edit_codes)
+        return current[current["BARCODE"] != code].reset_index(drop=True)
+    return persist(ctx, delete)
+
+@benchmark(f"persist_group_commit_{CONCURRENT_SAVES}", per=CONCURRENT_SAVES)
+def bench_group_commit(ctx):
+    # Sessions saving at once: the writer should fold them into one or two file writes
+    path = ctx.scratch_copy(ctx.csv_path)
+    writer = InventoryWriter()
+    writer.apply(path, lambda current: prepare_for_save(current))
+    def run():
+        tickets = [
+            writer.submit(path, lambda current, i=i: prepare_for_save(current.assign(NOTE=f"bench {i}")))
+            for i in range(CONCURRENT_SAVES)
+        ]
+        for ticket in tickets:
+            ticket.wait(120)
+    return run
+
+# --- Stocktake ---
+@benchmark("stocktake_missing_table")
+def bench_stocktake_missing(ctx):
+    scanned = set(ctx.scanned)
+    return lambda: format_inventory_table(ctx.frame[~ctx.frame["BARCODE"].isin(scanned)])
+
+@benchmark("stocktake_scanned_table")
+def bench_stocktake_scanned(ctx):
+    scanned = ctx.scanned[:2000]  # a busy morning's worth of scans
+    return lambda: format_inventory_table(scanned_products(ctx.frame, scanned))
+
+@benchmark("stock_count_reconcile")
+def bench_reconcile(ctx):
+    scanned = pd.DataFrame({"Barcode": ctx.scanned})
+    return lambda: reconcile_stock_count(Job(0, "bench", "bench"), ctx.frame, "BARCODE", scanned, "Barcode")
+
+# --- Export ---
+@benchmark("display_table")
+def bench_display(ctx):
+    return lambda: display_frame(ctx.frame)
+
+@benchmark("export_csv")
+def bench_export_csv(ctx):
+    display = display_frame(ctx.frame)
+    return lambda: display.to_csv(index=False).encode("utf-8")
+
+@benchmark("export_excel", needs_xlsx=True)
+def bench_export_excel(ctx):
+    display = display_frame(ctx.frame)
+    return lambda: export_excel(Job(0, "bench", "bench"), display)
+
+
+def measure(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return {"median": statistics.median(runs), "min": min(runs), "runs": runs}
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(sizes, repeat, only=None, xlsx_max_rows=100_000):
+    results = {}
+    for rows in sizes:
+        print(f"== {rows:,} rows", flush=True)
+        ctx = Context(rows, xlsx_max_rows)
+        try:
+            for name, setup, needs_xlsx, per in BENCHMARKS:
+                if only and not any(o in name for o in only):
+                    continue
+                if needs_xlsx and ctx.xlsx_path is None:
+                    continue
+                result = measure(setup(ctx), repeat)
+                if per:
+                    result["per_op_us"] = result["median"] / per * 1e6
+                results[f"{name}@{rows}"] = result
+                extra = f"  ({result['per_op_us']:.1f} µs/op)" if per else ""
+                print(f"  {name:<28} {result['median'] * 1000:>10.1f} ms{extra}", flush=True)
+        finally:
+            ctx.close()
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def compare(current, baseline, threshold):
+    # Median against median; anything slower than threshold x baseline is a regression
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for key, result in current["results"].items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else float("inf")
+        flag = "  << slower" if ratio > threshold else ("  >> faster" if ratio < 1 / threshold else "")
+        print(f"{key:<40} {old['median'] * 1000:>12.1f} {result['median'] * 1000:>12.1f} {ratio:>7.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inventory performance benchmarks on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="Run only benchmarks whose name contains one of these")
+    parser.add_argument("--xlsx-max-rows", type=int, default=100_000, help="Skip Excel benchmarks above this size")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.repeat, args.only, args.xlsx_max_rows)
+    output = args.output or os.path.join(RESULTS_FOLDER, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
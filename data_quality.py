@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import io
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from inventory_io import clean_barcode_series, load_inventory_file, row_hashes, source_column, state_path
+
+# Catalogue-wide validation. Row checks only look at their own row, so their result is
+# cached by row hash and a rescan only re-checks rows that changed since the last one.
+# Duplicate keys depend on the whole column and are recomputed every time, which is a
+# single hashed pass over two columns.
+KEY_FIELDS = ["BARCODE", "FRAMENUM"]
+CHECKED_FIELDS = ["BARCODE", "FRAMENUM", "RRP", "COST PRICE", "SIZE", "AVAILFROM", "QUANTITY"]
+BLANKS = ["", "nan", "NaN", "None", "<NA>", "NaT"]
+
+EARLIEST_DATE = pd.Timestamp("1990-01-01")
+FUTURE_DAYS = 730
+EYE_RANGE = (35, 70)
+BRIDGE_RANGE = (10, 30)
+TEMPLE_RANGE = (110, 160)
+SIZE_PATTERN = r"^(\d{2})\s*[-/x ]\s*(\d{2})(?:\s*[-/x ]\s*(\d{3}))?$"
+
+# code: (bit, severity, field, what to do about it)
+CHECKS = {
+    "missing_barcode":    (1 << 0, "error",   "BARCODE",    "Scan or generate a barcode for this frame."),
+    "duplicate_barcode":  (1 << 1, "error",   "BARCODE",    "Keep one row; merge the quantities or re-barcode the others."),
+    "duplicate_framecode": (1 << 2, "error",  "FRAMENUM",   "Give each frame its own framecode."),
+    "unparsable_rrp":     (1 << 3, "error",   "RRP",        "Enter the price as a number; it is saved as $0.00 otherwise."),
+    "missing_rrp":        (1 << 4, "warning", "RRP",        "Add the retail price."),
+    "unparsable_cost":    (1 << 5, "warning", "COST PRICE", "Enter the cost as a number."),
+    "cost_above_rrp":     (1 << 6, "error",   "COST PRICE", "Check RRP and COST PRICE; they may be swapped or mistyped."),
+    "invalid_size":       (1 << 7, "warning", "SIZE",       "Use eye-bridge(-temple), e.g. 52-18-140."),
+    "bad_date":           (1 << 8, "warning", "AVAILFROM",  "Use a real date as YYYY-MM-DD."),
+    "invalid_quantity":   (1 << 9, "error",   "QUANTITY",   "Quantity must be a whole number of 0 or more."),
+}
+
+def blank(s):
+    # Also separator-only values such as "/  /", which the old POS export writes for no date
+    text = s.astype(str).str.strip()
+    return s.isna() | text.isin(BLANKS) | text.str.fullmatch(r"[/.\-\s]+").fillna(False).astype(bool)
+
+def parse_price(s):
+    return pd.to_numeric(s.astype(str).str.replace(r"[$,\s]", "", regex=True), errors="coerce")
+
+def parse_dates(s):
+    # ISO first, vectorised; only what that misses goes through the slower mixed parser
+    text = s.astype(str).str.strip()
+    parsed = pd.to_datetime(text.str[:10], format="%Y-%m-%d", errors="coerce")
+    retry = parsed.isna() & ~blank(text)
+    if retry.any():
+        parsed[retry] = pd.to_datetime(text[retry], format="mixed", dayfirst=True, errors="coerce")
+    return parsed
+
+def column(frame, field):
+    # Read through the shared alias table, so COST PRICE is the same column repricing uses
+    name = source_column(frame, field)
+    return frame[name] if name is not None else pd.Series("", index=frame.index, dtype=object)
+
+def valid_sizes(text):
+    # Sizes written the usual way (52-18 or 52-18-140) are sliced; only the rest go through the regex
+    canonical = text.str.fullmatch(r"\d{2}-\d{2}(?:-\d{3})?").fillna(False).astype(bool)
+    eye = pd.to_numeric(text.str[:2].where(canonical), errors="coerce")
+    bridge = pd.to_numeric(text.str[3:5].where(canonical), errors="coerce")
+    temple = pd.to_numeric(text.str[6:9].where(canonical & text.str.len().eq(9)), errors="coerce")
+    other = ~canonical
+    if other.any():
+        parts = text[other].str.extract(SIZE_PATTERN).apply(pd.to_numeric, errors="coerce")
+        eye[other], bridge[other], temple[other] = parts[0], parts[1], parts[2]
+    return eye.between(*EYE_RANGE) & bridge.between(*BRIDGE_RANGE) & (temple.isna() | temple.between(*TEMPLE_RANGE))
+
+def row_issue_masks(frame):
+    # One bitmask per row for every check that only needs the row itself
+    masks = np.zeros(len(frame), dtype=np.uint32)
+    def flag(code, hit):
+        masks[np.asarray(hit, dtype=bool)] |= CHECKS[code][0]
+
+    flag("missing_barcode", clean_barcode_series(column(frame, "BARCODE")).eq(""))
+
+    rrp_text = column(frame, "RRP")
+    rrp = parse_price(rrp_text)
+    rrp_blank = blank(rrp_text)
+    flag("missing_rrp", rrp_blank)
+    flag("unparsable_rrp", rrp.isna() & ~rrp_blank)
+
+    cost_text = column(frame, "COST PRICE")
+    cost = parse_price(cost_text)
+    flag("unparsable_cost", cost.isna() & ~blank(cost_text))
+    flag("cost_above_rrp", (cost > rrp) & rrp.gt(0))
+
+    size_text = column(frame, "SIZE").astype(str).str.strip()
+    flag("invalid_size", ~valid_sizes(size_text) & ~blank(size_text))
+
+    date_text = column(frame, "AVAILFROM")
+    dates = parse_dates(date_text)
+    latest = pd.Timestamp.now().normalize() + pd.Timedelta(days=FUTURE_DAYS)
+    flag("bad_date", ~blank(date_text) & ~dates.between(EARLIEST_DATE, latest))
+
+    quantity_text = column(frame, "QUANTITY")
+    quantity = pd.to_numeric(quantity_text.astype(str).str.strip(), errors="coerce")
+    flag("invalid_quantity", ~blank(quantity_text) & ~(quantity.ge(0) & quantity.eq(quantity.round())))
+    return masks
+
+def duplicate_masks(frame):
+    masks = np.zeros(len(frame), dtype=np.uint32)
+    for code, name in (("duplicate_barcode", "BARCODE"), ("duplicate_framecode", "FRAMENUM")):
+        if name not in frame.columns:
+            continue
+        keys = clean_barcode_series(frame[name])
+        masks[(keys.ne("") & keys.duplicated(keep=False)).to_numpy()] |= CHECKS[code][0]
+    return masks
+
+def key_counts(frame):
+    # Cleaned key -> number of rows, for the add/edit forms' duplicate checks
+    return {
+        name: clean_barcode_series(frame[name]).value_counts().to_dict()
+        for name in KEY_FIELDS if name in frame.columns
+    }
+
+def suggest_fix(code, values):
+    # Best-guess corrected value where one can be derived, blank otherwise
+    text = values.astype(str).str.strip()
+    if code == "unparsable_rrp":
+        number = pd.to_numeric(
+            text.str.extract(r"(\d+(?:[.,]\d{1,2})?)")[0].str.replace(",", ".", regex=False), errors="coerce"
+        )
+        return number.map(lambda v: f"${v:.2f}" if pd.notna(v) else "")
+    if code == "invalid_size":
+        digits = text.str.replace(r"\D", "", regex=True)
+        sizes = digits.str.replace(r"^(\d{2})(\d{2})(\d{3})?$", lambda m: "-".join(g for g in m.groups() if g), regex=True) \
+            .where(digits.str.fullmatch(r"\d{4}(\d{3})?"), "")
+        return sizes.where(valid_sizes(sizes), "")  # only a size that would pass the check
+    if code == "bad_date":
+        parsed = pd.to_datetime(text, format="mixed", dayfirst=True, errors="coerce")
+        plausible = parsed.between(EARLIEST_DATE, pd.Timestamp.now() + pd.Timedelta(days=FUTURE_DAYS))
+        return parsed.dt.strftime("%Y-%m-%d").where(plausible, "")
+    return pd.Series("", index=values.index)
+
+def issues_table(frame, masks):
+    # Long format fix-up report: one line per (row, issue)
+    parts = []
+    for code, (bit, severity, field, fix) in CHECKS.items():
+        rows = np.flatnonzero(masks & bit)
+        if len(rows) == 0:
+            continue
+        subset = frame.iloc[rows]
+        values = column(subset, field)
+        field = source_column(frame, field) or field
+        parts.append(pd.DataFrame({
+            "ROW": rows + 2,  # spreadsheet row, counting the header
+            "BARCODE": column(subset, "BARCODE").to_numpy(),
+            "FRAMENUM": column(subset, "FRAMENUM").to_numpy(),
+            "ISSUE": code,
+            "SEVERITY": severity,
+            "FIELD": field,
+            "VALUE": values.astype(str).to_numpy(),
+            "SUGGESTED": suggest_fix(code, values).to_numpy(),
+            "FIX": fix,
+        }))
+    if not parts:
+        return pd.DataFrame(columns=["ROW", "BARCODE", "FRAMENUM", "ISSUE", "SEVERITY", "FIELD", "VALUE", "SUGGESTED", "FIX"])
+    return pd.concat(parts, ignore_index=True).sort_values(["ROW", "ISSUE"], ignore_index=True)
+
+def summary_table(masks):
+    return pd.DataFrame([
+        {"ISSUE": code, "SEVERITY": severity, "FIELD": field, "ROWS": int(np.count_nonzero(masks & bit))}
+        for code, (bit, severity, field, _) in CHECKS.items()
+    ])
+
+
+class DataQualityScanner:
+    # Keeps (row hash -> row-check mask) per file, in memory and in state/, so edits
+    # and re-imports only cost the rows they touched
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _cache_path(self, path):
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+        return state_path(f"data_quality_{digest}.npz")
+
+    def _known(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            if path not in self._cache:
+                try:
+                    with np.load(self._cache_path(path)) as saved:
+                        self._cache[path] = (saved["hashes"], saved["masks"])
+                except (OSError, ValueError, KeyError):
+                    self._cache[path] = (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint32))
+            return self._cache[path]
+
+    def _remember(self, path, hashes, masks):
+        hashes, first = np.unique(hashes, return_index=True)
+        masks = masks[first]
+        with self._lock:
+            self._cache[os.path.abspath(path)] = (hashes, masks)
+        tmp_path = self._cache_path(path) + ".tmp.npz"
+        try:
+            np.savez(tmp_path, hashes=hashes, masks=masks)
+            os.replace(tmp_path, self._cache_path(path))
+        except OSError:
+            pass
+
+    def scan(self, path, frame):
+        started = time.perf_counter()
+        checked = [name for name in (source_column(frame, field) for field in CHECKED_FIELDS) if name is not None]
+        hashes = row_hashes(frame[checked].astype(str)).to_numpy() if checked else np.zeros(len(frame), dtype=np.uint64)
+        known_hashes, known_masks = self._known(path)
+        pos = np.searchsorted(known_hashes, hashes).clip(max=max(len(known_hashes) - 1, 0))
+        hit = (known_hashes[pos] == hashes) if len(known_hashes) else np.zeros(len(frame), dtype=bool)
+        masks = np.zeros(len(frame), dtype=np.uint32)
+        masks[hit] = known_masks[pos[hit]]
+        changed = ~hit
+        if changed.any():
+            masks[changed] = row_issue_masks(frame[changed])
+            self._remember(path, hashes, masks)
+        masks |= duplicate_masks(frame)
+        return {
+            "rows": len(frame),
+            "revalidated": int(changed.sum()),
+            "rows_with_issues": int(np.count_nonzero(masks)),
+            "summary": summary_table(masks),
+            "issues": issues_table(frame, masks),
+            "seconds": time.perf_counter() - started,
+        }
+
+
+def report_to_excel(result):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        result["summary"].to_excel(writer, sheet_name="Summary", index=False)
+        result["issues"].to_excel(writer, sheet_name="Fix-up", index=False)
+    return buffer.getvalue()
+
+def report_to_csv(result):
+    return result["issues"].to_csv(index=False).encode("utf-8")
+
+
+_scanner = None
+_scanner_lock = threading.Lock()
+
+def get_data_quality_scanner():
+    global _scanner
+    with _scanner_lock:
+        if _scanner is None:
+            _scanner = DataQualityScanner()
+    return _scanner
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Validate an inventory file and write a fix-up report.")
+    parser.add_argument("path")
+    parser.add_argument("--output", help="Write the report here (.xlsx or .csv)")
+    args = parser.parse_args()
+    result = get_data_quality_scanner().scan(args.path, load_inventory_file(args.path))
+    print(result["summary"].to_string(index=False))
+    print(f"\n{result['rows_with_issues']:,} of {result['rows']:,} rows need attention "
+          f"({result['revalidated']:,} rows checked, {result['seconds']:.2f}s)")
+    if args.output:
+        data = report_to_excel(result) if args.output.lower().endswith(".xlsx") else report_to_csv(result)
+        with open(args.output, "wb") as f:
+            f.write(data)
@@ -0,0 +1,170 @@
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from archive_store import LEGACY_ARCHIVE_NAME
+from file_watcher import get_file_watcher
+from inventory_io import BASE_DIR, default_inventory_file, load_inventory_file, rename_aliases, state_path
+
+INDEX_FIELDS = [
+    "BARCODE", "FRAMENUM", "MANUFACT", "MODEL", "FCOLOUR", "SIZE", "SUPPLIER",
+    "LOCATION", "QUANTITY", "RRP", "COST PRICE",
+]
+STORES_FILE_NAME = "stores.json"
+STORE_SUFFIX = "_inventory.xlsx"
+IN_PROCESS_BYTES = 20 * 1024 * 1024  # below this much to read, a worker pool costs more than it saves
+
+def read_store_list(path=None):
+    # state/stores.json: {"Store name": "path to its inventory file"}, relative to the app folder
+    path = path or state_path(STORES_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        listed = json.load(f)
+    return {str(store): os.path.join(BASE_DIR, file) for store, file in listed.items()}
+
+def discover_store_files():
+    # An explicit store list wins. Otherwise this shop is the file the pages work on (the
+    # other files in Inventory/ are dated copies of it, not stores) and every other store
+    # is a <store>_inventory.xlsx workbook next to the app. The old archive workbook is
+    # stock that has left the shop, not a store.
+    listed = read_store_list()
+    if listed is not None:
+        return listed
+    stores = {}
+    local = default_inventory_file()
+    if local is not None:
+        stores[os.path.splitext(os.path.basename(local))[0]] = local
+    for name in sorted(os.listdir(BASE_DIR)):
+        if name.lower().endswith(STORE_SUFFIX) and name.lower() != LEGACY_ARCHIVE_NAME:
+            store = name[:-len(STORE_SUFFIX)].replace("_", " ").title()
+            stores[store] = os.path.join(BASE_DIR, name)
+    return stores
+
+def load_store(path):
+    # Runs in a worker process: read, normalise and keep only the indexed fields
+    df = load_inventory_file(path)
+    df = rename_aliases(df)
+    for field in INDEX_FIELDS:
+        if field not in df.columns:
+            df[field] = ""
+    df = df[INDEX_FIELDS].replace("nan", "")
+    return df
+
+
+class FederatedInventory:
+    # Stores are reloaded when the file watcher publishes a new version of their file,
+    # several at a time in a pool of worker processes kept for the life of the app, one
+    # worker per store at most. Workers are spawned, not forked, because the Streamlit
+    # process runs threads; small loads are read here instead.
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._stores = {}       # store -> (path, watcher version, frame)
+        self._lock = threading.Lock()
+        self._pool = None
+        self.frame = pd.DataFrame(columns=["STORE"] + INDEX_FIELDS)
+        self.version = 0
+        self._by_barcode = self.frame
+        self._by_model = self.frame
+        self._store_totals = pd.DataFrame()
+
+    def _load_many(self, paths):
+        if sum(os.path.getsize(path) for path in paths if os.path.exists(path)) < IN_PROCESS_BYTES:
+            return [load_store(path) for path in paths]
+        if self._pool is None:
+            workers = min(self.max_workers or os.cpu_count() or 1, len(paths))
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            return list(self._pool.map(load_store, paths))
+        except BrokenProcessPool:
+            # A worker died (or could not start); load here and start a new pool next time
+            self._pool = None
+            return [load_store(path) for path in paths]
+
+    def refresh(self, store_files=None):
+        store_files = store_files or discover_store_files()
+        watcher = get_file_watcher()
+        with self._lock:
+            # Versions are read before loading, so a change during the load reloads once more
+            versions = {store: watcher.version(path) for store, path in store_files.items()}
+            stale = {
+                store: path for store, path in store_files.items()
+                if store not in self._stores or self._stores[store][:2] != (path, versions[store])
+            }
+            removed = set(self._stores) - set(store_files)
+            if not stale and not removed:
+                return False
+            for store in removed:
+                del self._stores[store]
+            if len(stale) > 1:
+                frames = dict(zip(stale, self._load_many(list(stale.values()))))
+            else:
+                frames = {store: load_store(path) for store, path in stale.items()}
+            for store, frame in frames.items():
+                self._stores[store] = (stale[store], versions[store], frame)
+            self._rebuild()
+            return True
+
+    def _rebuild(self):
+        frames = [frame.assign(STORE=store) for store, (_, _, frame) in self._stores.items()]
+        merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=INDEX_FIELDS + ["STORE"])
+        merged = merged[["STORE"] + INDEX_FIELDS]
+        merged["_qty"] = pd.to_numeric(merged["QUANTITY"], errors="coerce").fillna(0)
+        merged["_rrp"] = pd.to_numeric(merged["RRP"].str.replace("$", "", regex=False), errors="coerce").fillna(0)
+        merged["_cost"] = pd.to_numeric(merged["COST PRICE"].str.replace("$", "", regex=False), errors="coerce").fillna(0)
+        merged["_model"] = merged["MODEL"].str.strip().str.lower()
+        self.frame = merged
+        self._by_barcode = merged.set_index("BARCODE").sort_index()
+        self._by_model = merged.set_index("_model").sort_index()
+        totals = merged.assign(
+            retail_value=merged["_qty"] * merged["_rrp"],
+            cost_value=merged["_qty"] * merged["_cost"],
+        ).groupby("STORE").agg(
+            products=("BARCODE", "size"),
+            units=("_qty", "sum"),
+            retail_value=("retail_value", "sum"),
+            cost_value=("cost_value", "sum"),
+        )
+        self._store_totals = totals.reindex(list(self._stores), fill_value=0)
+        self.version += 1
+
+    # --- Cross-store queries (answered from the merged index, no file reads) ---
+    def _lookup(self, index, key):
+        rows = index.loc[[key]] if key in index.index else index.iloc[0:0]
+        return rows.reset_index()[["STORE"] + INDEX_FIELDS]
+
+    def stores_for_barcode(self, barcode):
+        return self._lookup(self._by_barcode, barcode)
+
+    def stores_for_model(self, model):
+        return self._lookup(self._by_model, str(model).strip().lower())
+
+    def stock_value(self):
+        return self._store_totals.copy()
+
+    def combined_stock_value(self):
+        totals = self._store_totals
+        return {
+            "stores": int(len(totals)),
+            "products": int(totals["products"].sum()) if len(totals) else 0,
+            "units": float(totals["units"].sum()) if len(totals) else 0.0,
+            "retail_value": float(totals["retail_value"].sum()) if len(totals) else 0.0,
+            "cost_value": float(totals["cost_value"].sum()) if len(totals) else 0.0,
+        }
+
+
+_federated = None
+_federated_lock = threading.Lock()
+
+def get_federated_inventory():
+    global _federated
+    with _federated_lock:
+        if _federated is None:
+            _federated = FederatedInventory()
+    _federated.refresh()
+    return _federated
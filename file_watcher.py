@@ -0,0 +1,191 @@
+import collections
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from inventory_writer import file_signature, get_writer
+
+# inotify flags (linux/inotify.h). Directories are watched rather than files, because
+# the writer replaces files with os.replace and a file watch would stay on the old inode.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+# No IN_MODIFY: a file is only picked up once its writer has closed or renamed it
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+POLL_INTERVAL = 1.0
+
+
+class Inotify:
+    # Just enough of the inotify API through ctypes, no third-party dependency
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = {}
+
+    def add_folder(self, folder):
+        wd = self._add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {folder}")
+        self.folders[wd] = folder
+
+    def read_events(self, timeout):
+        # Yields (folder, name) pairs; (None, None) when the kernel queue overflowed
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, pos)
+            name = data[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + length].rstrip(b"\0")
+            pos += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                yield None, None
+            elif wd in self.folders:
+                yield self.folders[wd], os.fsdecode(name)
+
+
+class FileWatcher:
+    # Publishes one process-wide, monotonically increasing data version. A watched
+    # file's version only moves when its contents really changed (its signature
+    # differs), so every consumer reloads exactly once per change.
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._counter = 0
+        self._versions = {}
+        self._signatures = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._by_folder = collections.defaultdict(set)
+        self._polled_folders = set()
+        try:
+            if not sys.platform.startswith("linux"):
+                raise OSError("inotify is Linux only")
+            self._inotify = Inotify()
+            self.backend = "inotify"
+        except (OSError, AttributeError):
+            self._inotify = None
+            self.backend = "polling"
+        threading.Thread(target=self._run, name="file-watcher", daemon=True).start()
+
+    def watch(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self._versions:
+                return self._versions[path]
+            folder = os.path.dirname(path)
+            if self._inotify is not None and folder not in self._by_folder:
+                try:
+                    self._inotify.add_folder(folder)
+                except OSError:
+                    self._polled_folders.add(folder)  # e.g. watch limit reached: poll this one instead
+            self._by_folder[folder].add(path)
+            self._counter += 1
+            self._versions[path] = self._counter
+            self._signatures[path] = file_signature(path)
+            return self._counter
+
+    def version(self, path):
+        path = os.path.abspath(path)
+        version = self._versions.get(path)
+        return version if version is not None else self.watch(path)
+
+    def notify(self, path):
+        # For writers in this process: publish the change now instead of when the event arrives
+        path = os.path.abspath(path)
+        if path in self._versions:
+            self._check(path)
+
+    def add_listener(self, callback):
+        # callback(path, version) runs on the watcher (or writer) thread after each change
+        self._listeners.append(callback)
+
+    def wait_for_change(self, path, version, timeout=None):
+        path = os.path.abspath(path)
+        with self._changed:
+            self._changed.wait_for(lambda: self._versions.get(path, 0) != version, timeout)
+            return self._versions.get(path, 0)
+
+    def _check(self, path):
+        signature = file_signature(path)
+        with self._lock:
+            if signature == self._signatures.get(path):
+                return
+            self._counter += 1
+            self._versions[path] = version = self._counter
+            self._signatures[path] = signature
+            self._changed.notify_all()
+        for callback in self._listeners:
+            try:
+                callback(path, version)
+            except Exception:
+                pass
+
+    def _check_all(self):
+        for path in list(self._versions):
+            self._check(path)
+
+    def _run(self):
+        while True:
+            if self._inotify is None:
+                self._check_all()
+                time.sleep(self.poll_interval)
+                continue
+            touched = set()
+            for folder in list(self._polled_folders):
+                touched.update(list(self._by_folder[folder]))
+            for folder, name in self._inotify.read_events(self.poll_interval):
+                if folder is None:
+                    touched.update(list(self._versions))
+                else:
+                    path = os.path.join(folder, name)
+                    if path in self._by_folder.get(folder, ()):
+                        touched.add(path)
+            for path in touched:
+                self._check(path)
+
+
+def watch_in_page(path, version=None, every=2):
+    # For Streamlit pages: a fragment that reruns the page once `path` has a version newer
+    # than `version` (the one the page was drawn from; by default the current one). Only
+    # the watcher's in-memory version is compared, never the file itself.
+    import streamlit as st  # pages only; the server and loaders use the watcher without it
+    watcher = get_file_watcher()
+    if version is None:
+        version = watcher.version(path)
+
+    @st.fragment(run_every=every)
+    def reload_on_change():
+        if watcher.version(path) != version:
+            st.rerun()
+
+    reload_on_change()
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def get_file_watcher():
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = FileWatcher()
+            get_writer().add_commit_listener(lambda path, frame: _watcher.notify(path))
+    return _watcher
@@ -0,0 +1,161 @@
+import argparse
+import io
+import os
+
+import pandas as pd
+
+from inventory_io import CHUNK_SIZE, clean_barcode_series, iter_table_chunks, rename_aliases, row_hashes
+
+KEY_COLUMNS = ["BARCODE", "OCCURRENCE"]
+
+def normalise_columns(columns):
+    # Upper-cased headers with aliases given their field name, so exports that spell a column differently still pair up
+    names = [str(c).strip().upper() for c in columns]
+    return list(rename_aliases(pd.DataFrame(columns=names)).columns)
+
+def strip_whole_decimals(s):
+    # "12.0" from an Excel cell and "12" from a CSV are the same value; only touch the few candidates
+    candidates = s.str.endswith("0") & s.str.contains(".", regex=False)
+    if not candidates.any():
+        return s
+    return s.where(~candidates, s[candidates].str.replace(r"^(-?\d+)\.0+$", r"\1", regex=True))
+
+def normalise_values(chunk):
+    # Same spelling for the same value whether it came from Excel or a CSV export
+    values = chunk.fillna("").astype(str).apply(lambda s: strip_whole_decimals(s.str.strip()))
+    values = values.replace({"nan": "", "NaT": "", "None": ""})
+    if "RRP" in values.columns:
+        values["RRP"] = values["RRP"].str.replace("$", "", regex=False).str.strip()
+    return values
+
+def read_fields(path):
+    first = next(iter_table_chunks(path, path, chunksize=1), None)
+    return list(dict.fromkeys(normalise_columns(first.columns))) if first is not None else []
+
+def keyed_chunks(path, fields, chunksize=CHUNK_SIZE, wanted=None):
+    # Rows keyed on (BARCODE, n-th time that barcode was seen) so duplicates pair up in order.
+    # With `wanted`, other rows are dropped before the (costly) value normalisation.
+    seen = pd.Series(dtype="int64")
+    for chunk in iter_table_chunks(path, path, chunksize):
+        chunk = chunk.set_axis(normalise_columns(chunk.columns), axis=1)
+        chunk = chunk.loc[:, ~chunk.columns.duplicated()]
+        codes = clean_barcode_series(chunk["BARCODE"])
+        present = codes.ne("").to_numpy()
+        chunk, codes = chunk[present], codes[present]
+        occurrence = codes.groupby(codes).cumcount().to_numpy() + codes.map(seen).fillna(0).astype("int64").to_numpy()
+        seen = seen.add(codes.value_counts(), fill_value=0).astype("int64")
+        if wanted is not None:
+            keep = pd.MultiIndex.from_arrays([codes, occurrence]).isin(wanted)
+            chunk, codes, occurrence = chunk[keep], codes[keep], occurrence[keep]
+        values = normalise_values(chunk.reindex(columns=fields))
+        values["BARCODE"] = codes.to_numpy()
+        yield values.assign(OCCURRENCE=occurrence)
+
+def hash_file(path, fields, chunksize=CHUNK_SIZE):
+    # First pass keeps only key + 8-byte hash per row, so big files never sit in memory whole.
+    # A file that fits in one chunk is kept as is, saving the second read.
+    parts = []
+    last = None
+    for values in keyed_chunks(path, fields, chunksize):
+        parts.append(pd.DataFrame({
+            "BARCODE": values["BARCODE"].to_numpy(),
+            "OCCURRENCE": values["OCCURRENCE"].to_numpy(),
+            "HASH": row_hashes(values[fields]).to_numpy(),
+        }))
+        last = values
+    if not parts:
+        empty = pd.DataFrame({"BARCODE": pd.Series(dtype=str), "OCCURRENCE": pd.Series(dtype="int64"), "HASH": pd.Series(dtype="uint64")})
+        return empty, None
+    return pd.concat(parts, ignore_index=True), last if len(parts) == 1 else None
+
+def collect_rows(path, fields, keys, chunksize=CHUNK_SIZE, rows=None):
+    # Second pass pulls back full rows for just the keys that differ
+    wanted = pd.MultiIndex.from_frame(keys[KEY_COLUMNS])
+    if not len(wanted):
+        return pd.DataFrame(columns=fields + ["OCCURRENCE"])
+    if rows is not None:
+        return rows[pd.MultiIndex.from_frame(rows[KEY_COLUMNS]).isin(wanted)]
+    return pd.concat(keyed_chunks(path, fields, chunksize, wanted), ignore_index=True)
+
+def field_changes(old_rows, new_rows, fields):
+    # Long format, one line per changed field: BARCODE, OCCURRENCE, FIELD, OLD, NEW
+    old = old_rows.set_index(KEY_COLUMNS)[fields].sort_index()
+    new = new_rows.set_index(KEY_COLUMNS)[fields].reindex(old.index)
+    differs = old.ne(new).to_numpy()
+    rows, cols = differs.nonzero()
+    keys = old.index[rows]
+    return pd.DataFrame({
+        "BARCODE": keys.get_level_values("BARCODE"),
+        "OCCURRENCE": keys.get_level_values("OCCURRENCE"),
+        "FIELD": [fields[c] for c in cols],
+        "OLD": old.to_numpy()[rows, cols],
+        "NEW": new.to_numpy()[rows, cols],
+    })
+
+def diff_files(old_path, new_path, chunksize=CHUNK_SIZE):
+    old_fields, new_fields = read_fields(old_path), read_fields(new_path)
+    if "BARCODE" not in old_fields or "BARCODE" not in new_fields:
+        raise ValueError("Both files need a BARCODE column to compare.")
+    fields = [f for f in old_fields if f in new_fields]
+    compared = [f for f in fields if f != "BARCODE"]
+
+    old_hashes, old_retained = hash_file(old_path, fields, chunksize)
+    new_hashes, new_retained = hash_file(new_path, fields, chunksize)
+    merged = old_hashes.merge(new_hashes, on=KEY_COLUMNS, how="outer", suffixes=("_OLD", "_NEW"), indicator=True)
+    removed_keys = merged[merged["_merge"] == "left_only"]
+    added_keys = merged[merged["_merge"] == "right_only"]
+    both = merged[merged["_merge"] == "both"]
+    changed_keys = both[both["HASH_OLD"] != both["HASH_NEW"]]
+
+    old_rows = collect_rows(old_path, fields, pd.concat([removed_keys, changed_keys]), chunksize, old_retained)
+    new_rows = collect_rows(new_path, fields, pd.concat([added_keys, changed_keys]), chunksize, new_retained)
+    changed_index = pd.MultiIndex.from_frame(changed_keys[KEY_COLUMNS])
+    old_changed = old_rows[pd.MultiIndex.from_frame(old_rows[KEY_COLUMNS]).isin(changed_index)]
+    new_changed = new_rows[pd.MultiIndex.from_frame(new_rows[KEY_COLUMNS]).isin(changed_index)]
+    return {
+        "fields": fields,
+        "only_in_old": [f for f in old_fields if f not in new_fields],
+        "only_in_new": [f for f in new_fields if f not in old_fields],
+        "old_rows": len(old_hashes),
+        "new_rows": len(new_hashes),
+        "unchanged": len(both) - len(changed_keys),
+        "added": new_rows[pd.MultiIndex.from_frame(new_rows[KEY_COLUMNS]).isin(pd.MultiIndex.from_frame(added_keys[KEY_COLUMNS]))].drop(columns="OCCURRENCE"),
+        "removed": old_rows[pd.MultiIndex.from_frame(old_rows[KEY_COLUMNS]).isin(pd.MultiIndex.from_frame(removed_keys[KEY_COLUMNS]))].drop(columns="OCCURRENCE"),
+        "changed": field_changes(old_changed, new_changed, compared).drop(columns="OCCURRENCE"),
+        "changed_rows": len(changed_keys),
+    }
+
+def diff_to_excel(result):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        result["added"].to_excel(writer, sheet_name="Added", index=False)
+        result["removed"].to_excel(writer, sheet_name="Removed", index=False)
+        result["changed"].to_excel(writer, sheet_name="Changed", index=False)
+    return buffer.getvalue()
+
+def diff_to_csv(result):
+    # One flat table: added/removed rows as whole records, changes one field per line
+    combined = pd.concat([
+        result["added"].assign(STATUS="added"),
+        result["removed"].assign(STATUS="removed"),
+        result["changed"].assign(STATUS="changed"),
+    ], ignore_index=True)
+    leading = ["STATUS", "BARCODE", "FIELD", "OLD", "NEW"]
+    cols = [c for c in leading if c in combined.columns] + [c for c in combined.columns if c not in leading]
+    return combined[cols].fillna("").to_csv(index=False).encode("utf-8")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare two inventory snapshots by BARCODE.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--out", help="Write the diff to this .xlsx or .csv file")
+    args = parser.parse_args()
+    result = diff_files(args.old, args.new)
+    print(f"{len(result['added'])} added, {len(result['removed'])} removed, "
+          f"{result['changed_rows']} changed ({len(result['changed'])} fields), {result['unchanged']} unchanged")
+    if args.out:
+        data = diff_to_excel(result) if args.out.lower().endswith(".xlsx") else diff_to_csv(result)
+        with open(args.out, "wb") as f:
+            f.write(data)
+        print(f"Wrote {os.path.abspath(args.out)}")
@@ -0,0 +1,230 @@
+import os
+import pandas as pd
+
+from perf_metrics import span
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INVENTORY_FOLDER = os.path.join(BASE_DIR, "Inventory")
+STATE_FOLDER = os.path.join(BASE_DIR, "state")
+SCANNED_FILE = os.path.join(BASE_DIR, "scanned_barcodes.csv")
+UNFOUND_FILE = os.path.join(BASE_DIR, "unfound_barcodes.csv")
+
+INVENTORY_EXTENSIONS = ('.xlsx', '.csv')
+
+# Columns the pages show and edit, in display order
+VISIBLE_FIELDS = [
+    "BARCODE", "LOCATION", "FRAMENUM", "MANUFACT", "MODEL", "SIZE",
+    "FCOLOUR", "FRAMETYPE", "F GROUP", "SUPPLIER", "QUANTITY", "F TYPE", "TEMPLE",
+    "DEPTH", "DIAG", "BASECURVE", "RRP", "EXCOSTPR", "COST PRICE", "TAXPC",
+    "FRSTATUS", "AVAILFROM", "NOTE"
+]
+CHUNK_SIZE = 100_000
+# Other spreadsheets and POS exports use different headers for some fields. The first
+# name present in a file is the one read, so every module reads the same column.
+FIELD_ALIASES = {
+    "FRAMENUM": ["FRAMENUM", "FRAME NO."],
+    "MANUFACT": ["MANUFACT", "MANUFACTURER"],
+    "FCOLOUR": ["FCOLOUR", "F COLOUR"],
+    "F GROUP": ["F GROUP", "FRAMEGROUP"],
+    "AVAILFROM": ["AVAILFROM", "AVAIL FROM"],
+    "COST PRICE": ["COST PRICE", "COSTPRICE", "EXCOSTPR"],
+}
+# Header -> field, for readers that rename columns one at a time
+COLUMN_ALIASES = {alias: field for field, names in FIELD_ALIASES.items() for alias in names if alias != field}
+
+def clean_nans(df):
+    return df.replace([pd.NA, 'nan'], '', regex=True)
+
+def force_all_columns_to_string(df):
+    for col in df.columns:
+        df[col] = df[col].astype(str)
+    return df
+
+def clean_barcode(val):
+    if pd.isnull(val) or val == "":
+        return ""
+    s = str(val).strip().replace('\u200b','').replace('\u00A0','')
+    try:
+        # Plain digits are read exactly; only decimals and exponents (10236.0, 1e20) go via float
+        s = str(int(s)) if s.lstrip("+-").isdigit() else str(int(float(s)))
+    except (ValueError, OverflowError):
+        pass
+    return s
+
+def clean_barcode_series(s):
+    # Vectorised clean_barcode for whole columns. Most codes are already canonical
+    # (digits, no leading zero, short enough for int64), so only the rest are parsed.
+    missing = s.isna()
+    s = s.astype(str)
+    canonical = s.str.fullmatch(r"[1-9][0-9]{0,17}").fillna(False).astype(bool)
+    if canonical.all():
+        return s
+    rest = s[~canonical].str.strip().str.replace('\u200b', '', regex=False).str.replace('\u00A0', '', regex=False)
+    # Only number-shaped text can come out different; framecodes and the like skip the parse
+    number_like = rest.str.fullmatch(r"[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?").fillna(False).astype(bool)
+    numeric = pd.to_numeric(rest.where(number_like), errors="coerce").astype("float64")
+    # Below 2**53 a float holds the value exactly, so both ways of reading it agree;
+    # the rare longer ones go through clean_barcode itself
+    exact = numeric.notna() & numeric.abs().lt(2**53)
+    rest = rest.where(~exact, numeric.where(exact, 0).astype("int64").astype(str))
+    long_numbers = number_like & ~exact
+    if long_numbers.any():
+        rest[long_numbers] = rest[long_numbers].map(clean_barcode)
+    s = s.where(canonical, rest)
+    return s.mask(missing | s.eq(""), "")
+
+def format_rrp(val):
+    try:
+        f = float(str(val).replace("$", "").strip())
+        return f"${f:.2f}"
+    except Exception:
+        return "$0.00"
+
+def source_column(frame, field):
+    # The column holding `field` in this frame, or None
+    return next((name for name in FIELD_ALIASES.get(field, [field]) if name in frame.columns), None)
+
+def rename_aliases(frame):
+    # Aliased columns renamed to the field they hold
+    renames = {}
+    for field in FIELD_ALIASES:
+        name = source_column(frame, field)
+        if name is not None and name != field:
+            renames[name] = field
+    return frame.rename(columns=renames) if renames else frame
+
+def list_inventory_files(folder=INVENTORY_FOLDER):
+    return [f for f in os.listdir(folder) if f.lower().endswith(INVENTORY_EXTENSIONS)]
+
+def default_inventory_file(folder=INVENTORY_FOLDER):
+    # Same default the Streamlit pages pick when nothing is selected
+    files = list_inventory_files(folder)
+    return os.path.join(folder, files[0]) if files else None
+
+def state_path(name):
+    os.makedirs(STATE_FOLDER, exist_ok=True)
+    return os.path.join(STATE_FOLDER, name)
+
+# --- Reading ---
+def read_table(path):
+    if path.lower().endswith('.xlsx'):
+        with span("read_excel"):
+            return pd.read_excel(path)
+    elif path.lower().endswith('.csv'):
+        with span("read_csv"):
+            return pd.read_csv(path)
+    raise ValueError(f"Unsupported inventory file type: {path}")
+
+def normalise_inventory(df):
+    df = force_all_columns_to_string(df)
+    df.rename(columns={"FRAME NO.": "FRAMENUM"}, inplace=True)
+    if "BARCODE" in df.columns:
+        with span("clean_barcode"):
+            df["BARCODE"] = df["BARCODE"].map(clean_barcode)
+        cols = list(df.columns)
+        cols.insert(0, cols.pop(cols.index("BARCODE")))
+        df = df[cols]
+    if "RRP" in df.columns:
+        df["RRP"] = df["RRP"].apply(lambda x: str(x).replace("$", "").strip())
+    return df
+
+def iter_excel_chunks(source, chunksize=CHUNK_SIZE):
+    import openpyxl  # only needed for Excel uploads, so kept off the startup path
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        wb.close()
+
+def iter_table_chunks(source, name, chunksize=CHUNK_SIZE):
+    name = name.lower()
+    if name.endswith('.xlsx'):
+        yield from iter_excel_chunks(source, chunksize)
+    elif name.endswith(('.csv', '.txt')):
+        yield from pd.read_csv(source, dtype=str, chunksize=chunksize, sep=None if name.endswith('.txt') else ',', engine="python" if name.endswith('.txt') else "c")
+    else:
+        raise ValueError(f"Unsupported file type: {name}")
+
+def load_inventory_file(path):
+    with span("load_inventory"):
+        return normalise_inventory(read_table(path))
+
+# --- Stocktake tables ---
+def format_inventory_table(input_df):
+    cols = [col for col in VISIBLE_FIELDS if col in input_df.columns]
+    df_disp = input_df[cols]
+    if "BARCODE" in df_disp.columns:
+        df_disp = df_disp.assign(BARCODE=df_disp["BARCODE"].map(clean_barcode))
+    if "RRP" in df_disp.columns:
+        df_disp = df_disp.assign(RRP=df_disp["RRP"].apply(format_rrp).astype(str))
+    return clean_nans(df_disp)
+
+def scanned_products(df, scanned_barcodes, barcode_col="BARCODE"):
+    # Inventory rows that have been scanned, most recent scan first
+    ordered_barcodes = list(reversed(scanned_barcodes))
+    present_barcodes = [b for b in ordered_barcodes if b in df[barcode_col].values]
+    scanned_df = df[df[barcode_col].isin(present_barcodes)]
+    if scanned_df.empty:
+        return scanned_df
+    return scanned_df.assign(
+        __order=scanned_df[barcode_col].apply(lambda x: present_barcodes.index(x))
+    ).sort_values('__order').drop(columns='__order')
+
+def read_scanned_frame(path=SCANNED_FILE):
+    if os.path.exists(path):
+        return pd.read_csv(path, dtype={"barcode": str})
+    return pd.DataFrame(columns=["barcode"])
+
+def read_unfound_frame(path=UNFOUND_FILE):
+    if os.path.exists(path):
+        return pd.read_csv(path, dtype={"barcode": str})
+    return pd.DataFrame(columns=["barcode", "timestamp"])
+
+def row_hashes(df):
+    # One uint64 per row over every column, for cheap change detection
+    return pd.util.hash_pandas_object(df, index=False, categorize=False)
+
+# --- Writing ---
+def prepare_for_save(df):
+    with span("prepare_for_save"):
+        df = clean_nans(df)
+        df = force_all_columns_to_string(df)
+        if "BARCODE" in df.columns:
+            df["BARCODE"] = df["BARCODE"].map(clean_barcode)
+        if "RRP" in df.columns:
+            df["RRP"] = df["RRP"].apply(format_rrp)
+        return df
+
+def as_loaded(df):
+    # A frame from prepare_for_save in the form load_inventory_file gives for the saved
+    # file: blanks missing (BARCODE stays ""), RRP without "$"
+    with span("as_loaded"):
+        loaded = df.mask(df.eq(""))
+        if "BARCODE" in df.columns:
+            loaded["BARCODE"] = df["BARCODE"]
+        if "RRP" in df.columns:
+            loaded["RRP"] = loaded["RRP"].str.replace("$", "", regex=False).str.strip()
+        return loaded
+
+def write_table(df, path, target=None):
+    # `target` decides the format, so temp files can carry any extension
+    target = target or path
+    if target.lower().endswith('.xlsx'):
+        with span("write_excel"), open(path, "wb") as f:
+            df.to_excel(f, index=False, engine="openpyxl")
+    elif target.lower().endswith('.csv'):
+        with span("write_csv"):
+            df.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unsupported inventory file type: {target}")
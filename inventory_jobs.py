@@ -0,0 +1,93 @@
+import io
+import zipfile
+
+import pandas as pd
+
+from barcode_images import render_barcode
+from data_quality import get_data_quality_scanner, report_to_csv
+from inventory_io import clean_barcode_series, clean_nans, iter_table_chunks
+from perf_metrics import timed
+from supplier_catalogue import get_supplier_catalogue
+
+# Work functions for the background job runner. Each takes the job first and
+# reports progress through it, which is also where a cancel request stops it.
+READ_CHUNK_SIZE = 20_000
+REPORT_EVERY = 1000
+
+def read_upload(job, data, name):
+    # Stock count uploads can be large; read them in chunks so progress shows
+    lower = name.lower()
+    estimated_rows = max(data.count(b"\n"), 1) if lower.endswith((".csv", ".txt")) else None
+    chunks = []
+    rows = 0
+    for chunk in iter_table_chunks(io.BytesIO(data), name, READ_CHUNK_SIZE):
+        chunks.append(chunk)
+        rows += len(chunk)
+        job.report(rows / estimated_rows if estimated_rows else None, f"Read {rows:,} rows")
+    if not chunks:
+        return pd.DataFrame()
+    frame = pd.concat(chunks, ignore_index=True)
+    frame.columns = [str(c) for c in frame.columns]
+    return clean_nans(frame.astype(str))
+
+def import_catalogue(job, data, name, supplier=None):
+    # Catalogues run to hundreds of thousands of rows; each chunk is committed as it goes
+    lower = name.lower()
+    estimated_rows = max(data.count(b"\n"), 1) if lower.endswith((".csv", ".txt")) else None
+    def progress(rows):
+        job.report(rows / estimated_rows if estimated_rows else None, f"Imported {rows:,} rows")
+    return get_supplier_catalogue().import_bytes(data, name, supplier, progress)
+
+@timed("reconcile_stock_count")
+def reconcile_stock_count(job, inventory, barcode_col, scanned, scanned_col):
+    job.report(0.1, "Matching barcodes...")
+    inventory_codes = clean_barcode_series(inventory[barcode_col])
+    scanned_codes = clean_barcode_series(scanned[scanned_col])
+    scanned_codes = scanned_codes[scanned_codes.ne("")]
+    counted = inventory_codes.isin(scanned_codes)
+    job.report(0.6, "Collecting results...")
+    present = inventory_codes.ne("")
+    unexpected = pd.Index(scanned_codes.unique()).difference(pd.Index(inventory_codes[present].unique()))
+    return {
+        "matched": clean_nans(inventory[counted & present]),
+        "missing": clean_nans(inventory[~counted & present]),
+        "unexpected": unexpected.tolist(),
+        "matched_count": inventory_codes[counted & present].nunique(),
+        "missing_count": inventory_codes[~counted & present].nunique(),
+    }
+
+@timed("export_excel")
+def export_excel(job, frame, sheet_name="Inventory"):
+    # Streams rows through a write-only workbook instead of one blocking to_excel call
+    import openpyxl  # loaded with the first export rather than at page startup
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.append([str(c) for c in frame.columns])
+    total = max(len(frame), 1)
+    for i, row in enumerate(frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)):
+        ws.append(row)
+        if i % REPORT_EVERY == 0:
+            job.report(i / total * 0.9, f"Wrote {i:,} of {len(frame):,} rows")
+    job.report(0.95, "Saving workbook...")
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def prerender_barcodes(job, codes, write_text=False):
+    # Warms the label cache and bundles the PNGs for download
+    codes = [c for c in dict.fromkeys(codes) if c]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for i, code in enumerate(codes):
+            archive.writestr(f"{code.replace('/', '_')}.png", render_barcode(code, write_text=write_text))
+            if i % 20 == 0:
+                job.report(i / max(len(codes), 1), f"Rendered {i:,} of {len(codes):,} barcodes")
+    return buffer.getvalue()
+
+def check_data_quality(job, path, frame):
+    # Runs off the page so a long scan never holds the shared snapshot
+    job.report(0.1, "Checking the catalogue...")
+    result = get_data_quality_scanner().scan(path, frame)
+    job.report(0.9, "Writing the fix-up report...")
+    result["csv"] = report_to_csv(result)
+    return result
@@ -0,0 +1,234 @@
+import atexit
+import collections
+import contextlib
+import logging
+import os
+import queue
+import threading
+import time
+
+from inventory_io import load_inventory_file, write_table
+from perf_metrics import get_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# --- File locking and atomic replacement ---
+_thread_locks = collections.defaultdict(threading.Lock)
+
+@contextlib.contextmanager
+def file_lock(path):
+    # Serialises writers across threads (in-process) and processes (flock on a sidecar file)
+    with _thread_locks[os.path.abspath(path)]:
+        if fcntl is None:
+            yield
+            return
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def atomic_write(path, write_fn):
+    folder, name = os.path.split(os.path.abspath(path))
+    tmp_path = os.path.join(folder, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        write_fn(tmp_path)
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def atomic_write_table(df, path):
+    atomic_write(path, lambda tmp_path: write_table(df, tmp_path, target=path))
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# --- Background group-commit writer ---
+class WriteTicket:
+    def __init__(self):
+        self._done = threading.Event()
+        self.error = None
+        self.result = None
+
+    def _finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=30):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Timed out waiting for the inventory write to commit.")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class InventoryWriter:
+    # Mutations are callables taking the current frame and returning the new one.
+    # They must not modify their input: a mutation that raises is skipped and the
+    # frame it was given is passed on to the next mutation in the batch.
+    def __init__(self, max_latency=0.05, max_batch=500):
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._frames = {}
+        self._flush_times = collections.deque(maxlen=200)
+        self._stats = {"flushes": 0, "mutations": 0, "failed_mutations": 0, "files_written": 0}
+        self._stats_lock = threading.Lock()
+        self._commit_listeners = []
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="inventory-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, path, mutation, loader=load_inventory_file, saver=atomic_write_table, on_commit=None):
+        # on_commit(frame) runs on the writer thread once this mutation is durably written
+        ticket = WriteTicket()
+        self._queue.put((os.path.abspath(path), mutation, loader, saver, ticket, on_commit))
+        self._ensure_started()
+        return ticket
+
+    def apply(self, path, mutation, loader=load_inventory_file, saver=atomic_write_table, on_commit=None, timeout=30):
+        return self.submit(path, mutation, loader, saver, on_commit).wait(timeout)
+
+    def flush(self, timeout=30):
+        ticket = WriteTicket()
+        self._queue.put((None, None, None, None, ticket, None))
+        self._ensure_started()
+        ticket.wait(timeout)
+
+    def add_commit_listener(self, callback):
+        # callback(path, frame) runs on the writer thread after every successful commit
+        self._commit_listeners.append(callback)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            flush_times = list(self._flush_times)
+        stats["queue_depth"] = self.queue_depth()
+        stats["last_flush_ms"] = flush_times[-1] if flush_times else 0.0
+        stats["avg_flush_ms"] = sum(flush_times) / len(flush_times) if flush_times else 0.0
+        stats["max_flush_ms"] = max(flush_times) if flush_times else 0.0
+        return stats
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            by_path = collections.OrderedDict()
+            barriers = []
+            for item in batch:
+                if item[0] is None:
+                    barriers.append(item[4])
+                else:
+                    by_path.setdefault(item[0], []).append(item)
+            written = 0
+            for path, items in by_path.items():
+                written += self._commit(path, items)
+            elapsed = time.perf_counter() - started
+            elapsed_ms = elapsed * 1000
+            if written:
+                get_metrics().observe("writer_flush", elapsed)
+            with self._stats_lock:
+                self._stats["flushes"] += 1
+                self._stats["files_written"] += written
+                self._flush_times.append(elapsed_ms)
+            for ticket in barriers:
+                ticket._finish()
+
+    def _load(self, path, loader):
+        signature = file_signature(path)
+        cached = self._frames.get(path)
+        if cached is not None and cached[0] == signature and cached[1] is loader:
+            return cached[2]
+        return loader(path)
+
+    def _commit(self, path, items):
+        _, _, loader, saver, _, _ = items[0]
+        applied = []
+        try:
+            with file_lock(path):
+                frame = self._load(path, loader)
+                for _, mutation, _, _, ticket, on_commit in items:
+                    try:
+                        frame = mutation(frame)
+                        applied.append((ticket, on_commit))
+                    except Exception as e:
+                        ticket._finish(error=e)
+                with self._stats_lock:
+                    self._stats["mutations"] += len(applied)
+                    self._stats["failed_mutations"] += len(items) - len(applied)
+                if not applied:
+                    return 0
+                saver(frame, path)
+                self._frames[path] = (file_signature(path), loader, frame)
+        except Exception as e:
+            self._frames.pop(path, None)
+            for _, _, _, _, ticket, _ in items:
+                if not ticket.done():
+                    ticket._finish(error=e)
+            return 0
+        for _, on_commit in applied:
+            if on_commit is not None:
+                try:
+                    on_commit(frame)
+                except Exception:
+                    # The save stands; a failed follow-up must not fail the write
+                    log.exception("on_commit callback for %s failed", path)
+        for callback in self._commit_listeners:
+            try:
+                callback(path, frame)
+            except Exception:
+                log.exception("Commit listener %r for %s failed", callback, path)
+        for ticket, _ in applied:
+            ticket._finish(result=frame)
+        return 1
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    # One writer per process, shared by every Streamlit session
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = InventoryWriter()
+            atexit.register(_writer.flush)
+    return _writer
@@ -0,0 +1,44 @@
+import streamlit as st
+
+from job_runner import CANCELLED, DONE, FAILED, get_job_runner
+
+POLL_SECONDS = 1.0
+
+def show_job(job, key, download_name=None, mime=None):
+    # Only this fragment reruns while the job is going; the page reruns once when it ends
+    runner = get_job_runner()
+    was_done = job.done()
+
+    @st.fragment(run_every=None if was_done else POLL_SECONDS)
+    def status():
+        current = runner.get(job.id)
+        if current is None:
+            st.info("This job has expired; start it again.")
+            return
+        if current.status == DONE:
+            if download_name is not None:
+                st.download_button(
+                    label=f"⬇️ Download {current.label}",
+                    data=current.result,
+                    file_name=download_name,
+                    mime=mime,
+                    key=f"{key}_download",
+                )
+            else:
+                st.caption(f"✅ {current.label} finished in {current.elapsed():.1f}s.")
+        elif current.status == FAILED:
+            st.error(f"❌ {current.label} failed: {current.message}")
+        elif current.status == CANCELLED:
+            st.warning(f"⚠️ {current.label} was cancelled.")
+        else:
+            progress_col, cancel_col = st.columns([5, 1])
+            with progress_col:
+                st.progress(current.progress, text=f"{current.label}: {current.message}")
+            with cancel_col:
+                if st.button("Cancel", key=f"{key}_cancel"):
+                    runner.cancel(current.id)
+        if current.done() != was_done:
+            st.rerun()
+
+    status()
+    return runner.get(job.id)
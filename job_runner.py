@@ -0,0 +1,151 @@
+import atexit
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+KEEP_FINISHED = 50
+
+log = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    # Work functions get the job as their first argument and call report() as they go;
+    # report() is also where a cancel request is noticed.
+    def __init__(self, job_id, kind, label, cache_key=None):
+        self.id = job_id
+        self.kind = kind
+        self.label = label
+        self.cache_key = cache_key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting to start..."
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def report(self, progress=None, message=None):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.status in FINISHED
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobRunner:
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inventory-job")
+        self._jobs = {}
+        self._by_key = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, label=None, cache_key=None, **kwargs):
+        # A job with the same cache key that is still running, or finished fine, is reused
+        with self._lock:
+            if cache_key is not None:
+                existing = self._jobs.get(self._by_key.get(cache_key))
+                if existing is not None and existing.status not in (FAILED, CANCELLED):
+                    return existing
+            job = Job(next(self._ids), kind, label or kind, cache_key)
+            self._jobs[job.id] = job
+            if cache_key is not None:
+                self._by_key[cache_key] = job.id
+            self._prune()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.started = time.time()
+        try:
+            if job.cancelled:
+                raise JobCancelled()
+            job.status = RUNNING
+            job.message = "Running..."
+            job.result = fn(job, *args, **kwargs)
+            job.progress = 1.0
+            job.message = "Finished."
+            job.status = DONE
+        except JobCancelled:
+            job.message = "Cancelled."
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.message = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+            log.exception("Job %s (%s) failed", job.id, job.label)
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        # Bound the job table: forget the oldest finished jobs (and their artefacts)
+        finished = [job for job in self._jobs.values() if job.done()]
+        for job in sorted(finished, key=lambda j: j.finished)[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.cache_key) == job.id:
+                del self._by_key[job.cache_key]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def find(self, cache_key):
+        return self._jobs.get(self._by_key.get(cache_key))
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def jobs(self, kind=None):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted((j for j in jobs if kind is None or j.kind == kind), key=lambda j: j.id, reverse=True)
+
+    def shutdown(self):
+        for job in self.jobs():
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_job_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+            atexit.register(_runner.shutdown)
+    return _runner
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import webbrowser
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_PORT = 5001
+STREAMLIT_PORT = 8501
+PROBE_INTERVAL = 0.25
+READY_TIMEOUT = 120
+
+# Starts the barcode server and the Streamlit app side by side and waits on their
+# health endpoints instead of fixed sleeps.
+SERVICES = {
+    "barcode_server": {
+        "command": [sys.executable, "barcode_server.py"],
+        "probe": f"http://localhost:{SERVER_PORT}/healthz",
+    },
+    "streamlit": {
+        "command": [sys.executable, "run_inventory.py", "--port", str(STREAMLIT_PORT)],
+        "probe": f"http://localhost:{STREAMLIT_PORT}/_stcore/health",
+    },
+}
+
+
+def probe(url, timeout=1.0):
+    # Returns the response body on HTTP 200, None while the service is not answering yet
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.read() if resp.status == 200 else None
+    except (urllib.error.URLError, OSError):
+        return None
+
+def index_state(body):
+    try:
+        return json.loads(body).get("index")
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+def wait_until_ready(name, process, url, started, timings, index_timeout):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            timings[name] = None
+            print(f"✗ {name} exited with code {process.returncode} before it was ready", flush=True)
+            return
+        body = probe(url)
+        if body is not None:
+            timings[name] = time.perf_counter() - started
+            print(f"✓ {name} ready in {timings[name]:.2f}s", flush=True)
+            break
+        time.sleep(PROBE_INTERVAL)
+    else:
+        timings[name] = None
+        print(f"✗ {name} not ready after {READY_TIMEOUT}s", flush=True)
+        return
+    if name != "barcode_server":
+        return
+    # The server answers at once and builds the barcode index in the background
+    deadline = time.monotonic() + index_timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        state = index_state(probe(url))
+        if state in ("ready", "failed"):
+            timings["barcode_index"] = time.perf_counter() - started if state == "ready" else None
+            print(f"{'✓' if state == 'ready' else '✗'} barcode index {state} after {time.perf_counter() - started:.2f}s", flush=True)
+            return
+        time.sleep(PROBE_INTERVAL)
+
+def launch(services, open_browser=True, index_timeout=READY_TIMEOUT):
+    started = time.perf_counter()
+    processes = {
+        name: subprocess.Popen(SERVICES[name]["command"], cwd=BASE_DIR)
+        for name in services
+    }
+    timings = {}
+    waiters = [
+        threading.Thread(target=wait_until_ready, args=(name, process, SERVICES[name]["probe"], started, timings, index_timeout))
+        for name, process in processes.items()
+    ]
+    for waiter in waiters:
+        waiter.start()
+    for waiter in waiters:
+        waiter.join()
+    ready = [t for t in timings.values() if t is not None]
+    if ready and all(timings.get(name) is not None for name in services):
+        print(f"All services ready in {max(ready):.2f}s", flush=True)
+        if open_browser and "streamlit" in services:
+            webbrowser.open(f"http://localhost:{STREAMLIT_PORT}/")
+    return processes, timings
+
+def stop(processes):
+    for process in processes.values():
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+    for process in processes.values():
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Start the inventory services and wait until they are ready.")
+    parser.add_argument("--only", nargs="+", choices=list(SERVICES), default=list(SERVICES))
+    parser.add_argument("--no-browser", action="store_true")
+    parser.add_argument("--exit-when-ready", action="store_true", help="Report startup times, then stop the services")
+    args = parser.parse_args()
+
+    processes, timings = launch(args.only, open_browser=not args.no_browser)
+    failed = any(timings.get(name) is None for name in args.only)
+    if args.exit_when_ready or failed:
+        stop(processes)
+        sys.exit(1 if failed else 0)
+    try:
+        while all(process.poll() is None for process in processes.values()):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop(processes)
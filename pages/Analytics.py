@@ -0,0 +1,68 @@
+import os
+
+import streamlit as st
+
+from inventory_io import INVENTORY_FOLDER, list_inventory_files
+from file_watcher import watch_in_page
+from stock_analytics import DIMENSIONS, get_stock_analytics
+from perf_panel import finish_rerun, start_rerun, timed_dataframe
+
+rerun_started = start_rerun()
+
+st.set_page_config(layout="wide")
+
+st.title("Stock Analytics")
+
+inventory_files = list_inventory_files(INVENTORY_FOLDER)
+if not inventory_files:
+    st.error("No inventory files found in the 'Inventory' folder.")
+    st.stop()
+
+selected_file = inventory_files[0]
+if len(inventory_files) > 1:
+    selected_file = st.selectbox("Inventory file:", inventory_files, key="analytics_file")
+INVENTORY_FILE = os.path.join(INVENTORY_FOLDER, selected_file)
+
+watch_in_page(INVENTORY_FILE)
+
+# The totals are kept up to date as the file changes; the inventory itself is only
+# read when they have to catch up with a change made outside this app
+try:
+    report = get_stock_analytics().report(INVENTORY_FILE)
+except ValueError as e:
+    st.error(f"❌ {e}")
+    st.stop()
+
+totals = report["totals"]
+metric_cols = st.columns(5)
+metric_cols[0].metric("Products", f"{totals['PRODUCTS']:,.0f}")
+metric_cols[1].metric("Units in stock", f"{totals['UNITS']:,.0f}")
+metric_cols[2].metric("Retail value", f"${totals['RETAIL VALUE']:,.2f}")
+metric_cols[3].metric("Cost value", f"${totals['COST VALUE']:,.2f}")
+margin = 1 - totals["COST VALUE"] / totals["RETAIL VALUE"] if totals["RETAIL VALUE"] else 0.0
+metric_cols[4].metric("Margin at RRP", f"{margin:.0%}")
+if totals["UNPRICED"]:
+    st.caption(f"⚠️ {totals['UNPRICED']:,.0f} products have no usable RRP and count as $0.")
+if report["synced"] is not None:
+    added, removed = report["synced"]
+    st.caption(f"Caught up with {added:,} new and {removed:,} removed rows in {report['seconds']:.2f}s.")
+
+st.markdown("### Stock by Group")
+group_by = st.selectbox("Group by", [d for d in DIMENSIONS if d != "AVAILFROM"], key="analytics_group")
+measure = st.radio("Measure", ["RETAIL VALUE", "COST VALUE", "UNITS", "PRODUCTS"], horizontal=True, key="analytics_measure")
+grouped = report["tables"][group_by].sort_values(measure, ascending=False)
+if group_by in report["missing"]:
+    st.info(f"ℹ️ This file has no {group_by} column.")
+else:
+    st.bar_chart(grouped[measure].head(25))
+    timed_dataframe(grouped, "analytics", width='stretch')
+
+st.markdown("### Ageing by AVAILFROM")
+ageing = report["ageing"]
+if ageing.empty:
+    st.info("ℹ️ No products in stock.")
+else:
+    st.bar_chart(ageing[measure])
+    st.dataframe(ageing, width='stretch')
+
+finish_rerun("analytics", rerun_started)
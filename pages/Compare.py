@@ -0,0 +1,84 @@
+import os
+from datetime import datetime
+
+import streamlit as st
+
+from inventory_io import INVENTORY_FOLDER, list_inventory_files
+from inventory_diff import diff_files, diff_to_csv, diff_to_excel
+from perf_panel import finish_rerun, start_rerun
+
+rerun_started = start_rerun()
+
+st.set_page_config(layout="wide")
+
+st.title("Compare Inventory Snapshots")
+
+inventory_files = sorted(list_inventory_files(INVENTORY_FOLDER))
+if len(inventory_files) < 2:
+    st.info("Put at least two dated inventory copies in the Inventory folder to compare them.")
+    st.stop()
+
+old_col, new_col = st.columns(2)
+with old_col:
+    old_file = st.selectbox("Older snapshot", inventory_files, index=0, key="compare_old")
+with new_col:
+    new_file = st.selectbox("Newer snapshot", inventory_files, index=len(inventory_files) - 1, key="compare_new")
+
+@st.cache_data(show_spinner=False)
+def compare_files(old_path, new_path, old_mtime, new_mtime):
+    # mtimes are only part of the cache key, so an edited snapshot is compared again
+    return diff_files(old_path, new_path)
+
+if old_file == new_file:
+    st.warning("⚠️ Pick two different files.")
+    st.stop()
+
+old_path = os.path.join(INVENTORY_FOLDER, old_file)
+new_path = os.path.join(INVENTORY_FOLDER, new_file)
+try:
+    with st.spinner("Comparing..."):
+        result = compare_files(old_path, new_path, os.path.getmtime(old_path), os.path.getmtime(new_path))
+except ValueError as e:
+    st.error(f"❌ {e}")
+    st.stop()
+
+metric_cols = st.columns(4)
+metric_cols[0].metric("Added", len(result["added"]))
+metric_cols[1].metric("Removed", len(result["removed"]))
+metric_cols[2].metric("Changed", result["changed_rows"])
+metric_cols[3].metric("Unchanged", result["unchanged"])
+if result["only_in_old"] or result["only_in_new"]:
+    st.caption(
+        f"Columns only in {old_file}: {', '.join(result['only_in_old']) or 'none'}. "
+        f"Columns only in {new_file}: {', '.join(result['only_in_new']) or 'none'}. "
+        "These are left out of the comparison."
+    )
+
+added_tab, removed_tab, changed_tab = st.tabs(["➕ Added", "🗑 Removed", "✏️ Changed"])
+with added_tab:
+    st.dataframe(result["added"], width='stretch', hide_index=True)
+with removed_tab:
+    st.dataframe(result["removed"], width='stretch', hide_index=True)
+with changed_tab:
+    changed = result["changed"]
+    if not changed.empty:
+        field_filter = st.multiselect("Only show fields", sorted(changed["FIELD"].unique()), key="compare_fields")
+        if field_filter:
+            changed = changed[changed["FIELD"].isin(field_filter)]
+    st.dataframe(changed, width='stretch', hide_index=True)
+
+download_name = f"diff-{os.path.splitext(old_file)[0]}-vs-{os.path.splitext(new_file)[0]}_{datetime.now().strftime('%Y-%m-%d')}"
+st.download_button(
+    label="📄 Download as Excel",
+    data=diff_to_excel(result),
+    file_name=f"{download_name}.xlsx",
+    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+)
+st.download_button(
+    label="🗂️ Download as CSV",
+    data=diff_to_csv(result),
+    file_name=f"{download_name}.csv",
+    mime="text/csv"
+)
+
+finish_rerun("compare", rerun_started)
@@ -0,0 +1,98 @@
+import os
+from datetime import datetime
+
+import streamlit as st
+
+from inventory_io import INVENTORY_FOLDER, list_inventory_files
+from shared_inventory import get_shared_inventory
+from file_watcher import watch_in_page
+from job_runner import DONE, get_job_runner
+from job_panel import show_job
+from inventory_jobs import check_data_quality, export_excel
+from perf_panel import finish_rerun, start_rerun, timed_dataframe
+
+rerun_started = start_rerun()
+
+st.set_page_config(layout="wide")
+
+st.title("Data Quality")
+
+inventory_files = list_inventory_files(INVENTORY_FOLDER)
+if not inventory_files:
+    st.error("No inventory files found in the 'Inventory' folder.")
+    st.stop()
+
+selected_file = inventory_files[0]
+if len(inventory_files) > 1:
+    selected_file = st.selectbox("Inventory file to check:", inventory_files, key="quality_file")
+INVENTORY_FILE = os.path.join(INVENTORY_FOLDER, selected_file)
+
+try:
+    inventory = get_shared_inventory().get(INVENTORY_FILE)
+except ValueError as e:
+    st.error(f"❌ {e}")
+    st.stop()
+
+watch_in_page(INVENTORY_FILE, inventory.version)
+
+# Scanned once per file version by a background job shared by every session; rows
+# unchanged since the last scan reuse their result
+jobs = get_job_runner()
+scan_job = show_job(
+    jobs.submit("quality", check_data_quality, INVENTORY_FILE, inventory.frame,
+                label="Data quality check", cache_key=("data_quality", INVENTORY_FILE, inventory.version)),
+    "quality_scan",
+)
+if scan_job is None or scan_job.status != DONE:
+    finish_rerun("data_quality", rerun_started)
+    st.stop()
+result = scan_job.result
+
+summary = result["summary"]
+errors = int(summary.loc[summary["SEVERITY"] == "error", "ROWS"].sum())
+warnings = int(summary.loc[summary["SEVERITY"] == "warning", "ROWS"].sum())
+metric_cols = st.columns(4)
+metric_cols[0].metric("Rows", f"{result['rows']:,}")
+metric_cols[1].metric("Rows needing attention", f"{result['rows_with_issues']:,}")
+metric_cols[2].metric("Errors", f"{errors:,}")
+metric_cols[3].metric("Warnings", f"{warnings:,}")
+st.caption(f"{result['revalidated']:,} rows re-checked in {result['seconds']:.2f}s; the rest were unchanged since the last check.")
+
+st.markdown("### Summary")
+st.dataframe(summary[summary["ROWS"] > 0], width='stretch', hide_index=True)
+
+issues = result["issues"]
+if issues.empty:
+    st.success("✅ No problems found.")
+    finish_rerun("data_quality", rerun_started)
+    st.stop()
+
+st.markdown("### Fix-up Report")
+filter_col1, filter_col2 = st.columns(2)
+with filter_col1:
+    severity_filter = st.multiselect("Severity", ["error", "warning"], key="quality_severity")
+with filter_col2:
+    issue_filter = st.multiselect("Issue", sorted(issues["ISSUE"].unique()), key="quality_issue")
+shown = issues
+if severity_filter:
+    shown = shown[shown["SEVERITY"].isin(severity_filter)]
+if issue_filter:
+    shown = shown[shown["ISSUE"].isin(issue_filter)]
+st.caption("ROW is the spreadsheet row (the header is row 1). SUGGESTED is filled in where a likely correction could be worked out.")
+timed_dataframe(shown, "data_quality", width='stretch', hide_index=True)
+
+download_name = f"fixup-{os.path.splitext(selected_file)[0]}_{datetime.now().strftime('%Y-%m-%d')}"
+st.download_button(
+    label="🗂️ Download Fix-up Report (CSV)",
+    data=result["csv"],
+    file_name=f"{download_name}.csv",
+    mime="text/csv"
+)
+report_key = ("data_quality_excel", INVENTORY_FILE, inventory.version)
+if st.button("📄 Prepare Fix-up Report (Excel)", key="prepare_quality_excel_btn"):
+    jobs.submit("export", export_excel, issues, "Fix-up", label="Fix-up report", cache_key=report_key)
+if jobs.find(report_key) is not None:
+    show_job(jobs.find(report_key), "quality_excel", f"{download_name}.xlsx",
+             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+finish_rerun("data_quality", rerun_started)
@@ -0,0 +1,124 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+from inventory_io import INVENTORY_FOLDER, list_inventory_files, source_column
+from shared_inventory import get_shared_inventory
+from file_watcher import watch_in_page
+from repricing import (
+    METHODS, RULE_FIELDS, apply_repricing, describe_batch, reprice, repricing_batches, undo_repricing, validate_rules,
+)
+from perf_panel import finish_rerun, start_rerun, timed_dataframe
+
+rerun_started = start_rerun()
+
+st.set_page_config(layout="wide")
+
+st.title("Bulk Repricing")
+
+inventory_files = list_inventory_files(INVENTORY_FOLDER)
+if not inventory_files:
+    st.error("No inventory files found in the 'Inventory' folder.")
+    st.stop()
+
+selected_file = inventory_files[0]
+if len(inventory_files) > 1:
+    selected_file = st.selectbox("Inventory file to reprice:", inventory_files, key="reprice_file")
+INVENTORY_FILE = os.path.join(INVENTORY_FOLDER, selected_file)
+
+try:
+    inventory = get_shared_inventory().get(INVENTORY_FILE)
+except ValueError as e:
+    st.error(f"❌ {e}")
+    st.stop()
+
+watch_in_page(INVENTORY_FILE, inventory.version)
+df = inventory.frame
+
+if st.session_state.get("reprice_message"):
+    st.success(st.session_state.pop("reprice_message"))
+
+st.markdown("### Rules")
+st.caption("Each rule matches products by one field. The first rule that matches a product sets its price; "
+           "products with no barcode are left alone so the change can be undone.")
+field_values = {
+    field: sorted(v for v in df[source_column(df, field)].fillna("").astype(str).str.strip().unique() if v)
+    for field in RULE_FIELDS if source_column(df, field)
+}
+with st.expander("Values in use"):
+    for field, values in field_values.items():
+        st.write(f"**{field}:** {', '.join(values[:200])}{' …' if len(values) > 200 else ''}")
+
+rules_table = st.data_editor(
+    pd.DataFrame([{"field": "SUPPLIER", "value": "", "method": "percent", "amount": 0.0, "round_95": False}]),
+    num_rows="dynamic",
+    width='stretch',
+    hide_index=True,
+    key="reprice_rules",
+    column_config={
+        "field": st.column_config.SelectboxColumn("Match on", options=RULE_FIELDS, required=True),
+        "value": st.column_config.TextColumn("Value"),
+        "method": st.column_config.SelectboxColumn(
+            "Method", options=list(METHODS), required=True, help="; ".join(f"{k}: {v}" for k, v in METHODS.items())
+        ),
+        "amount": st.column_config.NumberColumn("Amount", help="% for percent and margin, $ for fixed", format="%.2f"),
+        "round_95": st.column_config.CheckboxColumn("Round up to .95"),
+    },
+)
+
+try:
+    rules = validate_rules(rules_table.to_dict("records"))
+except ValueError as e:
+    st.info(f"ℹ️ {e}")
+    rules = None
+
+if rules:
+    # Only this session's latest preview is kept; it is priced again when the rules or the file change
+    preview_key = (INVENTORY_FILE, inventory.version, repr(rules))
+    if st.session_state.get("reprice_preview", (None,))[0] != preview_key:
+        st.session_state["reprice_preview"] = (preview_key, *reprice(df, rules))
+    _, preview, skipped = st.session_state["reprice_preview"]
+    st.markdown("### Preview")
+    metric_cols = st.columns(3)
+    metric_cols[0].metric("Prices changing", f"{len(preview):,}")
+    metric_cols[1].metric("Matched but not priced", f"{skipped:,}", help="No usable RRP or COST PRICE for the rule")
+    if not preview.empty:
+        metric_cols[2].metric("Average change", f"{preview['CHANGE %'].mean():+.1f}%")
+        page_size = 50
+        pages = max(1, -(-len(preview) // page_size))
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key="reprice_page")
+        timed_dataframe(preview.iloc[(page - 1) * page_size:page * page_size], "reprice_preview", width='stretch', hide_index=True)
+        if st.button(f"Apply {len(preview):,} price changes", type="primary", key="apply_reprice_btn"):
+            try:
+                with st.spinner("Repricing..."):
+                    result = apply_repricing(INVENTORY_FILE, rules, describe_batch(rules))
+            except (ValueError, OSError, TimeoutError) as e:
+                st.error(f"❌ {e}")
+            else:
+                st.session_state["reprice_message"] = f"✅ Repriced {result['changed']:,} products."
+                st.rerun()
+    else:
+        st.info("ℹ️ These rules do not change any prices.")
+
+st.markdown("### Recent Repricing")
+batches = repricing_batches(INVENTORY_FILE)
+if batches.empty:
+    st.caption("No bulk price changes yet.")
+for _, batch in batches.iterrows():
+    cols = st.columns([2, 5, 1, 1])
+    cols[0].write(batch["timestamp"])
+    cols[1].write(batch["description"])
+    cols[2].write(f"{batch['changes']:,} rows")
+    if batch["kind"] == "reprice" and cols[3].button("Undo", key=f"undo_reprice_{batch['id']}"):
+        try:
+            with st.spinner("Undoing..."):
+                result = undo_repricing(INVENTORY_FILE, batch["id"], f"Undo: {batch['description']}")
+        except (LookupError, OSError, TimeoutError) as e:
+            st.error(f"❌ {e}")
+        else:
+            conflicts = f"; {result['conflicts']:,} changed since and left alone" if result["conflicts"] else ""
+            st.session_state["reprice_message"] = f"✅ Restored {result['restored']:,} prices{conflicts}."
+            st.rerun()
+
+finish_rerun("repricing", rerun_started)
@@ -2,13 +2,26 @@ import streamlit as st
 import pandas as pd
 import os
 import io
+import hashlib
 from datetime import datetime
 
 st.set_page_config(layout="wide")  # <--- Add this line right here!
 
-# Barcode image generation
-import barcode
-from barcode.writer import ImageWriter
+from inventory_io import (
+    SCANNED_FILE, UNFOUND_FILE, VISIBLE_FIELDS, clean_barcode, format_inventory_table, format_rrp, read_scanned_frame,
+    read_unfound_frame, scanned_products,
+)
+from inventory_writer import get_writer
+from supplier_catalogue import get_supplier_catalogue
+from shared_inventory import get_shared_inventory
+from file_watcher import watch_in_page
+from barcode_images import render_barcode
+from job_runner import DONE, get_job_runner
+from job_panel import show_job
+from inventory_jobs import export_excel, import_catalogue
+from perf_panel import finish_rerun, start_rerun, timed_dataframe
+
+rerun_started = start_rerun()
 
 # --- Custom CSS for button colors ---
 st.markdown("""
@@ -45,34 +58,8 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def clean_barcode(val):
-    try:
-        if pd.isnull(val) or val == "":
-            return ""
-        s = str(val).strip().replace('\u200b','').replace('\u00A0','')
-        f = float(s)
-        s = str(int(f))
-        return s
-    except:
-        return str(val).strip()
-
-def force_all_columns_to_string(df):
-    for col in df.columns:
-        df[col] = df[col].astype(str)
-    return df
-
-def clean_nans(df):
-    return df.replace([pd.NA, 'nan'], '', regex=True)
-
-def format_rrp(val):
-    try:
-        f = float(str(val).replace("$", "").strip())
-        return f"${f:.2f}"
-    except Exception:
-        return "$0.00"
-
 def clean_for_display(df):
-    df = df.copy()
+    # No defensive copy: frames are copy-on-write, so the assignments below never reach the shared inventory
     if "BARCODE" in df.columns:
         df["BARCODE"] = df["BARCODE"].apply(lambda x: str(int(float(x))) if pd.notnull(x) and str(x).replace('.','',1).isdigit() and float(x).is_integer() else x)
     if "QUANTITY" in df.columns:
@@ -80,35 +67,30 @@ def clean_for_display(df):
     df = df.replace("nan", "").replace(pd.NA, "").replace(float("nan"), "")
     return df
 
-VISIBLE_FIELDS = [
-    "BARCODE", "LOCATION", "FRAMENUM", "MANUFACT", "MODEL", "SIZE",
-    "FCOLOUR", "FRAMETYPE", "F GROUP", "SUPPLIER", "QUANTITY", "F TYPE", "TEMPLE",
-    "DEPTH", "DIAG", "BASECURVE", "RRP", "EXCOSTPR", "COST PRICE", "TAXPC",
-    "FRSTATUS", "AVAILFROM", "NOTE"
-]
-
 # --- Shared scanned barcodes CSV ---
-SCANNED_FILE = os.path.join(os.path.dirname(__file__), "..", "scanned_barcodes.csv")
-UNFOUND_FILE = os.path.join(os.path.dirname(__file__), "..", "unfound_barcodes.csv")
-
 def load_scanned_barcodes():
     if os.path.exists(SCANNED_FILE):
         return pd.read_csv(SCANNED_FILE)["barcode"].astype(str).tolist()
     return []
 
-def save_scanned_barcodes(barcodes):
-    pd.DataFrame({"barcode": barcodes}).to_csv(SCANNED_FILE, index=False)
+def update_scanned_barcodes(mutation):
+    # Applied by the shared writer to the latest committed list, so concurrent scanners don't overwrite each other
+    frame = get_writer().apply(
+        SCANNED_FILE,
+        lambda current: pd.DataFrame({"barcode": mutation(current["barcode"].astype(str).tolist())}),
+        loader=read_scanned_frame,
+    )
+    return frame["barcode"].tolist()
 
 def load_unfound_barcodes():
-    if os.path.exists(UNFOUND_FILE):
-        return pd.read_csv(UNFOUND_FILE, dtype={"barcode": str})
-    return pd.DataFrame(columns=["barcode", "timestamp"])
+    return read_unfound_frame(UNFOUND_FILE)
 
-def save_unfound_barcodes(df):
-    df.to_csv(UNFOUND_FILE, index=False)
+def add_unfound_barcode(barcode_val, timestamp):
+    new_row = pd.DataFrame([{"barcode": barcode_val, "timestamp": timestamp}])
+    get_writer().apply(UNFOUND_FILE, lambda current: pd.concat([current, new_row], ignore_index=True), loader=read_unfound_frame)
 
 def empty_unfound_barcodes():
-    pd.DataFrame(columns=["barcode", "timestamp"]).to_csv(UNFOUND_FILE, index=False)
+    get_writer().apply(UNFOUND_FILE, lambda current: pd.DataFrame(columns=["barcode", "timestamp"]), loader=read_unfound_frame)
 
 # --- Load inventory ---
 INVENTORY_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Inventory")
@@ -119,31 +101,28 @@ if len(inventory_files) > 1:
 INVENTORY_FILE = os.path.join(INVENTORY_FOLDER, selected_file)
 
 def load_inventory():
+    # Shared with every other session; barcodes already come back cleaned
     if os.path.exists(INVENTORY_FILE):
-        if INVENTORY_FILE.lower().endswith('.xlsx'):
-            df = pd.read_excel(INVENTORY_FILE)
-        elif INVENTORY_FILE.lower().endswith('.csv'):
-            df = pd.read_csv(INVENTORY_FILE)
-        else:
+        try:
+            return get_shared_inventory().get(INVENTORY_FILE)
+        except ValueError:
             st.error("Unsupported inventory file type.")
             st.stop()
-        df = force_all_columns_to_string(df)
-        return df
     else:
         st.error(f"Inventory file '{INVENTORY_FILE}' not found.")
         st.stop()
 
-df = load_inventory()
+inventory = load_inventory()
+df = inventory.frame
 barcode_col = "BARCODE"
 if barcode_col not in df.columns:
     st.error(f"No {barcode_col} column found in your inventory file!")
     st.stop()
 
-# Clean the DataFrame barcodes as strings
-df[barcode_col] = df[barcode_col].map(clean_barcode).astype(str)
-
 st.title("Stocktake - Scan Barcodes")
 
+watch_in_page(INVENTORY_FILE, inventory.version)
+
 # --- Shared scanned barcodes list ---
 scanned_barcodes = load_scanned_barcodes()
 
@@ -166,8 +145,7 @@ with st.form("stocktake_scan_form", clear_on_submit=True):
             st.warning("Barcode already scanned.")
             st.session_state["last_unfound_barcode"] = None
         elif cleaned in df[barcode_col].values:
-            scanned_barcodes.append(str(cleaned))
-            save_scanned_barcodes(scanned_barcodes)
+            scanned_barcodes = update_scanned_barcodes(lambda current: current if cleaned in current else current + [str(cleaned)])
             st.success(f"Added barcode: {cleaned}")
             st.session_state["last_unfound_barcode"] = None
             st.session_state["last_success_barcode"] = cleaned
@@ -190,16 +168,11 @@ if st.session_state.get("last_success_barcode"):
         colour = product_row.get("FCOLOUR", "N/A")
         frametype = product_row.get("FRAMETYPE", "N/A")
         size = product_row.get("SIZE", "N/A")
-        rrp = product_row.get("RRP", "N/A")
+        rrp = format_rrp(product_row["RRP"]) if "RRP" in product_row else "N/A"
         img_col, details_col = st.columns([1, 3])
         with img_col:
             try:
-                CODE128 = barcode.get_barcode_class('code128')
-                barcode_img = CODE128(str(last_barcode), writer=ImageWriter())
-                buffer = io.BytesIO()
-                barcode_img.write(buffer)
-                buffer.seek(0)
-                st.image(buffer, caption="", width=120)
+                st.image(io.BytesIO(render_barcode(last_barcode)), caption="", width=120)
             except Exception as e:
                 st.warning("Could not generate barcode image.")
         with details_col:
@@ -222,11 +195,8 @@ if st.session_state.get("last_success_barcode"):
 if st.session_state.get("last_unfound_barcode", None):
     cleaned = st.session_state["last_unfound_barcode"]
     if st.button("Add to Unfound Barcodes Table", key=f"add_unfound_{cleaned}"):
-        unfound_df = load_unfound_barcodes()
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        new_row = pd.DataFrame([{"barcode": cleaned, "timestamp": now}])
-        unfound_df = pd.concat([unfound_df, new_row], ignore_index=True)
-        save_unfound_barcodes(unfound_df)
+        add_unfound_barcode(cleaned, now)
         st.success(f"Barcode {cleaned} added to unfound table.")
         st.session_state["last_unfound_barcode"] = None
         if hasattr(st, "rerun"):
@@ -247,8 +217,7 @@ if st.session_state.get("confirm_clear_scanned_barcodes", False):
         yes_col, no_col = st.columns([1, 1])
         with yes_col:
             if st.button("Yes, Empty Table", key="confirm_empty_scanned_btn"):
-                scanned_barcodes = []
-                save_scanned_barcodes(scanned_barcodes)
+                scanned_barcodes = update_scanned_barcodes(lambda current: [])
                 st.session_state["confirm_clear_scanned_barcodes"] = False
                 st.success("Scanned products table emptied.")
                 if hasattr(st, "rerun"):
@@ -260,20 +229,10 @@ if st.session_state.get("confirm_clear_scanned_barcodes", False):
                 st.session_state["confirm_clear_scanned_barcodes"] = False
 
 # --- Optional: Show missing items ---
-def format_inventory_table(input_df):
-    df_disp = input_df.copy()
-    cols = [col for col in VISIBLE_FIELDS if col in df_disp.columns]
-    df_disp = df_disp[cols]
-    if "BARCODE" in df_disp.columns:
-        df_disp["BARCODE"] = df_disp["BARCODE"].map(clean_barcode)
-    if "RRP" in df_disp.columns:
-        df_disp["RRP"] = df_disp["RRP"].apply(format_rrp).astype(str)
-    return clean_nans(df_disp)
-
 if st.checkbox("Show missing products (in inventory but not scanned)"):
     missing_df = df[~df[barcode_col].isin(scanned_barcodes)]
     st.markdown("### Missing Products")
-    st.dataframe(format_inventory_table(missing_df), width='stretch')
+    timed_dataframe(format_inventory_table(missing_df), "stocktake_missing", width='stretch')
     if not missing_df.empty:
         st.download_button(
             label="Download Missing Table (CSV)",
@@ -281,36 +240,28 @@ if st.checkbox("Show missing products (in inventory but not scanned)"):
             file_name="stocktake_missing.csv",
             mime="text/csv"
         )
-        excel_buffer_missing = io.BytesIO()
-        format_inventory_table(missing_df).to_excel(excel_buffer_missing, index=False)
-        excel_buffer_missing.seek(0)
-        st.download_button(
-            label="Download Missing Table (Excel)",
-            data=excel_buffer_missing,
-            file_name="stocktake_missing.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        # The missing list is most of the catalogue early in a count, so build the workbook in the background
+        missing_key = ("stocktake_missing_excel", INVENTORY_FILE, inventory.version, hash(tuple(scanned_barcodes)))
+        if st.button("Prepare Missing Table (Excel)", key="prepare_missing_excel_btn"):
+            get_job_runner().submit("export", export_excel, format_inventory_table(missing_df), label="Missing table", cache_key=missing_key)
+        if get_job_runner().find(missing_key) is not None:
+            show_job(get_job_runner().find(missing_key), "missing_excel", "stocktake_missing.xlsx",
+                     "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
 # --- Table of scanned products as ONE table, most recent scan on top ---
-ordered_barcodes = list(reversed(scanned_barcodes))
-present_barcodes = [b for b in ordered_barcodes if b in df[barcode_col].values]
-scanned_df = df[df[barcode_col].isin(present_barcodes)]
+scanned_df = scanned_products(df, scanned_barcodes, barcode_col)
 if not scanned_df.empty:
-    scanned_df = scanned_df.assign(
-        __order=scanned_df[barcode_col].apply(lambda x: present_barcodes.index(x))
-    ).sort_values('__order').drop(columns='__order')
     display_df = clean_for_display(scanned_df)
     display_df = display_df[[col for col in VISIBLE_FIELDS if col in display_df.columns]]
     st.markdown("### Scanned Products Table")
-    st.dataframe(display_df, width='stretch', hide_index=True)
+    timed_dataframe(display_df, "stocktake_scanned", width='stretch', hide_index=True)
 
     # Remove functionality: select barcode and remove with button
     remove_options = display_df["BARCODE"].tolist()
     if remove_options:
         remove_barcode = st.selectbox("Select a barcode to remove", remove_options)
         if st.button("Remove Selected"):
-            scanned_barcodes = [b for b in scanned_barcodes if b != remove_barcode]
-            save_scanned_barcodes(scanned_barcodes)
+            scanned_barcodes = update_scanned_barcodes(lambda current: [b for b in current if b != remove_barcode])
             if hasattr(st, "rerun"):
                 st.rerun()
             elif hasattr(st, "experimental_rerun"):
@@ -322,15 +273,12 @@ if not scanned_df.empty:
         file_name="stocktake_scanned.csv",
         mime="text/csv"
     )
-    excel_buffer = io.BytesIO()
-    format_inventory_table(scanned_df).to_excel(excel_buffer, index=False)
-    excel_buffer.seek(0)
-    st.download_button(
-        label="Download Scanned Table (Excel)",
-        data=excel_buffer,
-        file_name="stocktake_scanned.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    scanned_key = ("stocktake_scanned_excel", INVENTORY_FILE, inventory.version, hash(tuple(scanned_barcodes)))
+    if st.button("Prepare Scanned Table (Excel)", key="prepare_scanned_excel_btn"):
+        get_job_runner().submit("export", export_excel, format_inventory_table(scanned_df), label="Scanned table", cache_key=scanned_key)
+    if get_job_runner().find(scanned_key) is not None:
+        show_job(get_job_runner().find(scanned_key), "scanned_excel", "stocktake_scanned.xlsx",
+                 "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 else:
     st.info("No scanned products to display.")
 
@@ -370,5 +318,53 @@ if not unfound_df.empty:
         file_name="unfound_barcodes.csv",
         mime="text/csv"
     )
+    if st.button("🔎 Resolve Against Supplier Catalogues", key="resolve_unfound_btn"):
+        st.session_state["catalogue_matches"] = get_supplier_catalogue().resolve(unfound_df["barcode"])
+    catalogue_matches = st.session_state.get("catalogue_matches")
+    if catalogue_matches is not None:
+        if catalogue_matches.empty:
+            st.info("None of the unfound barcodes are in the supplier catalogues.")
+        else:
+            st.success(f"{len(catalogue_matches)} of {unfound_df['barcode'].nunique()} unfound barcodes found in supplier catalogues.")
+            st.dataframe(catalogue_matches, width='stretch', hide_index=True)
+            match_col, add_col = st.columns([3, 1])
+            with match_col:
+                chosen = st.selectbox(
+                    "Product to add",
+                    catalogue_matches.index,
+                    format_func=lambda i: f"{catalogue_matches.at[i, 'BARCODE']} - {catalogue_matches.at[i, 'MANUFACT'] if 'MANUFACT' in catalogue_matches else ''} {catalogue_matches.at[i, 'MODEL'] if 'MODEL' in catalogue_matches else ''}",
+                    key="catalogue_match_choice",
+                )
+            with add_col:
+                if st.button("➕ Add to Inventory", key="add_catalogue_match_btn"):
+                    st.session_state["prefill_product"] = catalogue_matches.loc[chosen].to_dict()
+                    st.switch_page("Inventory_Manager.py")
 else:
     st.info("No unfound barcodes yet.")
+
+with st.expander("📚 Supplier Catalogues"):
+    catalogue = get_supplier_catalogue()
+    catalogue_products, catalogue_imports = catalogue.stats()
+    st.caption(f"{catalogue_products:,} products across all imported catalogues.")
+    catalogue_file = st.file_uploader("Import a supplier catalogue (CSV, TXT or XLSX)", type=["csv", "txt", "xlsx"], key="catalogue_upload")
+    catalogue_supplier = st.text_input("Supplier name (optional, overrides the file's SUPPLIER column)", key="catalogue_supplier")
+    if catalogue_file is not None and st.button("Import Catalogue", key="import_catalogue_btn"):
+        catalogue_data = catalogue_file.getvalue()
+        catalogue_key = ("import_catalogue", hashlib.sha1(catalogue_data).hexdigest(), catalogue_supplier or None)
+        get_job_runner().submit("import", import_catalogue, catalogue_data, catalogue_file.name, catalogue_supplier or None,
+                                label=f"Importing {catalogue_file.name}", cache_key=catalogue_key)
+        st.session_state["catalogue_import_key"] = catalogue_key
+    catalogue_key = st.session_state.get("catalogue_import_key")
+    if catalogue_key is not None and get_job_runner().find(catalogue_key) is not None:
+        import_job = show_job(get_job_runner().find(catalogue_key), "catalogue_import")
+        if import_job is not None and import_job.status == DONE:
+            st.success(f"Imported {import_job.result['rows']:,} products in {import_job.result['seconds']:.1f}s.")
+    if catalogue_imports:
+        st.dataframe(
+            pd.DataFrame(catalogue_imports, columns=["Imported", "File", "Supplier", "Rows"]).assign(
+                Imported=lambda d: d["Imported"].map(lambda ts: datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M'))
+            ),
+            width='stretch', hide_index=True,
+        )
+
+finish_rerun("stocktake", rerun_started)
@@ -0,0 +1,52 @@
+import streamlit as st
+
+from inventory_io import clean_barcode, clean_nans, format_rrp
+from federated_inventory import get_federated_inventory
+from perf_panel import finish_rerun, start_rerun
+
+rerun_started = start_rerun()
+
+st.set_page_config(layout="wide")
+
+st.title("All Stores")
+
+federated = get_federated_inventory()
+
+# --- Combined stock value ---
+combined = federated.combined_stock_value()
+total_col1, total_col2, total_col3, total_col4 = st.columns(4)
+total_col1.metric("Stores", combined["stores"])
+total_col2.metric("Products", combined["products"])
+total_col3.metric("Units", f"{combined['units']:,.0f}")
+total_col4.metric("Retail Value", f"${combined['retail_value']:,.2f}")
+
+store_totals = federated.stock_value().reset_index()
+store_totals["retail_value"] = store_totals["retail_value"].map(lambda v: f"${v:,.2f}")
+store_totals["cost_value"] = store_totals["cost_value"].map(lambda v: f"${v:,.2f}")
+st.markdown("### Stock Value by Store")
+st.dataframe(store_totals, width='stretch', hide_index=True)
+
+# --- Which store has it? ---
+st.markdown("### Find a Product Across Stores")
+search_col1, search_col2 = st.columns(2)
+with search_col1:
+    search_barcode = st.text_input("Barcode", key="stores_search_barcode")
+with search_col2:
+    search_model = st.text_input("Model", key="stores_search_model")
+
+results = None
+if search_barcode:
+    results = federated.stores_for_barcode(clean_barcode(search_barcode))
+elif search_model:
+    results = federated.stores_for_model(search_model)
+
+if results is not None:
+    if results.empty:
+        st.error("Not found in any store.")
+    else:
+        results = results.copy()
+        results["RRP"] = results["RRP"].apply(format_rrp)
+        st.success(f"Found in {results['STORE'].nunique()} store(s).")
+        st.dataframe(clean_nans(results), width='stretch', hide_index=True)
+
+finish_rerun("stores", rerun_started)
@@ -0,0 +1,183 @@
+import bisect
+import collections
+import contextlib
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+# Prometheus-style cumulative buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+# Percentiles are taken over the recent samples only, so the panel shows how it feels now
+WINDOW_SECONDS = 300
+MAX_SAMPLES = 2000
+PUBLISH_INTERVAL = 5.0
+
+def metrics_file(process):
+    # Imported here so inventory_io can itself be instrumented
+    from inventory_io import state_path
+    return state_path(f"metrics_{process}.json")
+
+
+class SpanStats:
+    # Cumulative histogram for /metrics plus a rolling window of recent durations
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = collections.deque(maxlen=MAX_SAMPLES)
+
+    def observe(self, seconds, now):
+        self.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append((now, seconds))
+
+    def window(self, now):
+        cutoff = now - WINDOW_SECONDS
+        while self.recent and self.recent[0][0] < cutoff:
+            self.recent.popleft()
+        return sorted(seconds for _, seconds in self.recent)
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Metrics:
+    # Process-wide span timings. Recording is a perf_counter pair and one lock, cheap
+    # enough to leave on around every hot path.
+    def __init__(self):
+        self._spans = collections.defaultdict(SpanStats)
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+
+    def observe(self, name, seconds):
+        now = time.monotonic()
+        with self._lock:
+            self._spans[name].observe(seconds, now)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def timed(self, name):
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def summary(self):
+        # One row per span: recent percentiles in ms, lifetime count and total
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for name, stats in sorted(self._spans.items()):
+                recent = stats.window(now)
+                rows.append({
+                    "span": name,
+                    "count": stats.count,
+                    "recent": len(recent),
+                    "p50_ms": percentile(recent, 0.50) * 1000,
+                    "p95_ms": percentile(recent, 0.95) * 1000,
+                    "p99_ms": percentile(recent, 0.99) * 1000,
+                    "max_ms": (recent[-1] if recent else 0.0) * 1000,
+                    "total_s": stats.total,
+                })
+        return rows
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {"buckets": list(stats.bucket_counts), "count": stats.count, "sum": stats.total}
+                for name, stats in self._spans.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+
+    def publish(self, process, force=False):
+        # Streamlit runs in its own process; it drops its histograms in state/ for the
+        # Flask /metrics route to pick up. Throttled, since this runs after every rerun.
+        now = time.monotonic()
+        if not force and now - self._last_publish < PUBLISH_INTERVAL:
+            return
+        self._last_publish = now
+        from inventory_writer import atomic_write
+        data = json.dumps({"pid": os.getpid(), "spans": self.snapshot()}).encode("utf-8")
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        try:
+            atomic_write(metrics_file(process), write)
+        except OSError:
+            pass
+
+
+def load_published(process):
+    try:
+        with open(metrics_file(process), encoding="utf-8") as f:
+            published = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if published.get("pid") == os.getpid():
+        return {}  # same process: its spans are already in get_metrics()
+    return published.get("spans", {})
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_bound(bound):
+    return "+Inf" if bound == math.inf else repr(bound)
+
+def prometheus_text(spans_by_process, gauges=None, counters=None):
+    # spans_by_process: {process: Metrics.snapshot()}; gauges and counters: {metric name: value}
+    lines = [
+        "# HELP inventory_span_seconds Time spent in instrumented hot paths.",
+        "# TYPE inventory_span_seconds histogram",
+    ]
+    for process, spans in sorted(spans_by_process.items()):
+        for name, stats in sorted(spans.items()):
+            labels = f'process="{escape_label(process)}",span="{escape_label(name)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, stats["buckets"]):
+                cumulative += count
+                lines.append(f'inventory_span_seconds_bucket{{{labels},le="{format_bound(bound)}"}} {cumulative}')
+            lines.append(f"inventory_span_seconds_sum{{{labels}}} {stats['sum']}")
+            lines.append(f"inventory_span_seconds_count{{{labels}}} {stats['count']}")
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    for name, value in sorted((counters or {}).items()):
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+    return _metrics
+
+def span(name):
+    return get_metrics().span(name)
+
+def timed(name):
+    return get_metrics().timed(name)
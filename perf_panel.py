@@ -0,0 +1,51 @@
+import os
+import time
+
+import pandas as pd
+import streamlit as st
+
+from inventory_writer import get_writer
+from perf_metrics import get_metrics, span
+
+DEBUG_ENV = "INVENTORY_DEBUG"
+
+def debug_enabled():
+    # Opt in with INVENTORY_DEBUG=1 for every session, or ?debug=1 for one browser tab
+    return os.environ.get(DEBUG_ENV) == "1" or st.query_params.get("debug") == "1"
+
+def start_rerun():
+    return time.perf_counter()
+
+def timed_dataframe(data, name, **kwargs):
+    # st.dataframe converts the frame to Arrow before returning, so this times the serialisation
+    with span(f"st.dataframe {name}"):
+        return st.dataframe(data, **kwargs)
+
+def finish_rerun(page, started):
+    # Called at the end of a page script; early st.stop() reruns are not counted
+    metrics = get_metrics()
+    metrics.observe(f"rerun {page}", time.perf_counter() - started)
+    metrics.publish("streamlit")
+    if debug_enabled():
+        show_perf_panel()
+
+def show_perf_panel():
+    metrics = get_metrics()
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        rows = metrics.summary()
+        if rows:
+            table = pd.DataFrame(rows).sort_values("total_s", ascending=False)
+            st.dataframe(
+                table.round({"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "max_ms": 1, "total_s": 2}),
+                width='stretch', hide_index=True,
+            )
+            st.caption("Percentiles cover the last five minutes; count and total since the app started.")
+        else:
+            st.caption("No timings recorded yet.")
+        writer = get_writer().metrics()
+        st.caption(
+            f"Writer: {writer['flushes']:,} flushes, {writer['mutations']:,} mutations, "
+            f"queue {writer['queue_depth']}, last flush {writer['last_flush_ms']:.0f} ms"
+        )
+        if st.button("Reset timings", key="perf_reset"):
+            metrics.reset()
@@ -0,0 +1,209 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from audit_log import KEY_SEPARATOR, ChangeSet, get_audit_log, row_keys
+from data_quality import parse_price
+from inventory_io import format_rrp, prepare_for_save, source_column
+from inventory_writer import get_writer
+from perf_metrics import span
+
+# Rule-based bulk repricing. Every rule selects rows by one catalogue field and says
+# how to work out their new RRP; the first rule that matches a row wins. The whole
+# catalogue is priced with column operations, and applying is a single writer mutation
+# that re-prices the latest committed file, so a preview never overwrites newer edits.
+# The audit log gets one record per batch holding every row's old and new price, which
+# undo and history replay apply as column operations.
+RULE_FIELDS = ["SUPPLIER", "MANUFACT", "F GROUP"]
+METHODS = {
+    "percent": "Change RRP by %",
+    "fixed": "Change RRP by $",
+    "margin": "Margin % over COST PRICE",
+    "round95": "Round RRP up to .95",
+}
+BATCH_KIND = "reprice"
+UNDO_KIND = "reprice_undo"
+PREVIEW_FIELDS = ["BARCODE", "FRAMENUM", "SUPPLIER", "MANUFACT", "F GROUP", "COST PRICE"]
+
+def validate_rules(rules):
+    # Rules arrive from an editable table: drop empty rows, reject half-filled ones
+    valid = []
+    for number, rule in enumerate(rules, start=1):
+        field = rule.get("field")
+        value = str(rule.get("value") or "").strip()
+        method = rule.get("method")
+        if not value and not method:
+            continue
+        if field not in RULE_FIELDS:
+            raise ValueError(f"Rule {number}: choose one of {', '.join(RULE_FIELDS)} to match on.")
+        if not value:
+            raise ValueError(f"Rule {number}: enter the {field} to match.")
+        if method not in METHODS:
+            raise ValueError(f"Rule {number}: choose how to reprice.")
+        amount = 0.0
+        if method != "round95":
+            try:
+                amount = float(rule.get("amount"))
+            except (TypeError, ValueError):
+                raise ValueError(f"Rule {number}: enter an amount.") from None
+            if np.isnan(amount):
+                raise ValueError(f"Rule {number}: enter an amount.")
+            if method == "margin" and amount <= -100:
+                raise ValueError(f"Rule {number}: a margin must be above -100%.")
+        valid.append({"field": field, "value": value, "method": method, "amount": amount,
+                      "round_95": bool(rule.get("round_95")) or method == "round95"})
+    if not valid:
+        raise ValueError("Add at least one rule.")
+    return valid
+
+def describe_rule(rule):
+    amount = rule["amount"]
+    how = {
+        "percent": f"{amount:+g}%",
+        "fixed": f"{'+' if amount >= 0 else '-'}${abs(amount):.2f}",
+        "margin": f"cost + {amount:g}%",
+        "round95": "up to .95",
+    }[rule["method"]]
+    if rule["round_95"] and rule["method"] != "round95":
+        how += ", up to .95"
+    return f"{rule['field']} = {rule['value']}: {how}"
+
+def round_up_95(prices):
+    # Smallest x.95 at or above each price; computed in cents so 12.95 stays 12.95.
+    # Prices of $0 or less are left unpriced rather than becoming $0.95.
+    cents = np.round(prices * 100)
+    return ((np.ceil((cents - 95) / 100) * 100 + 95) / 100).where(prices > 0)
+
+def reprice(frame, rules):
+    # New RRP for every row a rule matches. Returns only the rows whose price changes,
+    # indexed like `frame`, plus a count of matched rows that could not be priced.
+    with span("reprice"):
+        old = parse_price(frame["RRP"]) if "RRP" in frame.columns else pd.Series(np.nan, index=frame.index)
+        cost_name = source_column(frame, "COST PRICE")
+        cost = parse_price(frame[cost_name]) if cost_name else pd.Series(np.nan, index=frame.index)
+        new = pd.Series(np.nan, index=frame.index)
+        rule_no = pd.Series(-1, index=frame.index)
+        keys = {}
+        for number, rule in enumerate(rules):
+            name = source_column(frame, rule["field"])
+            if name is None:
+                continue
+            if name not in keys:
+                keys[name] = frame[name].fillna("").astype(str).str.strip().str.casefold()
+            matched = keys[name].eq(rule["value"].casefold()) & rule_no.eq(-1)
+            if not matched.any():
+                continue
+            if rule["method"] == "percent":
+                price = old[matched] * (1 + rule["amount"] / 100)
+            elif rule["method"] == "fixed":
+                price = old[matched] + rule["amount"]
+            elif rule["method"] == "margin":
+                price = cost[matched] * (1 + rule["amount"] / 100)
+            else:
+                price = old[matched]
+            price = price.round(2)
+            if rule["round_95"]:
+                price = round_up_95(price)
+            new[matched] = price
+            rule_no[matched] = number
+        matched = rule_no.ge(0)
+        if "BARCODE" in frame.columns:
+            matched &= frame["BARCODE"].fillna("").astype(str).str.strip().ne("")  # undo finds rows by barcode
+        priced = matched & new.notna() & new.ge(0)
+        changed = priced & (old.isna() | old.round(2).ne(new))
+        preview = pd.DataFrame(
+            {field: frame.loc[changed, source_column(frame, field)] for field in PREVIEW_FIELDS if source_column(frame, field)},
+            index=frame.index[changed],
+        )
+        preview["OLD RRP"] = frame.loc[changed, "RRP"].map(format_rrp) if "RRP" in frame.columns else "$0.00"
+        preview["NEW RRP"] = new[changed].map(format_rrp)
+        preview["CHANGE %"] = ((new[changed] / old[changed] - 1) * 100).round(1).replace([np.inf, -np.inf], np.nan)
+        descriptions = [describe_rule(rule) for rule in rules]
+        preview["RULE"] = rule_no[changed].map(lambda n: descriptions[n])
+        return preview, int((matched & ~priced).sum())
+
+def describe_batch(rules):
+    return "; ".join(describe_rule(rule) for rule in rules)
+
+def framecodes(frame, index):
+    if "FRAMENUM" not in frame.columns:
+        return pd.Series("", index=index)
+    return frame.loc[index, "FRAMENUM"].fillna("").astype(str)
+
+def apply_repricing(path, rules, description=None):
+    # One write and one audit record for the whole batch
+    batch_id = uuid.uuid4().hex[:12]
+    changes = ChangeSet(path, batch=(batch_id, BATCH_KIND, description or describe_batch(rules)))
+    result = {"batch": batch_id}
+    def mutation(current):
+        preview, skipped = reprice(current, rules)
+        if preview.empty:
+            raise ValueError("These rules do not change any prices.")
+        result.update(changed=len(preview), skipped=skipped)
+        updated = current.copy()
+        updated.loc[preview.index, "RRP"] = preview["NEW RRP"]
+        changes.add_bulk(
+            BATCH_KIND, "RRP", preview["BARCODE"], framecodes(current, preview.index),
+            preview["OLD RRP"], preview["NEW RRP"], current=current,
+        )
+        return prepare_for_save(updated)
+    get_writer().apply(path, mutation, on_commit=changes.commit)
+    return result
+
+def repricing_batches(path, limit=20):
+    batches = get_audit_log().batches(path, limit=limit)
+    return batches[batches["kind"].isin([BATCH_KIND, UNDO_KIND])]
+
+def batch_prices(recorded):
+    # Old and new RRP per row of a batch, from its bulk record (or, for batches logged
+    # before bulk records, one record per row)
+    parts = []
+    for barcode, framenum, diff in recorded:
+        values = diff.get("RRP")
+        if isinstance(values, dict):
+            parts.append(pd.DataFrame({
+                "BARCODE": values["barcode"], "FRAMENUM": values["framenum"], "OLD": values["before"], "NEW": values["after"],
+            }))
+        elif values is not None:
+            parts.append(pd.DataFrame({"BARCODE": [barcode], "FRAMENUM": [framenum], "OLD": [values[0]], "NEW": [values[1]]}))
+    if not parts:
+        return pd.DataFrame(columns=["BARCODE", "FRAMENUM", "OLD", "NEW"])
+    return pd.concat(parts, ignore_index=True)
+
+def undo_repricing(path, batch_id, description=None):
+    # Puts back the old RRP on rows still carrying the price the batch set. Rows edited
+    # since then are left alone and counted as conflicts.
+    prices = batch_prices(get_audit_log().batch_changes(batch_id))
+    if prices.empty:
+        raise LookupError("That repricing batch has no recorded changes.")
+    undo_id = uuid.uuid4().hex[:12]
+    changes = ChangeSet(path, batch=(undo_id, UNDO_KIND, description or f"Undo {batch_id}"))
+    result = {"batch": undo_id}
+    def mutation(current):
+        batch = prices.copy()
+        unkeyed = batch["FRAMENUM"].isna()
+        if unkeyed.any():
+            # Per-row records without a framecode match the first row with their barcode
+            first = current.drop_duplicates("BARCODE")
+            batch.loc[unkeyed, "FRAMENUM"] = batch.loc[unkeyed, "BARCODE"].map(dict(zip(first["BARCODE"], framecodes(first, first.index))))
+        batch = batch.assign(KEY=batch["BARCODE"] + KEY_SEPARATOR + batch["FRAMENUM"].fillna("")).drop_duplicates("KEY", keep="last")
+        keys = row_keys(current)
+        position = pd.Index(batch["KEY"]).get_indexer(keys)
+        found = (position >= 0) & ~keys.duplicated().to_numpy()
+        set_price = parse_price(batch["NEW"]).round(2).to_numpy()[position]
+        unchanged = found & (parse_price(current["RRP"]).round(2).to_numpy() == set_price)
+        if not unchanged.any():
+            raise LookupError("Every product in that batch has been repriced or removed since; nothing to undo.")
+        rows = current.index[unchanged]
+        restored = batch["OLD"].to_numpy()[position[unchanged]]
+        result.update(restored=len(rows), conflicts=max(0, len(batch) - len(rows)))
+        updated = current.copy()
+        updated.loc[rows, "RRP"] = restored
+        changes.add_bulk(
+            UNDO_KIND, "RRP", current.loc[rows, "BARCODE"], framecodes(current, rows),
+            current.loc[rows, "RRP"].map(format_rrp), restored, current=current,
+        )
+        return prepare_for_save(updated)
+    get_writer().apply(path, mutation, on_commit=changes.commit)
+    return result
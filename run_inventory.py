@@ -1,2 +1,36 @@
+import argparse
+import threading
+import time
+
 import streamlit.web.bootstrap
-streamlit.web.bootstrap.run('Inventory_Manager.py', '', [], None)
\ No newline at end of file
+
+from stock_analytics import get_stock_analytics
+
+def warm_up():
+    # Runs while Streamlit binds its port: the first session finds the inventory parsed
+    # and its display table built in the shared snapshot, instead of doing it itself
+    from inventory_io import default_inventory_file
+    from shared_inventory import get_shared_inventory
+    started = time.perf_counter()
+    path = default_inventory_file()
+    if path is not None:
+        try:
+            get_shared_inventory().get(path).display()
+        except (OSError, ValueError) as e:
+            print(f"Inventory warm-up failed: {e}", flush=True)
+            return
+    import barcode.writer  # noqa: F401  the label renderer's imports, so the first label is quick
+    print(f"Inventory warm in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the Inventory Manager Streamlit app.")
+    parser.add_argument("--port", type=int, default=8501)
+    parser.add_argument("--no-warm", action="store_true", help="Skip loading the inventory before the first session")
+    args = parser.parse_args()
+    get_stock_analytics()  # registers its commit listener before the first save, so analytics follow every write
+    if not args.no_warm:
+        threading.Thread(target=warm_up, name="inventory-warmup", daemon=True).start()
+    flag_options = {"server_port": args.port, "server_headless": True}
+    streamlit.web.bootstrap.load_config_options(flag_options)
+    streamlit.web.bootstrap.run('Inventory_Manager.py', False, [], flag_options)
@@ -0,0 +1,414 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from inventory_io import (
+    BASE_DIR, clean_barcode_series, default_inventory_file, iter_table_chunks, load_inventory_file, prepare_for_save,
+    state_path,
+)
+from inventory_writer import file_lock, get_writer
+from audit_log import ChangeSet, get_audit_log
+from archive_store import SOLD_OUT, get_archive_store
+
+SALES_DROP_FOLDER = os.path.join(BASE_DIR, "sales_drop")
+SALES_DB_NAME = "sales_ingest.db"
+SALES_EXTENSIONS = ('.csv', '.xlsx', '.txt')
+# States of an idempotency key
+PENDING = "pending"
+APPLIED = "applied"
+REVIEW = "review"
+# A claim older than this cannot belong to a batch still in the writer's queue
+STALE_CLAIM_SECONDS = 600
+WRITE_TIMEOUT = 30  # seconds a batch waits for its write before the caller is told to retry
+
+BARCODE_COLUMNS = ("BARCODE", "EAN", "UPC")
+QUANTITY_COLUMNS = ("QUANTITY", "QTY")
+TYPE_COLUMNS = ("TYPE",)
+RETURN_TYPES = {"RETURN", "REFUND"}
+
+def find_column(columns, candidates):
+    upper = {str(c).strip().upper(): c for c in columns}
+    for candidate in candidates:
+        if candidate in upper:
+            return upper[candidate]
+    return None
+
+def aggregate_chunk(chunk):
+    barcode_col = find_column(chunk.columns, BARCODE_COLUMNS)
+    if barcode_col is None:
+        raise ValueError("Sales data has no BARCODE column.")
+    qty_col = find_column(chunk.columns, QUANTITY_COLUMNS)
+    type_col = find_column(chunk.columns, TYPE_COLUMNS)
+    barcodes = clean_barcode_series(chunk[barcode_col])
+    if qty_col is not None:
+        qty = pd.to_numeric(chunk[qty_col], errors="coerce").fillna(1)
+    else:
+        qty = pd.Series(1, index=chunk.index)
+    if type_col is not None:
+        # Returns put stock back
+        is_return = chunk[type_col].astype(str).str.strip().str.upper().isin(RETURN_TYPES)
+        qty = qty.where(~is_return, -qty)
+    valid = barcodes.ne("")
+    return qty[valid].groupby(barcodes[valid]).sum()
+
+def aggregate_chunks(chunks):
+    partials = []
+    lines = 0
+    for chunk in chunks:
+        lines += len(chunk)
+        partials.append(aggregate_chunk(chunk))
+    if not partials:
+        return pd.Series(dtype="float64"), lines
+    deltas = pd.concat(partials).groupby(level=0).sum()
+    return deltas[deltas.ne(0)], lines
+
+# --- Applying deltas to the inventory ---
+def apply_deltas(current, deltas, changes, result, source=None):
+    codes = current["BARCODE"]
+    # Duplicate barcodes in the inventory only have their first row decremented
+    sold = codes.map(deltas).where(~codes.duplicated())
+    found = sold.notna()
+    held = pd.to_numeric(current.loc[found, "QUANTITY"], errors="coerce")
+    # A blank or unreadable QUANTITY is left alone and reported, never taken as 0
+    unparsed = held.index[held.isna()]
+    hit = found.copy()
+    hit[unparsed] = False
+    held = held.drop(unparsed)
+    before = current.loc[hit, "QUANTITY"]
+    after = (held - sold[hit]).round().astype("int64")
+    updated = current.copy()
+    updated.loc[hit, "QUANTITY"] = after.astype(str)
+    if "FRAMENUM" in current.columns:
+        framecodes = current.loc[hit, "FRAMENUM"].fillna("").astype(str)
+    else:
+        framecodes = pd.Series("", index=before.index)
+    # One audit record for the batch, replayed with column operations
+    changes.add_bulk("sale", "QUANTITY", codes[hit], framecodes, before, after.astype(str), current=current)
+    unknown = deltas.index.difference(codes[found])
+    result["matched"] = int(hit.sum())
+    result["unknown_count"] = int(len(unknown))
+    result["unknown"] = unknown[:100].tolist()
+    result["unparsed"] = codes[unparsed].tolist()
+    # Oversold rows keep their negative count for review rather than being removed
+    result["oversold"] = codes[hit][after.lt(0)].tolist()
+    # Only rows that sold down to exactly 0 move to the archive, once the write commits
+    sold_out = after.index[after.eq(0)]
+    result["archived"] = int(len(sold_out))
+    # What the touched rows look like once this is saved, for crash recovery
+    result["expected"] = [
+        [code, framenum, float(old), int(new), bool(new == 0)]
+        for code, framenum, old, new in zip(codes[hit], framecodes, held, after)
+    ]
+    if len(sold_out):
+        changes.add_bulk(
+            "delete", "QUANTITY", codes[sold_out], framecodes[sold_out], ["0"] * len(sold_out), [None] * len(sold_out),
+        )
+        result["sold_out"] = updated.loc[sold_out]
+        updated = updated.drop(sold_out).reset_index(drop=True)
+    return updated
+
+def sale_outcome(frame, expected):
+    # APPLIED when every row a batch touched carries its new quantity (or is gone if it
+    # sold out), PENDING when every row still has its old one, REVIEW otherwise
+    if "FRAMENUM" in frame.columns:
+        framenums = frame["FRAMENUM"].fillna("").astype(str)
+    else:
+        framenums = pd.Series("", index=frame.index)
+    keys = frame["BARCODE"].fillna("").astype(str) + "\x1f" + framenums
+    first = ~keys.duplicated()
+    held = dict(zip(keys[first], pd.to_numeric(frame.loc[first, "QUANTITY"], errors="coerce").fillna(0)))
+    applied = unchanged = 0
+    for code, framenum, before, after, removed in expected:
+        quantity = held.get(f"{code}\x1f{framenum}")
+        if quantity is None:
+            applied += removed
+            continue
+        applied += not removed and quantity == after
+        unchanged += quantity == before
+    if applied == len(expected):
+        return APPLIED
+    if unchanged == len(expected):
+        return PENDING
+    return REVIEW
+
+
+class SalesIngestor:
+    # The key of a batch is claimed in SQLite before its write is queued and marked
+    # applied once the write has committed. A claim left pending by a crash is settled
+    # at startup by looking at the inventory: the rows the batch touched either carry
+    # its quantities (applied) or their old ones (never written, so the key is freed).
+    # A retry of a key that is still pending settles it there and then.
+    def __init__(self, db_path=None):
+        self.db_path = db_path or state_path(SALES_DB_NAME)
+        self._in_flight = {}  # key -> (write ticket, result) for batches this process queued
+        self._in_flight_lock = threading.Lock()
+        conn = self._connect()
+        conn.close()
+        self.recovered = self.recover()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingested (key TEXT PRIMARY KEY, ts REAL NOT NULL, lines INTEGER, summary TEXT)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(ingested)")}
+        for column, kind in (("status", f"TEXT NOT NULL DEFAULT '{APPLIED}'"), ("file", "TEXT"), ("expected", "TEXT")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE ingested ADD COLUMN {column} {kind}")
+        return conn
+
+    def _status(self, key):
+        # (status, claimed at) or None when the key is free
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT status, ts FROM ingested WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+
+    def already_ingested(self, key):
+        # Pending claims do not count: a retry goes on to settle them
+        status = self._status(key)
+        return status is not None and status[0] != PENDING
+
+    def _claim(self, key, lines, inventory_file):
+        # False when the key is already applied or being applied, by any process
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO ingested (key, ts, lines, status, file) VALUES (?, ?, ?, ?, ?)",
+                    (key, time.time(), lines, PENDING, os.path.abspath(inventory_file)),
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            conn.close()
+
+    def _record_expected(self, key, expected):
+        # Written from the mutation, before the inventory is saved, so recovery knows
+        # what the rows look like if the save went through
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE ingested SET expected = ? WHERE key = ?", (json.dumps(expected), key))
+        finally:
+            conn.close()
+
+    def _release(self, key):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM ingested WHERE key = ? AND status = ?", (key, PENDING))
+        finally:
+            conn.close()
+
+    def _mark_ingested(self, key, lines, result, status=APPLIED):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO ingested (key, ts, lines, summary, status) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET ts = excluded.ts, summary = excluded.summary, "
+                    "status = excluded.status, expected = NULL",
+                    (key, time.time(), lines, json.dumps(result, default=str), status),
+                )
+        finally:
+            conn.close()
+
+    def recover(self, stale_after=STALE_CLAIM_SECONDS, key=None):
+        # Settles claims left pending by a process that stopped mid-batch (all of them,
+        # or just `key`). Returns {key: outcome}; a batch only partly visible in the file
+        # is kept for review and its key stays claimed, so it can never be taken off twice.
+        query = "SELECT key, lines, file, expected FROM ingested WHERE status = ? AND ts < ?"
+        params = [PENDING, time.time() - stale_after]
+        if key is not None:
+            query += " AND key = ?"
+            params.append(key)
+        conn = self._connect()
+        try:
+            pending = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        outcomes = {}
+        for key, lines, path, expected in pending:
+            if expected is None:
+                # The mutation never ran, so nothing was saved
+                self._release(key)
+                outcomes[key] = "released"
+                continue
+            try:
+                with file_lock(path):
+                    outcome = sale_outcome(load_inventory_file(path), json.loads(expected))
+            except (OSError, ValueError):
+                continue  # file unreadable right now; tried again next start
+            if outcome == APPLIED:
+                self._mark_ingested(key, lines, {"key": key, "lines": lines, "recovered": True})
+            elif outcome == PENDING:
+                self._release(key)
+                outcome = "released"
+            else:
+                self._mark_ingested(key, lines, {"key": key, "lines": lines, "recovered": False}, status=REVIEW)
+            outcomes[key] = outcome
+        return outcomes
+
+    def _forget(self, key):
+        with self._in_flight_lock:
+            self._in_flight.pop(key, None)
+
+    def _retry_claim(self, key, lines, inventory_file):
+        # The key is already claimed. True once it has been freed and claimed for this
+        # call; False when the batch is applied (or held for review), so this is a
+        # duplicate. TimeoutError while the first attempt may still commit.
+        with self._in_flight_lock:
+            in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            # Queued by this process and timed out: its outcome decides
+            ticket, earlier = in_flight
+            try:
+                ticket.wait(WRITE_TIMEOUT)
+            except TimeoutError:
+                raise
+            except Exception:
+                self._forget(key)
+                self._release(key)
+                return self._claim(key, lines, inventory_file)
+            self._mark_ingested(key, earlier["lines"], earlier)
+            self._forget(key)
+            return False
+        status = self._status(key)
+        if status is None:
+            return self._claim(key, lines, inventory_file)
+        if status[0] != PENDING:
+            return False
+        if self.recover(key=key).get(key) == "released":
+            return self._claim(key, lines, inventory_file)
+        if self._status(key)[0] == PENDING:
+            raise TimeoutError("This batch is still being applied; retry it shortly.")
+        return False
+
+    def apply(self, deltas, lines, key, inventory_file=None, started=None):
+        # One idempotency key = one batch. Replays of a claimed or committed key are no-ops.
+        started = started or time.perf_counter()
+        inventory_file = inventory_file or default_inventory_file()
+        result = {"key": key, "lines": lines, "barcodes": int(len(deltas)), "units": float(deltas.sum()), "duplicate": False}
+        if not self._claim(key, lines, inventory_file) and not self._retry_claim(key, lines, inventory_file):
+            result["duplicate"] = True
+            return result
+        if len(deltas):
+            changes = ChangeSet(inventory_file)
+            def mutation(current):
+                updated = apply_deltas(current, deltas, changes, result, inventory_file)
+                self._record_expected(key, result.pop("expected"))
+                return prepare_for_save(updated)
+            def on_commit(frame):
+                changes.commit()
+                get_archive_store().queue(result.pop("sold_out", None), SOLD_OUT, inventory_file)
+            ticket = get_writer().submit(inventory_file, mutation, on_commit=on_commit)
+            with self._in_flight_lock:
+                self._in_flight[key] = (ticket, result)
+            try:
+                ticket.wait(WRITE_TIMEOUT)
+            except TimeoutError:
+                raise  # still queued and may yet commit; a retry of the key settles it
+            except Exception:
+                self._forget(key)
+                self._release(key)
+                raise
+        else:
+            result.update(matched=0, unknown_count=0, unknown=[], unparsed=[], oversold=[], archived=0)
+        # The stock has been taken off; a failure here reaches the caller and the
+        # claim stays pending for recovery to finish
+        self._mark_ingested(key, lines, result)
+        self._forget(key)
+        result["seconds"] = time.perf_counter() - started
+        result["lines_per_second"] = lines / result["seconds"] if result["seconds"] else float(lines)
+        return result
+
+    def ingest_bytes(self, data, name, key=None, inventory_file=None):
+        started = time.perf_counter()
+        key = key or hashlib.sha256(data).hexdigest()
+        if self.already_ingested(key):
+            return {"key": key, "duplicate": True}
+        deltas, lines = aggregate_chunks(iter_table_chunks(io.BytesIO(data), name))
+        return self.apply(deltas, lines, key, inventory_file, started)
+
+    def ingest_file(self, path, key=None, inventory_file=None):
+        started = time.perf_counter()
+        if key is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            key = digest.hexdigest()
+        if self.already_ingested(key):
+            return {"key": key, "duplicate": True}
+        deltas, lines = aggregate_chunks(iter_table_chunks(path, os.path.basename(path)))
+        return self.apply(deltas, lines, key, inventory_file, started)
+
+    def ingest_records(self, records, key=None, inventory_file=None):
+        started = time.perf_counter()
+        key = key or hashlib.sha256(json.dumps(records, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        deltas, lines = aggregate_chunks([pd.DataFrame(records)] if records else [])
+        return self.apply(deltas, lines, key, inventory_file, started)
+
+    def ingest_drop_folder(self, folder=SALES_DROP_FOLDER, inventory_file=None):
+        processed = os.path.join(folder, "processed")
+        failed = os.path.join(folder, "failed")
+        os.makedirs(processed, exist_ok=True)
+        os.makedirs(failed, exist_ok=True)
+        results = []
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not os.path.isfile(path) or not name.lower().endswith(SALES_EXTENSIONS):
+                continue
+            try:
+                result = self.ingest_file(path, inventory_file=inventory_file)
+                dest = processed
+            except (ValueError, OSError, TimeoutError) as e:
+                result = {"error": str(e)}
+                dest = failed
+            result["file"] = name
+            shutil.move(path, os.path.join(dest, f"{time.strftime('%Y%m%d-%H%M%S')}_{name}"))
+            results.append(result)
+        return results
+
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+def get_sales_ingestor():
+    global _ingestor
+    with _ingestor_lock:
+        if _ingestor is None:
+            _ingestor = SalesIngestor()
+    return _ingestor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply sales exports to the inventory quantities.")
+    parser.add_argument("files", nargs="*", help="Sales exports to ingest (defaults to the sales_drop folder)")
+    parser.add_argument("--inventory", help="Inventory file to decrement (defaults to the first file in Inventory/)")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="Keep polling the drop folder")
+    args = parser.parse_args()
+    ingestor = get_sales_ingestor()
+    if args.files:
+        for path in args.files:
+            print(json.dumps(ingestor.ingest_file(path, inventory_file=args.inventory), default=str))
+    else:
+        os.makedirs(SALES_DROP_FOLDER, exist_ok=True)
+        while True:
+            for result in ingestor.ingest_drop_folder(inventory_file=args.inventory):
+                print(json.dumps(result, default=str))
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    get_writer().flush()
+    get_audit_log().flush()
@@ -0,0 +1,126 @@
+import argparse
+import gzip
+import json
+import os
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from inventory_io import clean_barcode
+
+# Offline-capable handheld client: keeps a local copy of the catalogue via /sync,
+# looks barcodes up locally and queues scans until the server is reachable.
+DEFAULT_SERVER = "http://localhost:5001"
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".inventory_scanner.json")
+
+
+class ScannerClient:
+    def __init__(self, server=DEFAULT_SERVER, cache_path=DEFAULT_CACHE, timeout=5):
+        self.server = server.rstrip("/")
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.version = 0
+        self.etag = None
+        self.fields = []
+        self.catalogue = {}
+        self.pending = []
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        with open(self.cache_path, encoding="utf-8") as f:
+            state = json.load(f)
+        self.version = state.get("version", 0)
+        self.etag = state.get("etag")
+        self.fields = state.get("fields", [])
+        self.catalogue = state.get("catalogue", {})
+        self.pending = state.get("pending", [])
+
+    def _save(self):
+        state = {
+            "version": self.version, "etag": self.etag, "fields": self.fields,
+            "catalogue": self.catalogue, "pending": self.pending,
+        }
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def sync(self):
+        headers = {"Accept-Encoding": "gzip"}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        req = urllib.request.Request(f"{self.server}/sync?since={self.version}", headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                body = resp.read()
+                if resp.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                self.etag = resp.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 0
+            raise
+        feed = json.loads(body)
+        self.fields = feed["fields"] or self.fields
+        if feed["full"]:
+            self.catalogue = {}
+        barcode_col = next((i for i, f in enumerate(self.fields) if str(f).lower() == "barcode"), None)
+        for row in feed["changed"]:
+            self.catalogue[clean_barcode(row[barcode_col])] = row
+        for code in feed["deleted"]:
+            self.catalogue.pop(code, None)
+        self.version = feed["version"]
+        self._save()
+        return len(feed["changed"]) + len(feed["deleted"])
+
+    def lookup(self, barcode):
+        row = self.catalogue.get(clean_barcode(barcode))
+        return dict(zip(self.fields, row)) if row is not None else None
+
+    def scan(self, barcode):
+        code = clean_barcode(barcode)
+        self.pending.append({"barcode": code, "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+        self._save()
+        return self.lookup(code)
+
+    def upload(self):
+        if not self.pending:
+            return None
+        req = urllib.request.Request(
+            f"{self.server}/sync/scans",
+            data=json.dumps({"scans": self.pending}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            result = json.loads(resp.read())
+        self.pending = []
+        self._save()
+        return result
+
+    def try_reconnect(self):
+        # Call whenever the network might be back; failures leave scans queued
+        try:
+            self.upload()
+            self.sync()
+            return True
+        except (urllib.error.URLError, OSError):
+            return False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline barcode scanner client.")
+    parser.add_argument("--server", default=DEFAULT_SERVER)
+    parser.add_argument("--cache", default=DEFAULT_CACHE)
+    args = parser.parse_args()
+    client = ScannerClient(args.server, args.cache)
+    print("Online." if client.try_reconnect() else "Offline: using the cached catalogue.")
+    print(f"{len(client.catalogue)} products cached (version {client.version}). Scan barcodes, blank line to quit.")
+    while True:
+        code = input("> ").strip()
+        if not code:
+            break
+        product = client.scan(code)
+        print(json.dumps(product, default=str) if product else "Barcode not found in inventory.")
+        client.try_reconnect()
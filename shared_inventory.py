@@ -0,0 +1,101 @@
+import collections
+import os
+import threading
+
+import pandas as pd
+
+from inventory_io import as_loaded, clean_barcode_series, clean_nans, format_rrp, load_inventory_file
+from file_watcher import get_file_watcher
+from inventory_writer import file_signature
+
+# Streamlit runs every browser session in the same process, so one loaded copy of
+# each inventory file is shared by all of them. Sessions only ever read it; edits go
+# through the background writer, which works on its own frame, and a new snapshot
+# replaces the old one when the file watcher publishes a new version of the file.
+
+# Sharing relies on copy-on-write: anything a session derives from the shared frame
+# (a filter, an assigned column) gets its own data instead of changing everyone's.
+# It is always on from pandas 3.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+def display_frame(frame):
+    # The table the pages show: formatted prices, cleaned barcodes, blanks for NaN
+    display = frame.assign(**{
+        col: fn(frame[col]) for col, fn in (
+            ("RRP", lambda s: s.map(format_rrp).astype(str)),
+            ("BARCODE", clean_barcode_series),
+        ) if col in frame.columns
+    })
+    return clean_nans(display)
+
+
+class InventorySnapshot:
+    def __init__(self, path, version, frame):
+        self.path = path
+        self.version = version
+        self.frame = frame
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def derived(self, name, build):
+        # Built once per snapshot and shared, e.g. the formatted display table
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build(self.frame)
+            return self._derived[name]
+
+    def display(self):
+        return self.derived("display", display_frame)
+
+
+class SharedInventory:
+    def __init__(self):
+        self._snapshots = {}
+        self._locks = collections.defaultdict(threading.Lock)
+
+    def get(self, path, loader=load_inventory_file):
+        key = (os.path.abspath(path), loader)
+        watcher = get_file_watcher()
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.version == watcher.version(path):
+            return snapshot
+        with self._locks[key]:
+            # Whoever got the lock first has already reloaded it for everyone else.
+            # The version is read before loading, so a change during the load reloads once more.
+            version = watcher.version(path)
+            snapshot = self._snapshots.get(key)
+            if snapshot is None or snapshot.version != version:
+                snapshot = InventorySnapshot(path, version, loader(path))
+                self._snapshots[key] = snapshot
+        return snapshot
+
+    def seed(self, path, frame, signature, loader=load_inventory_file):
+        # For writers in this process: the frame they just committed, as saved, becomes the
+        # snapshot instead of the file being read back. Returns None when the file has
+        # changed again since `signature` was taken; the next get() reads it then.
+        key = (os.path.abspath(path), loader)
+        watcher = get_file_watcher()
+        with self._locks[key]:
+            version = watcher.version(path)
+            if file_signature(path) != signature:
+                return None
+            snapshot = self._snapshots.get(key)
+            if snapshot is None or snapshot.version != version:
+                snapshot = InventorySnapshot(path, version, as_loaded(frame))
+                self._snapshots[key] = snapshot
+        return snapshot
+
+    def versions(self):
+        return {path: snapshot.version for (path, _), snapshot in self._snapshots.items()}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_shared_inventory():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SharedInventory()
+    return _shared
@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_quality import parse_dates, parse_price
+from inventory_io import load_inventory_file, row_hashes, source_column, state_path
+from inventory_writer import file_signature, get_writer
+from perf_metrics import span
+
+# Stock analytics kept as materialised aggregates. Every row's contribution (its
+# group codes and values) is kept in a ledger keyed by row hash; when the file
+# changes only rows whose hash appeared or disappeared are parsed, and their
+# contributions are added to or taken off the group totals. Reports read the
+# totals, so they cost the number of groups, not the number of rows.
+DIMENSIONS = ["SUPPLIER", "MANUFACT", "FRAMETYPE", "F GROUP", "AVAILFROM"]
+MEASURES = ["UNITS", "RETAIL VALUE", "COST VALUE", "UNPRICED"]
+SOURCE_FIELDS = DIMENSIONS + ["QUANTITY", "RRP", "COST PRICE"]
+NO_VALUE = "(none)"
+# Ageing is aggregated by AVAILFROM month, which never changes for a row, and
+# bucketed when a report is read, so the buckets move with the calendar by themselves
+AGE_BUCKETS = [(3, "Under 3 months"), (6, "3-6 months"), (12, "6-12 months"), (24, "1-2 years"), (None, "Over 2 years")]
+NO_DATE = "No date"
+OCCURRENCE_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+log = logging.getLogger(__name__)
+
+def analytic_columns(frame):
+    # The fields the aggregates read, as text in the same form whether the frame came
+    # from disk (RRP 12.50) or from the writer after prepare_for_save ($12.50)
+    table = {}
+    for field in SOURCE_FIELDS:
+        name = source_column(frame, field)
+        if name is None:
+            table[field] = pd.Series("", index=frame.index, dtype=object)
+            continue
+        text = frame[name].fillna("").astype(str).str.strip()
+        if field in ("RRP", "COST PRICE"):
+            text = text.str.lstrip("$")
+        table[field] = text.mask(text.isin(["nan", "None", "<NA>", "NaT"]), "")
+    return pd.DataFrame(table, index=frame.index)
+
+def occurrence_keys(hashes):
+    # Identical rows share a hash; numbering repeats keeps them apart in the ledger
+    if not pd.Series(hashes).duplicated().any():
+        return hashes
+    repeat = pd.Series(hashes).groupby(hashes).cumcount().to_numpy().astype(np.uint64)
+    with np.errstate(over="ignore"):
+        return hashes + repeat * OCCURRENCE_MIX
+
+def age_bucket(month, today=None):
+    if month == NO_VALUE:
+        return NO_DATE
+    today = today or pd.Timestamp.today()
+    year, mon = (int(part) for part in month.split("-"))
+    age = (today.year - year) * 12 + today.month - mon
+    return next(label for limit, label in AGE_BUCKETS if limit is None or age < limit)
+
+
+class FileAggregates:
+    def __init__(self):
+        self.signature = None
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.codes = np.empty((0, len(DIMENSIONS)), dtype=np.int32)
+        self.values = np.empty((0, len(MEASURES)), dtype=np.float64)
+        self.categories = [[] for _ in DIMENSIONS]
+        self.lookup = [{} for _ in DIMENSIONS]
+        self.totals = [np.zeros((0, len(MEASURES) + 1)) for _ in DIMENSIONS]
+        self.missing = []  # dimensions the file has no column for
+
+    def code(self, dim, value):
+        codes = self.lookup[dim]
+        if value not in codes:
+            codes[value] = len(self.categories[dim])
+            self.categories[dim].append(value)
+            self.totals[dim] = np.vstack([self.totals[dim], np.zeros((1, len(MEASURES) + 1))])
+        return codes[value]
+
+    def contributions(self, table):
+        # Group codes and values for new rows; the only place rows are parsed
+        codes = np.empty((len(table), len(DIMENSIONS)), dtype=np.int32)
+        for dim, field in enumerate(DIMENSIONS):
+            if field == "AVAILFROM":
+                # Months as yyyymm numbers; only the distinct ones are formatted
+                dates = parse_dates(table[field])
+                positions, months = pd.factorize((dates.dt.year * 100 + dates.dt.month).fillna(0).astype("int64"))
+                uniques = [f"{m // 100}-{m % 100:02d}" if m else NO_VALUE for m in months]
+            else:
+                positions, uniques = pd.factorize(table[field].where(table[field].ne(""), NO_VALUE))
+            codes[:, dim] = np.array([self.code(dim, label) for label in uniques], dtype=np.int32)[positions]
+        units = pd.to_numeric(table["QUANTITY"], errors="coerce").fillna(0).clip(lower=0).to_numpy()
+        rrp = parse_price(table["RRP"]).to_numpy()
+        cost = parse_price(table["COST PRICE"]).fillna(0).to_numpy()
+        values = np.column_stack([units, units * np.nan_to_num(rrp), units * cost, np.isnan(rrp).astype(np.float64)])
+        return codes, values
+
+    def accumulate(self, codes, values, sign):
+        rows = np.column_stack([np.full(len(values), sign, dtype=np.float64), sign * values])
+        for dim in range(len(DIMENSIONS)):
+            np.add.at(self.totals[dim], codes[:, dim], rows)
+
+    def update(self, frame, signature):
+        # Returns how many rows were added and removed since the last update
+        table = analytic_columns(frame)
+        self.missing = [field for field in DIMENSIONS if source_column(frame, field) is None]
+        keys = occurrence_keys(row_hashes(table).to_numpy())
+        gone = ~np.isin(self.keys, keys)
+        new = ~np.isin(keys, self.keys)
+        if gone.any():
+            self.accumulate(self.codes[gone], self.values[gone], -1)
+            self.keys, self.codes, self.values = self.keys[~gone], self.codes[~gone], self.values[~gone]
+        if new.any():
+            codes, values = self.contributions(table[new])
+            self.accumulate(codes, values, 1)
+            self.keys = np.concatenate([self.keys, keys[new]])
+            self.codes = np.concatenate([self.codes, codes])
+            self.values = np.concatenate([self.values, values])
+        self.signature = signature
+        return int(new.sum()), int(gone.sum())
+
+    def rebuild_totals(self):
+        self.totals = [np.zeros((len(categories), len(MEASURES) + 1)) for categories in self.categories]
+        self.accumulate(self.codes, self.values, 1)
+
+    def table(self, dim):
+        totals = pd.DataFrame(self.totals[dim], columns=["PRODUCTS"] + MEASURES, index=self.categories[dim])
+        totals = totals[totals["PRODUCTS"] > 0.5].round(2)
+        totals[["PRODUCTS", "UNITS", "UNPRICED"]] = totals[["PRODUCTS", "UNITS", "UNPRICED"]].round().astype("int64")
+        totals.index.name = DIMENSIONS[dim]
+        return totals
+
+
+class StockAnalytics:
+    # One set of aggregates per inventory file, kept current by the writer's commit
+    # listener and saved in state/ so a restart does not start from nothing
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.RLock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _state_path(self, path):
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+        return state_path(f"analytics_{digest}.npz")
+
+    def _aggregates(self, path):
+        path = os.path.abspath(path)
+        if path not in self._files:
+            aggregates = FileAggregates()
+            try:
+                with np.load(self._state_path(path)) as saved:
+                    aggregates.keys, aggregates.codes, aggregates.values = saved["keys"], saved["codes"], saved["values"]
+                    aggregates.categories = json.loads(str(saved["categories"]))
+                    aggregates.signature = tuple(saved["signature"]) or None
+                    aggregates.missing = json.loads(str(saved["missing"]))
+                aggregates.lookup = [{value: code for code, value in enumerate(values)} for values in aggregates.categories]
+                aggregates.rebuild_totals()
+            except (OSError, ValueError, KeyError):
+                aggregates = FileAggregates()
+            self._files[path] = aggregates
+        return self._files[path]
+
+    def _save(self, path, aggregates):
+        tmp_path = self._state_path(path) + ".tmp.npz"
+        try:
+            np.savez(
+                tmp_path, keys=aggregates.keys, codes=aggregates.codes, values=aggregates.values,
+                categories=json.dumps(aggregates.categories), missing=json.dumps(aggregates.missing),
+                signature=np.array(aggregates.signature or (), dtype=np.int64),
+            )
+            os.replace(tmp_path, self._state_path(path))
+        except OSError:
+            pass
+
+    def tracked(self, path):
+        return os.path.abspath(path) in self._files or os.path.exists(self._state_path(path))
+
+    def sync(self, path, frame, signature=None):
+        with self._lock, span("analytics_update"):
+            aggregates = self._aggregates(path)
+            added, removed = aggregates.update(frame, signature or file_signature(path))
+            if added or removed:
+                self._save(path, aggregates)
+            return added, removed
+
+    def committed(self, path, frame):
+        # Writer commit listener: the aggregates follow every add, edit, delete and sale.
+        # The work runs on its own thread so the writer is not held up.
+        if self.tracked(path):
+            self._queue.put((os.path.abspath(path), frame, file_signature(path)))
+            self._ensure_started()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stock-analytics", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            latest = {}
+            item = self._queue.get()
+            while True:
+                latest[item[0]] = item  # only the newest frame of each file matters
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            for path, frame, signature in latest.values():
+                try:
+                    self.sync(path, frame, signature)
+                except Exception:
+                    # The next report catches up from the file
+                    log.exception("Could not update the stock totals for %s", path)
+
+    def report(self, path):
+        # The file is only read when it changed outside this process's writer, e.g. an
+        # import or another process's sale. Its signature is taken before it is read, so
+        # a change during the read is caught up with on the next report.
+        started = time.perf_counter()
+        with self._lock:
+            aggregates = self._aggregates(path)
+            synced = None
+            signature = file_signature(path)
+            if aggregates.signature != signature:
+                synced = self.sync(path, load_inventory_file(path), signature)
+            tables = {field: aggregates.table(dim) for dim, field in enumerate(DIMENSIONS)}
+            missing = list(aggregates.missing)
+        months = tables.pop("AVAILFROM")
+        today = pd.Timestamp.today()
+        ageing = months.groupby([age_bucket(month, today) for month in months.index]).sum()
+        ageing = ageing.reindex([label for _, label in AGE_BUCKETS] + [NO_DATE]).dropna().astype(months.dtypes.to_dict())
+        ageing.index.name = "AGE"
+        totals = months.sum() if len(months) else pd.Series(0, index=["PRODUCTS"] + MEASURES)
+        return {
+            "totals": totals.to_dict(),
+            "tables": tables,
+            "ageing": ageing,
+            "missing": missing,
+            "synced": synced,
+            "seconds": time.perf_counter() - started,
+        }
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+def get_stock_analytics():
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = StockAnalytics()
+            get_writer().add_commit_listener(_analytics.committed)
+    return _analytics
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print stock value and ageing for an inventory file.")
+    parser.add_argument("path")
+    parser.add_argument("--by", choices=[d for d in DIMENSIONS if d != "AVAILFROM"], default="SUPPLIER")
+    args = parser.parse_args()
+    report = get_stock_analytics().report(args.path)
+    print(report["tables"][args.by].sort_values("RETAIL VALUE", ascending=False).to_string())
+    print()
+    print(report["ageing"].to_string())
+    print(f"\n{report['totals']['PRODUCTS']:,.0f} products, {report['totals']['UNITS']:,.0f} units, "
+          f"retail ${report['totals']['RETAIL VALUE']:,.2f}, cost ${report['totals']['COST VALUE']:,.2f} "
+          f"({report['seconds']:.2f}s)")
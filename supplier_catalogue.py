@@ -0,0 +1,171 @@
+import argparse
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from inventory_io import COLUMN_ALIASES, clean_barcode_series, iter_table_chunks, state_path
+
+CATALOGUE_DB_NAME = "supplier_catalogue.db"
+CATALOGUE_ALIASES = {
+    **COLUMN_ALIASES,
+    "EAN": "BARCODE", "UPC": "BARCODE", "GTIN": "BARCODE",
+    "BRAND": "MANUFACT", "COLOUR": "FCOLOUR", "COLOR": "FCOLOUR",
+    "COST": "COST PRICE", "PRICE": "RRP",
+}
+CATALOGUE_FIELDS = [
+    "BARCODE", "MANUFACT", "MODEL", "SIZE", "FCOLOUR", "FRAMETYPE", "F GROUP", "SUPPLIER",
+    "TEMPLE", "DEPTH", "DIAG", "BASECURVE", "RRP", "EXCOSTPR", "COST PRICE",
+]
+LOOKUP_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalogue (
+    barcode TEXT PRIMARY KEY,
+    supplier TEXT,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS imports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    name TEXT,
+    supplier TEXT,
+    rows INTEGER
+);
+"""
+
+def normalise_catalogue_chunk(chunk, supplier=None):
+    upper = {str(c).strip().upper(): c for c in chunk.columns}
+    renamed = {}
+    for name, col in upper.items():
+        field = name if name in CATALOGUE_FIELDS else CATALOGUE_ALIASES.get(name)
+        if field and field not in renamed:
+            renamed[field] = chunk[col]
+    if "BARCODE" not in renamed:
+        raise ValueError("Catalogue has no BARCODE/EAN/UPC column.")
+    frame = pd.DataFrame(renamed)
+    frame["BARCODE"] = clean_barcode_series(frame["BARCODE"])
+    if supplier:
+        frame["SUPPLIER"] = supplier
+    frame = frame[frame["BARCODE"].ne("")].drop_duplicates("BARCODE", keep="last")
+    return frame.astype(object).where(frame.notna(), "").astype(str)
+
+
+class SupplierCatalogue:
+    # Barcode-keyed store on disk: lookups hit the primary key index, so the
+    # catalogue never has to fit in memory.
+    def __init__(self, db_path=None):
+        self.db_path = db_path or state_path(CATALOGUE_DB_NAME)
+        self._count = (None, 0)  # (latest import id, products), recounted only after an import
+        self._count_lock = threading.Lock()
+        conn = self._connect()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def import_file(self, source, name, supplier=None, progress=None):
+        # progress, if given, is called with the rows imported so far after each chunk
+        started = time.perf_counter()
+        rows = 0
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA synchronous=OFF")
+            for chunk in iter_table_chunks(source, name):
+                frame = normalise_catalogue_chunk(chunk, supplier)
+                fields = list(frame.columns)
+                supplier_col = frame["SUPPLIER"] if "SUPPLIER" in frame.columns else pd.Series("", index=frame.index)
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO catalogue (barcode, supplier, data) VALUES (?, ?, ?)",
+                        (
+                            (code, sup, json.dumps(dict(zip(fields, values))))
+                            for code, sup, values in zip(frame["BARCODE"], supplier_col, frame.itertuples(index=False, name=None))
+                        ),
+                    )
+                rows += len(frame)
+                if progress is not None:
+                    progress(rows)
+            with conn:
+                conn.execute(
+                    "INSERT INTO imports (ts, name, supplier, rows) VALUES (?, ?, ?, ?)",
+                    (time.time(), name, supplier, rows),
+                )
+        finally:
+            conn.close()
+        return {"rows": rows, "seconds": time.perf_counter() - started}
+
+    def import_bytes(self, data, name, supplier=None, progress=None):
+        return self.import_file(io.BytesIO(data), name, supplier, progress)
+
+    def resolve(self, barcodes):
+        # Bulk lookup, a few hundred keys per indexed query
+        codes = list(dict.fromkeys(clean_barcode_series(pd.Series(list(barcodes), dtype=object))))
+        codes = [c for c in codes if c]
+        found = []
+        conn = self._connect()
+        try:
+            for start in range(0, len(codes), LOOKUP_BATCH):
+                batch = codes[start:start + LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.extend(
+                    json.loads(data) for (data,) in conn.execute(
+                        f"SELECT data FROM catalogue WHERE barcode IN ({placeholders})", batch
+                    )
+                )
+        finally:
+            conn.close()
+        if not found:
+            return pd.DataFrame(columns=CATALOGUE_FIELDS)
+        matches = pd.DataFrame(found).fillna("")
+        return matches[[f for f in CATALOGUE_FIELDS if f in matches.columns]]
+
+    def lookup(self, barcode):
+        matches = self.resolve([barcode])
+        return matches.iloc[0].to_dict() if not matches.empty else None
+
+    def stats(self):
+        # The catalogue only changes by import, so its size is counted once per import
+        # (from any process) rather than on every page rerun
+        conn = self._connect()
+        try:
+            imports = conn.execute(
+                "SELECT id, ts, name, supplier, rows FROM imports ORDER BY id DESC LIMIT 20"
+            ).fetchall()
+            latest = imports[0][0] if imports else None
+            with self._count_lock:
+                if self._count[0] != latest or latest is None:
+                    self._count = (latest, conn.execute("SELECT COUNT(*) FROM catalogue").fetchone()[0])
+                products = self._count[1]
+        finally:
+            conn.close()
+        return products, [row[1:] for row in imports]
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+def get_supplier_catalogue():
+    global _catalogue
+    with _catalogue_lock:
+        if _catalogue is None:
+            _catalogue = SupplierCatalogue()
+    return _catalogue
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import supplier master catalogues for barcode resolution.")
+    parser.add_argument("files", nargs="+", help="Catalogue files (CSV, TXT or XLSX)")
+    parser.add_argument("--supplier", help="Supplier name to stamp on every imported row")
+    args = parser.parse_args()
+    catalogue = get_supplier_catalogue()
+    for path in args.files:
+        result = catalogue.import_file(path, os.path.basename(path), args.supplier)
+        print(f"{path}: {result['rows']} rows in {result['seconds']:.1f}s")
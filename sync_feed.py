@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+
+from inventory_io import clean_barcode_series, row_hashes, state_path
+from inventory_writer import file_lock, file_signature
+from barcode_index import find_barcode_column, json_default
+
+SYNC_DB_NAME = "sync_feed.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    feed TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    source_mtime INTEGER,
+    source_size INTEGER,
+    fields TEXT
+);
+CREATE TABLE IF NOT EXISTS feed_rows (
+    feed TEXT NOT NULL,
+    barcode TEXT NOT NULL,
+    row_hash TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    data TEXT,
+    PRIMARY KEY (feed, barcode)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS feed_rows_version ON feed_rows (feed, version);
+"""
+
+
+class SyncFeed:
+    # Versioned change feed over one inventory file. Every real change to the file
+    # bumps the version once; rows remember the version they last changed in.
+    def __init__(self, db_path=None):
+        self.db_path = db_path or state_path(SYNC_DB_NAME)
+        conn = self._connect()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _feed_state(self, conn, feed):
+        return conn.execute(
+            "SELECT version, source_mtime, source_size, fields FROM feeds WHERE feed = ?", (feed,)
+        ).fetchone()
+
+    def refresh(self, source_path, loader):
+        feed = os.path.abspath(source_path)
+        signature = file_signature(source_path)
+        conn = self._connect()
+        try:
+            state = self._feed_state(conn, feed)
+            if state is not None and (state[1], state[2]) == signature:
+                return state[0]
+            with file_lock(self.db_path):
+                state = self._feed_state(conn, feed)
+                if state is not None and (state[1], state[2]) == signature:
+                    return state[0]
+                return self._ingest(conn, feed, loader(source_path), signature, state)
+        finally:
+            conn.close()
+
+    def _ingest(self, conn, feed, frame, signature, state):
+        col = find_barcode_column(frame.columns)
+        if col is None:
+            raise ValueError("Inventory has no barcode column to sync.")
+        codes = clean_barcode_series(frame.iloc[:, col])
+        keep = (codes.ne("") & ~codes.duplicated()).to_numpy()
+        frame, codes = frame[keep], codes[keep]
+        hashes = row_hashes(frame.astype(str)).map("{:016x}".format)
+        version = state[0] if state else 0
+        fields = [str(c) for c in frame.columns]
+        previous = dict(conn.execute(
+            "SELECT barcode, row_hash FROM feed_rows WHERE feed = ? AND deleted = 0", (feed,)
+        ).fetchall())
+        if state is not None and state[3] != json.dumps(fields):
+            changed = hashes.notna().to_numpy()  # columns changed: clients need every row again
+        else:
+            changed = hashes.ne(codes.map(previous)).to_numpy()
+        deleted = set(previous) - set(codes)
+        if state is not None and not changed.any() and not deleted:
+            conn.execute(
+                "UPDATE feeds SET source_mtime = ?, source_size = ? WHERE feed = ?", (*signature, feed)
+            )
+            conn.commit()
+            return version
+        version += 1
+        values = frame[changed].astype(object).where(frame[changed].notna(), None).to_numpy().tolist()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO feed_rows (feed, barcode, row_hash, version, deleted, data) VALUES (?, ?, ?, ?, 0, ?)",
+                (
+                    (feed, code, row_hash, version, json.dumps(row, default=json_default))
+                    for code, row_hash, row in zip(codes[changed], hashes[changed], values)
+                ),
+            )
+            conn.executemany(
+                "UPDATE feed_rows SET deleted = 1, data = NULL, version = ? WHERE feed = ? AND barcode = ?",
+                ((version, feed, code) for code in deleted),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO feeds (feed, version, source_mtime, source_size, fields) VALUES (?, ?, ?, ?, ?)",
+                (feed, version, *signature, json.dumps(fields)),
+            )
+        return version
+
+    def changes_since(self, source_path, since):
+        feed = os.path.abspath(source_path)
+        conn = self._connect()
+        try:
+            state = self._feed_state(conn, feed)
+            version = state[0] if state else 0
+            fields = json.loads(state[3]) if state else []
+            reset = since > version
+            if reset:
+                since = 0  # client is ahead of us (feed was rebuilt): send everything again
+            rows = conn.execute(
+                "SELECT barcode, deleted, data FROM feed_rows WHERE feed = ? AND version > ? ORDER BY version",
+                (feed, since),
+            ).fetchall()
+        finally:
+            conn.close()
+        changed = [json.loads(data) for _, is_deleted, data in rows if not is_deleted]
+        removed = [code for code, is_deleted, _ in rows if is_deleted and since > 0]
+        return {
+            "version": version,
+            "since": since,
+            "full": since == 0,
+            "reset": reset,
+            "fields": fields,
+            "changed": changed,
+            "deleted": removed,
+        }
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_sync_feed():
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = SyncFeed()
+    return _feed
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive_store
+import audit_log
+import inventory_io
+import inventory_writer
+import stock_analytics
+
+
+@pytest.fixture(autouse=True)
+def state_folder(tmp_path, monkeypatch):
+    # Databases and saved aggregates go to a scratch folder, never the repo's state/
+    folder = tmp_path / "state"
+    monkeypatch.setattr(inventory_io, "STATE_FOLDER", str(folder))
+    return folder
+
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    # This test's own writer, audit log, archive and analytics, wired to each other the
+    # way the get_...() functions wire the process-wide ones
+    writer = inventory_writer.InventoryWriter(max_latency=0.01)
+    audit = audit_log.AuditLog(str(tmp_path / "audit.db"))
+    archive = archive_store.ArchiveStore(str(tmp_path / "archive"))
+    analytics = stock_analytics.StockAnalytics()
+    writer.add_commit_listener(audit.checkpoint)
+    writer.add_commit_listener(archive.committed)
+    writer.add_commit_listener(analytics.committed)
+    monkeypatch.setattr(inventory_writer, "_writer", writer)
+    monkeypatch.setattr(audit_log, "_audit_log", audit)
+    monkeypatch.setattr(archive_store, "_store", archive)
+    monkeypatch.setattr(stock_analytics, "_analytics", analytics)
+    return {"writer": writer, "audit": audit, "archive": archive, "analytics": analytics}
+
+
+@pytest.fixture
+def inventory_file(tmp_path):
+    # Barcode 10 is on two frames, told apart by FRAMENUM
+    path = str(tmp_path / "inventory.csv")
+    pd.DataFrame({
+        "BARCODE": ["10", "10", "20", "30", "40"],
+        "FRAMENUM": ["F10A", "F10B", "F20", "F30", "F40"],
+        "MANUFACT": ["RAY", "RAY", "OAK", "OAK", ""],
+        "SUPPLIER": ["LUX", "LUX", "LUX", "SAF", "SAF"],
+        "F GROUP": ["SUN", "SUN", "OPT", "OPT", "OPT"],
+        "QUANTITY": ["3", "1", "2", "1", "0"],
+        "RRP": ["$100.00", "$100.00", "$250.00", "$80.50", ""],
+        "COST PRICE": ["40", "40", "120", "30", "10"],
+        "AVAILFROM": ["2024-01-15", "2024-01-15", "2025-06-01", "", "2023-03-02"],
+    }).to_csv(path, index=False)
+    return path
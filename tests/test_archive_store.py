@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+
+import archive_store
+from archive_store import DELETED, SOLD_OUT, ArchiveStore
+from inventory_io import load_inventory_file, prepare_for_save
+from inventory_writer import get_writer
+
+
+def rows(*barcodes):
+    return pd.DataFrame({"BARCODE": list(barcodes), "FRAMENUM": [f"F{code}" for code in barcodes], "RRP": "10"})
+
+
+def parts(store):
+    return sum(len(files) for files in store._read_manifest()["partitions"].values())
+
+
+def test_rows_queued_in_one_flush_are_one_part(inventory_file, services):
+    archive = services["archive"]
+    def delete(framenum):
+        # Queued from on_commit, as the pages do; the commit listener writes the flush's rows
+        gone = load_inventory_file(inventory_file).query("FRAMENUM == @framenum")
+        def mutation(current):
+            return prepare_for_save(current[current["FRAMENUM"].ne(framenum)])
+        return writer.submit(inventory_file, mutation, on_commit=lambda frame: archive.queue(gone, DELETED, inventory_file))
+    writer = get_writer()
+    writer.max_latency = 0.5
+    tickets = [delete(framenum) for framenum in ["F20", "F30", "F40"]]
+    for ticket in tickets:
+        ticket.wait()
+    assert parts(archive) == 1
+    assert sorted(archive.query()["FRAMENUM"]) == ["F20", "F30", "F40"]
+    assert load_inventory_file(inventory_file)["FRAMENUM"].tolist() == ["F10A", "F10B"]
+
+
+def test_nothing_is_archived_unless_the_write_commits(inventory_file, services):
+    archive = services["archive"]
+    archive.queue(rows("1"), DELETED, os.path.join(os.path.dirname(inventory_file), "other.csv"))
+    get_writer().apply(inventory_file, prepare_for_save)
+    assert archive.total_rows() == 0
+
+
+def test_compaction_merges_a_month_and_keeps_every_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_store, "COMPACT_AFTER", 1000)
+    store = ArchiveStore(str(tmp_path / "archive"))
+    for code in ["1", "2", "3"]:
+        store.append(rows(code), SOLD_OUT)
+    store.append(rows("4"), DELETED, ts=pd.Timestamp("2020-02-03").timestamp())
+    assert parts(store) == 4
+    month = pd.Timestamp.now().strftime("%Y-%m")
+    assert store.compact(month) == 3
+    assert parts(store) == 2
+    assert len(os.listdir(tmp_path / "archive" / f"month={month}")) == 1  # merged parts are deleted
+    assert sorted(store.query()["BARCODE"]) == ["1", "2", "3", "4"]
+    assert store.query(months=["2020-02"])["REASON"].tolist() == [DELETED]
+    assert store.partitions().set_index("MONTH").loc[month, "REASONS"] == f"{SOLD_OUT} 3"
+
+
+def test_a_crowded_month_is_compacted_in_the_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_store, "COMPACT_AFTER", 2)
+    store = ArchiveStore(str(tmp_path / "archive"))
+    for code in ["1", "2", "3"]:
+        store.append(rows(code), SOLD_OUT)
+    compactor = store._compactor
+    if compactor is not None:
+        compactor.join(5)
+    assert parts(store) == 1
+    assert sorted(store.query(barcode="2")["FRAMENUM"]) == ["F2"]
@@ -0,0 +1,107 @@
+import sqlite3
+import time
+
+import pandas as pd
+
+import audit_log
+from audit_log import ChangeSet, apply_change, row_record
+from inventory_io import load_inventory_file, prepare_for_save
+from inventory_writer import get_writer
+
+
+def saved(path):
+    # The file as the audit log stores frames: text, blanks as ""
+    return prepare_for_save(load_inventory_file(path)).reset_index(drop=True)
+
+
+def edit(path, framenum, **fields):
+    changes = ChangeSet(path)
+    def mutation(current):
+        row = current.index[current["FRAMENUM"].eq(framenum)][0]
+        before = row_record(current, row)
+        updated = current.copy()
+        for field, value in fields.items():
+            updated.at[row, field] = value
+        changes.add("edit", before["BARCODE"], before=before, after=row_record(updated, row), current=current)
+        return prepare_for_save(updated)
+    get_writer().apply(path, mutation, on_commit=changes.commit)
+
+
+def test_replay_finds_the_right_row_of_a_duplicated_barcode(inventory_file, services):
+    started = saved(inventory_file)
+    time.sleep(0.01)
+    edit(inventory_file, "F10B", QUANTITY="7", RRP="120")
+    middle = time.time()
+    time.sleep(0.01)
+    edit(inventory_file, "F10A", QUANTITY="0")
+    services["audit"].flush()
+    audit = services["audit"]
+    pd.testing.assert_frame_equal(audit.reconstruct(inventory_file, time.time()), saved(inventory_file))
+    at_middle = audit.reconstruct(inventory_file, middle)
+    assert at_middle["QUANTITY"].tolist() == ["3", "7", "2", "1", "0"]
+    assert at_middle["RRP"].tolist()[:2] == started["RRP"].tolist()[:1] + ["$120.00"]
+
+
+def test_bulk_change_sets_the_first_row_of_each_key():
+    frame = pd.DataFrame({"BARCODE": ["1", "1", "2", "2"], "FRAMENUM": ["a", "b", "c", "c"], "RRP": ["1", "2", "3", "4"]})
+    diff = {"RRP": {"barcode": ["1", "2", "9"], "framenum": ["b", "c", "z"], "before": ["2", "3", "0"], "after": ["20", "30", "90"]}}
+    replayed = apply_change(frame, "reprice", None, diff)
+    assert replayed["RRP"].tolist() == ["1", "20", "30", "4"]
+    assert frame["RRP"].tolist() == ["1", "2", "3", "4"]
+
+
+def test_bulk_record_is_one_row_in_the_log(inventory_file, services):
+    changes = ChangeSet(inventory_file, batch=("b1", "reprice", "Everything +10%"))
+    current = load_inventory_file(inventory_file)
+    changes.add_bulk("reprice", "RRP", current["BARCODE"], current["FRAMENUM"], current["RRP"], ["1"] * 5, current=current)
+    changes.commit()
+    services["audit"].flush()
+    history, total = services["audit"].query(file=inventory_file)
+    assert total == 1
+    assert history["changes"].tolist() == ["RRP: 5 rows"]
+    batches = services["audit"].batches(inventory_file)
+    assert batches[["id", "changes"]].values.tolist() == [["b1", 5]]
+
+
+def test_records_are_kept_while_the_database_refuses_writes(inventory_file, services, monkeypatch):
+    failures = []
+    real_connect = audit_log.connect
+    def flaky_connect(db_path):
+        if len(failures) < 2:
+            failures.append(db_path)
+            raise sqlite3.OperationalError("database is locked")
+        return real_connect(db_path)
+    monkeypatch.setattr(audit_log, "connect", flaky_connect)
+    monkeypatch.setattr(audit_log, "RETRY_DELAYS", [0.01])
+    edit(inventory_file, "F20", QUANTITY="5")
+    deadline = time.time() + 10
+    total = 0
+    while total == 0 and time.time() < deadline:
+        services["audit"].flush()  # returns early while the write is failing
+        if len(failures) == 2:
+            total = services["audit"].query(file=inventory_file)[1]
+    assert len(failures) == 2
+    assert total == 1
+
+
+def test_changes_another_process_logs_before_a_snapshot_are_replayed(inventory_file, services, monkeypatch):
+    monkeypatch.setattr(audit_log, "SNAPSHOT_EVERY", 1)
+    audit = services["audit"]
+    other = audit_log.AuditLog(audit.db_path)  # a second process on the same log
+    def change(log, current, framenum, **fields):
+        row = current.index[current["FRAMENUM"].eq(framenum)][0]
+        updated = current.copy()
+        for field, value in fields.items():
+            updated.at[row, field] = value
+        changes = ChangeSet(inventory_file, audit=log)
+        changes.add("edit", updated.at[row, "BARCODE"], before=row_record(current, row), after=row_record(updated, row),
+                    current=current)
+        changes.commit()
+        log.flush()
+        return updated
+    ours = change(audit, saved(inventory_file), "F20", QUANTITY="5")
+    # The other process saves after us, so its change is not in our frame, but it is logged before our checkpoint
+    theirs = change(other, ours, "F30", QUANTITY="9")
+    audit.checkpoint(inventory_file, ours)
+    audit.flush()
+    pd.testing.assert_frame_equal(audit.reconstruct(inventory_file, time.time()), theirs)
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from barcode_index import get_barcode_index
+from barcode_server import find_product_by_barcode, find_products_by_barcodes, read_inventory_workbook
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / "inventory.xlsx")
+    pd.DataFrame({
+        "Barcode": ["00123", 456, "AB-9"],
+        "Product Name": ["Leading zeros", "Numeric", "Text code"],
+    }).to_excel(path, index=False)
+    return path
+
+
+def test_server_matches_the_barcode_text_exactly(workbook):
+    assert find_product_by_barcode("00123", workbook)["Product Name"] == "Leading zeros"
+    assert find_product_by_barcode(" 00123 ", workbook)["Product Name"] == "Leading zeros"
+    assert find_product_by_barcode("123", workbook) is None
+    assert find_product_by_barcode("456", workbook)["Product Name"] == "Numeric"
+    assert find_product_by_barcode("0456", workbook) is None
+    assert find_product_by_barcode("AB-9", workbook)["Product Name"] == "Text code"
+
+
+def test_batch_lookup_agrees_with_single_lookup(workbook):
+    codes = ["00123", "123", "456", "0456", "AB-9", "", "missing"]
+    assert find_products_by_barcodes(codes, workbook) == [find_product_by_barcode(c, workbook) for c in codes]
+
+
+def test_index_matches_cleaned_barcodes_unless_exact(workbook):
+    index = get_barcode_index(workbook, read_inventory_workbook)
+    assert index.lookup("123")["Product Name"] == "Leading zeros"
+    assert index.lookup("456.0")["Product Name"] == "Numeric"
+    assert index.lookup("123", exact=True) is None
+    assert [row and row["Product Name"] for row in index.lookup_many(["123", "0456"])] == ["Leading zeros", "Numeric"]
+
+
+def test_a_rebuilt_index_replaces_and_closes_the_old_mapping(workbook):
+    index = get_barcode_index(workbook, read_inventory_workbook)
+    old_data = index._view[4]
+    pd.DataFrame({"Barcode": ["789"], "Product Name": ["Added"]}).to_excel(workbook, index=False)
+    assert get_barcode_index(workbook, read_inventory_workbook) is index
+    assert index.lookup("789")["Product Name"] == "Added"
+    assert index.lookup("456") is None
+    assert old_data.closed
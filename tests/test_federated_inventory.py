@@ -0,0 +1,22 @@
+import json
+import shutil
+
+import federated_inventory
+from federated_inventory import FederatedInventory, discover_store_files
+
+
+def test_a_store_list_replaces_the_naming_convention(tmp_path, state_folder, inventory_file, monkeypatch):
+    monkeypatch.setattr(federated_inventory, "BASE_DIR", str(tmp_path))
+    shutil.copy(inventory_file, tmp_path / "copy.csv")
+    state_folder.mkdir()
+    (state_folder / "stores.json").write_text(json.dumps({"Main St": "inventory.csv", "Mall": "copy.csv"}))
+    assert discover_store_files() == {"Main St": inventory_file, "Mall": str(tmp_path / "copy.csv")}
+
+
+def test_small_stores_load_without_a_pool(tmp_path, inventory_file):
+    shutil.copy(inventory_file, tmp_path / "copy.csv")
+    federated = FederatedInventory()
+    assert federated.refresh({"Main St": inventory_file, "Mall": str(tmp_path / "copy.csv")})
+    assert federated._pool is None
+    assert federated.combined_stock_value()["units"] == 14
+    assert federated.stores_for_barcode("20")["STORE"].tolist() == ["Main St", "Mall"]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from inventory_io import (
+    as_loaded, clean_barcode, clean_barcode_series, load_inventory_file, prepare_for_save, rename_aliases, source_column,
+)
+from inventory_writer import atomic_write_table
+
+
+def test_clean_barcode_series_agrees_with_clean_barcode():
+    values = [
+        "10236", "10236.0", " 10236 ", "010236", "+42", "-7", "1e5", "1.5", ".5", "9" * 18, "9" * 19, "12345678901234567890",
+        "9007199254740993", "9007199254740993.0", "ABC-12", "12AB", "0", "000", "", "nan", "1\u200b2", "\u00a077",
+        None, np.nan, 10236, 10236.0, 3.5,
+    ]
+    series = pd.Series(values, dtype=object)
+    assert clean_barcode_series(series).tolist() == [clean_barcode(v) for v in values]
+    as_text = pd.Series([v for v in values if isinstance(v, str)], dtype="str")
+    assert clean_barcode_series(as_text).tolist() == [clean_barcode(v) for v in as_text]
+
+
+def test_as_loaded_gives_what_loading_the_saved_file_gives(inventory_file):
+    saved = prepare_for_save(load_inventory_file(inventory_file))
+    atomic_write_table(saved, inventory_file)
+    pd.testing.assert_frame_equal(as_loaded(saved), load_inventory_file(inventory_file))
+
+
+def test_aliases_resolve_in_order():
+    frame = pd.DataFrame(columns=["BARCODE", "EXCOSTPR", "COSTPRICE", "FRAME NO."])
+    assert source_column(frame, "COST PRICE") == "COSTPRICE"
+    assert source_column(frame, "FRAMENUM") == "FRAME NO."
+    assert source_column(frame, "BARCODE") == "BARCODE"
+    assert source_column(frame, "SUPPLIER") is None
+    assert list(rename_aliases(frame).columns) == ["BARCODE", "EXCOSTPR", "COST PRICE", "FRAMENUM"]
@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from inventory_io import load_inventory_file, prepare_for_save
+from inventory_writer import InventoryWriter, atomic_write_table
+
+
+def set_quantity(framenum, quantity):
+    def mutation(current):
+        updated = current.copy()
+        updated.loc[updated["FRAMENUM"].eq(framenum), "QUANTITY"] = quantity
+        return prepare_for_save(updated)
+    return mutation
+
+
+def quantities(path):
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return dict(zip(frame["FRAMENUM"], frame["QUANTITY"]))
+
+
+def test_concurrent_saves_share_one_write(inventory_file):
+    writer = InventoryWriter(max_latency=0.5)
+    saves = []
+    def saver(frame, path):
+        saves.append(len(frame))
+        atomic_write_table(frame, path)
+    tickets = [
+        writer.submit(inventory_file, set_quantity(framenum, str(n)), saver=saver)
+        for n, framenum in enumerate(["F10A", "F10B", "F20", "F30"])
+    ]
+    frames = [ticket.wait() for ticket in tickets]
+    assert saves == [5]
+    assert all(frame is frames[0] for frame in frames)
+    assert quantities(inventory_file) == {"F10A": "0", "F10B": "1", "F20": "2", "F30": "3", "F40": "0"}
+    stats = writer.metrics()
+    assert (stats["files_written"], stats["mutations"], stats["failed_mutations"]) == (1, 4, 0)
+
+
+def test_failed_mutation_is_skipped_and_the_rest_commit(inventory_file):
+    writer = InventoryWriter(max_latency=0.5)
+    committed = []
+    def broken(current):
+        raise ValueError("no such product")
+    first = writer.submit(inventory_file, set_quantity("F20", "7"), on_commit=committed.append)
+    failed = writer.submit(inventory_file, broken, on_commit=committed.append)
+    last = writer.submit(inventory_file, set_quantity("F30", "8"), on_commit=committed.append)
+    first.wait()
+    last.wait()
+    with pytest.raises(ValueError, match="no such product"):
+        failed.wait()
+    assert len(committed) == 2
+    assert quantities(inventory_file)["F20"] == "7"
+    assert quantities(inventory_file)["F30"] == "8"
+    assert writer.metrics()["failed_mutations"] == 1
+
+
+def test_failed_save_fails_every_ticket_and_leaves_the_file(inventory_file):
+    writer = InventoryWriter()
+    before = quantities(inventory_file)
+    committed, listened = [], []
+    writer.add_commit_listener(lambda path, frame: listened.append(path))
+    def full_disk(frame, path):
+        raise OSError("No space left on device")
+    with pytest.raises(OSError, match="No space left"):
+        writer.apply(inventory_file, set_quantity("F20", "5"), saver=full_disk, on_commit=committed.append)
+    assert quantities(inventory_file) == before
+    assert committed == [] and listened == []
+    # The failed frame was not cached: the next write starts from the file on disk
+    writer.apply(inventory_file, set_quantity("F30", "6"))
+    assert quantities(inventory_file) == {**before, "F30": "6"}
+
+
+def test_commit_callbacks_run_before_apply_returns(inventory_file, caplog):
+    writer = InventoryWriter()
+    events = []
+    writer.add_commit_listener(lambda path, frame: events.append(("listener", frame["QUANTITY"].tolist())))
+    def on_commit(frame):
+        events.append(("on_commit", frame["QUANTITY"].tolist()))
+        raise RuntimeError("a failing callback does not undo the commit")
+    frame = writer.apply(inventory_file, set_quantity("F40", "4"), on_commit=on_commit)
+    assert [name for name, _ in events] == ["on_commit", "listener"]
+    assert events[0][1] == frame["QUANTITY"].tolist() == ["3", "1", "2", "1", "4"]
+    assert "a failing callback does not undo the commit" in caplog.text
+
+
+def test_outside_change_is_picked_up(inventory_file):
+    writer = InventoryWriter()
+    writer.apply(inventory_file, set_quantity("F10A", "2"))
+    outside = load_inventory_file(inventory_file)
+    outside.loc[outside["FRAMENUM"].eq("F20"), "QUANTITY"] = "11"
+    atomic_write_table(prepare_for_save(outside), inventory_file)
+    writer.apply(inventory_file, set_quantity("F30", "9"))
+    assert quantities(inventory_file) == {"F10A": "2", "F10B": "1", "F20": "11", "F30": "9", "F40": "0"}
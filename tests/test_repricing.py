@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from audit_log import ChangeSet, row_record
+from inventory_io import load_inventory_file, prepare_for_save
+from inventory_writer import get_writer
+from repricing import apply_repricing, reprice, repricing_batches, round_up_95, undo_repricing, validate_rules
+
+
+def prices(path):
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return dict(zip(frame["FRAMENUM"], frame["RRP"]))
+
+
+def test_round_up_95_leaves_unpriced_rows_alone():
+    rounded = round_up_95(pd.Series([12.95, 12.96, 0.5, 0.0, -3.0]))
+    assert rounded.iloc[:3].tolist() == [12.95, 13.95, 0.95]
+    assert rounded.iloc[3:].isna().all()
+
+
+def test_preview_only_lists_rows_that_change(inventory_file):
+    frame = load_inventory_file(inventory_file)
+    rules = validate_rules([
+        {"field": "SUPPLIER", "value": "lux", "method": "percent", "amount": 10},
+        {"field": "F GROUP", "value": "OPT", "method": "margin", "amount": 100},
+    ])
+    preview, skipped = reprice(frame, rules)
+    # LUX rows take the first rule even where F GROUP is OPT; the rest are priced at cost + 100%
+    assert preview["NEW RRP"].to_dict() == {0: "$110.00", 1: "$110.00", 2: "$275.00", 3: "$60.00", 4: "$20.00"}
+    assert skipped == 0
+
+
+def test_undo_restores_untouched_rows_and_counts_the_rest(inventory_file, services):
+    rules = validate_rules([{"field": "SUPPLIER", "value": "LUX", "method": "fixed", "amount": 5, "round_95": True}])
+    before = {**prices(inventory_file), "F40": "$0.00"}  # any save writes a blank RRP as $0.00
+    result = apply_repricing(inventory_file, rules)
+    assert result["changed"] == 3
+    assert prices(inventory_file) == {**before, "F10A": "$105.95", "F10B": "$105.95", "F20": "$255.95"}
+    changes = ChangeSet(inventory_file)
+    def manual_edit(current):
+        row = current.index[current["FRAMENUM"].eq("F10B")][0]
+        updated = current.copy()
+        updated.at[row, "RRP"] = "99"
+        changes.add("edit", "10", before=row_record(current, row), after=row_record(updated, row), current=current)
+        return prepare_for_save(updated)
+    get_writer().apply(inventory_file, manual_edit, on_commit=changes.commit)
+    services["audit"].flush()
+    batches = repricing_batches(inventory_file)
+    assert batches[["id", "kind", "changes"]].values.tolist() == [[result["batch"], "reprice", 3]]
+    undone = undo_repricing(inventory_file, result["batch"])
+    assert (undone["restored"], undone["conflicts"]) == (2, 1)
+    assert prices(inventory_file) == {**before, "F10B": "$99.00"}
+    services["audit"].flush()
+    with pytest.raises(LookupError):
+        undo_repricing(inventory_file, result["batch"])
+    history = services["audit"].reconstruct(inventory_file, pd.Timestamp.now().timestamp())
+    assert dict(zip(history["FRAMENUM"], history["RRP"])) == prices(inventory_file)
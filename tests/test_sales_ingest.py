@@ -0,0 +1,154 @@
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import barcode_server
+import sales_ingest
+from audit_log import ChangeSet
+from inventory_io import load_inventory_file, prepare_for_save
+from inventory_writer import atomic_write_table, get_writer
+from sales_ingest import APPLIED, PENDING, REVIEW, SalesIngestor, apply_deltas, sale_outcome
+
+
+def quantities(path):
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return dict(zip(frame["FRAMENUM"], frame["QUANTITY"]))
+
+
+@pytest.fixture
+def ingestor(tmp_path, services):
+    return SalesIngestor(str(tmp_path / "sales.db"))
+
+
+def test_a_key_is_applied_once(ingestor, inventory_file, services):
+    lines = [{"BARCODE": "10", "Quantity": 2}, {"BARCODE": "20.0", "Quantity": 1}, {"BARCODE": "999", "Quantity": 1}]
+    first = ingestor.ingest_records(lines, key="till-1", inventory_file=inventory_file)
+    again = ingestor.ingest_records(lines, key="till-1", inventory_file=inventory_file)
+    assert (first["duplicate"], first["matched"], first["unknown"]) == (False, 2, ["999"])
+    assert again["duplicate"] is True
+    # Duplicate barcodes only have their first row taken off
+    assert quantities(inventory_file) == {"F10A": "1", "F10B": "1", "F20": "1", "F30": "1", "F40": "0"}
+    services["audit"].flush()
+    history, total = services["audit"].query(file=inventory_file, action="sale")
+    assert (total, history["changes"].tolist()) == (1, ["QUANTITY: 2 rows"])  # one bulk record per batch
+
+
+def test_sold_out_rows_are_archived_once(ingestor, inventory_file, services):
+    result = ingestor.ingest_records([{"BARCODE": "30", "Quantity": 1}], key="till-2", inventory_file=inventory_file)
+    ingestor.ingest_records([{"BARCODE": "30", "Quantity": 1}], key="till-2", inventory_file=inventory_file)
+    assert result["archived"] == 1
+    assert "F30" not in quantities(inventory_file)
+    archived = services["archive"].query(barcode="30")
+    assert archived["FRAMENUM"].tolist() == ["F30"]
+    assert archived["REASON"].tolist() == ["sold out"]
+
+
+def test_unreadable_and_oversold_quantities_stay_for_review(ingestor, inventory_file, services):
+    frame = load_inventory_file(inventory_file)
+    frame.loc[frame["FRAMENUM"].eq("F20"), "QUANTITY"] = ""
+    frame.loc[frame["FRAMENUM"].eq("F30"), "QUANTITY"] = "one"
+    atomic_write_table(prepare_for_save(frame), inventory_file)
+    lines = [{"BARCODE": code, "Quantity": 2} for code in ["20", "30", "40"]]
+    result = ingestor.ingest_records(lines, key="till-4", inventory_file=inventory_file)
+    assert (result["matched"], result["unparsed"], result["oversold"], result["archived"]) == (1, ["20", "30"], ["40"], 0)
+    assert quantities(inventory_file) == {"F10A": "3", "F10B": "1", "F20": "", "F30": "one", "F40": "-2"}
+    assert services["archive"].total_rows() == 0
+
+
+def test_sale_replays_from_the_audit_log(ingestor, inventory_file, services):
+    ingestor.ingest_records([{"BARCODE": "10", "Quantity": 1}, {"BARCODE": "30", "Quantity": 1}], key="till-5",
+                            inventory_file=inventory_file)
+    services["audit"].flush()
+    replayed = services["audit"].reconstruct(inventory_file, time.time())
+    assert dict(zip(replayed["FRAMENUM"], replayed["QUANTITY"])) == quantities(inventory_file)
+    assert "F30" not in quantities(inventory_file)
+
+
+def test_a_failed_write_frees_the_key(ingestor, inventory_file, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError("inventory has no QUANTITY column")
+    monkeypatch.setattr(sales_ingest, "apply_deltas", broken)
+    with pytest.raises(ValueError):
+        ingestor.ingest_records([{"BARCODE": "20", "Quantity": 1}], key="till-3", inventory_file=inventory_file)
+    assert not ingestor.already_ingested("till-3")
+    monkeypatch.undo()
+    result = ingestor.ingest_records([{"BARCODE": "20", "Quantity": 1}], key="till-3", inventory_file=inventory_file)
+    assert result["matched"] == 1
+    assert quantities(inventory_file)["F20"] == "1"
+
+
+def test_sale_outcome():
+    frame = pd.DataFrame({"BARCODE": ["1", "2"], "FRAMENUM": ["a", "b"], "QUANTITY": ["4", "1"]})
+    assert sale_outcome(frame, [["1", "a", 5, 4, False], ["3", "c", 1, 0, True]]) == APPLIED
+    assert sale_outcome(frame, [["1", "a", 4, 3, False], ["2", "b", 1, 0, True]]) == PENDING
+    assert sale_outcome(frame, [["1", "a", 5, 4, False], ["2", "b", 1, 0, True]]) == REVIEW
+
+
+def test_recovery_settles_claims_left_by_a_crash(tmp_path, inventory_file, services):
+    db_path = str(tmp_path / "sales.db")
+    ingestor = SalesIngestor(db_path)
+    def crash(key, sold, saved):
+        # Everything apply() does up to the save, then the process stops
+        assert ingestor._claim(key, len(sold), inventory_file)
+        result = {}
+        current = load_inventory_file(inventory_file)
+        updated = apply_deltas(current, pd.Series(sold, dtype=float), ChangeSet(inventory_file), result)
+        ingestor._record_expected(key, result.pop("expected"))
+        if saved:
+            atomic_write_table(prepare_for_save(updated), inventory_file)
+    crash("saved", {"10": 1.0}, saved=True)
+    crash("lost", {"20": 1.0}, saved=False)
+    assert ingestor._claim("unstarted", 1, inventory_file)
+    crash("torn", {"30": 1.0, "40": 1.0}, saved=False)
+    torn = load_inventory_file(inventory_file)
+    torn.loc[torn["FRAMENUM"].eq("F30"), "QUANTITY"] = "0"  # half of that batch reached the file
+    atomic_write_table(prepare_for_save(torn), inventory_file)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE ingested SET ts = 0")
+    recovered = SalesIngestor(db_path).recovered
+    assert recovered == {"saved": APPLIED, "lost": "released", "unstarted": "released", "torn": REVIEW}
+    assert ingestor.already_ingested("saved") and ingestor.already_ingested("torn")
+    assert not ingestor.already_ingested("lost")
+    with sqlite3.connect(db_path) as conn:
+        assert dict(conn.execute("SELECT key, status FROM ingested")) == {"saved": APPLIED, "torn": REVIEW}
+
+
+def test_a_timed_out_batch_is_settled_by_its_retry(ingestor, inventory_file, monkeypatch):
+    monkeypatch.setattr(sales_ingest, "WRITE_TIMEOUT", 0.2)
+    gate = threading.Event()
+    blocker = get_writer().submit(inventory_file, lambda current: gate.wait(5) and current)
+    lines = [{"BARCODE": "20", "Quantity": 1}]
+    with pytest.raises(TimeoutError):
+        ingestor.ingest_records(lines, key="till-6", inventory_file=inventory_file)
+    with pytest.raises(TimeoutError):
+        ingestor.ingest_records(lines, key="till-6", inventory_file=inventory_file)  # still queued
+    gate.set()
+    blocker.wait()
+    assert ingestor.ingest_records(lines, key="till-6", inventory_file=inventory_file)["duplicate"] is True
+    assert ingestor.already_ingested("till-6")
+    assert quantities(inventory_file)["F20"] == "1"
+
+
+def test_a_retry_settles_a_stale_claim(tmp_path, ingestor, inventory_file):
+    lines = [{"BARCODE": "20", "Quantity": 1}]
+    assert ingestor._claim("till-7", 1, inventory_file)  # claimed by a process that then stopped
+    with pytest.raises(TimeoutError):
+        ingestor.ingest_records(lines, key="till-7", inventory_file=inventory_file)  # may still be running
+    with sqlite3.connect(str(tmp_path / "sales.db")) as conn:
+        conn.execute("UPDATE ingested SET ts = 0")
+    result = ingestor.ingest_records(lines, key="till-7", inventory_file=inventory_file)
+    assert (result["duplicate"], result["matched"]) == (False, 1)
+    assert quantities(inventory_file)["F20"] == "1"
+
+
+@pytest.mark.parametrize("error, status", [(TimeoutError("busy"), 503), (ValueError("bad file"), 400)])
+def test_sales_endpoint_status(monkeypatch, error, status):
+    class Ingestor:
+        def ingest_records(self, *args):
+            raise error
+    monkeypatch.setattr(barcode_server, "get_sales_ingestor", Ingestor)
+    response = barcode_server.app.test_client().post("/sales", json={"lines": []}, headers={"Idempotency-Key": "k"})
+    assert (response.status_code, response.get_json()) == (status, {"error": str(error)})
@@ -0,0 +1,77 @@
+import time
+
+import pandas as pd
+
+from inventory_io import load_inventory_file, prepare_for_save
+from inventory_writer import atomic_write_table, file_signature, get_writer
+from stock_analytics import FileAggregates, StockAnalytics
+
+
+def fresh_totals(frame):
+    aggregates = FileAggregates()
+    aggregates.update(frame, None)
+    return {dim: aggregates.table(dim) for dim in range(len(aggregates.totals))}
+
+
+def assert_totals_match(aggregates, frame):
+    for dim, expected in fresh_totals(frame).items():
+        pd.testing.assert_frame_equal(aggregates.table(dim).sort_index(), expected.sort_index())
+
+
+def saved_inventory(path):
+    # Rewritten the way any save writes it, so a blank RRP is already $0.00 before the test
+    atomic_write_table(prepare_for_save(load_inventory_file(path)), path)
+    return load_inventory_file(path)
+
+
+def test_ledger_only_parses_changed_rows(inventory_file):
+    frame = saved_inventory(inventory_file)
+    aggregates = FileAggregates()
+    assert aggregates.update(frame, None) == (5, 0)
+    changed = frame.copy()
+    changed.loc[changed["FRAMENUM"].eq("F20"), "QUANTITY"] = "5"
+    changed = pd.concat([changed.drop(index=3), changed.iloc[[0]]], ignore_index=True)  # F30 gone, F10A twice
+    assert aggregates.update(changed, None) == (2, 2)
+    assert_totals_match(aggregates, changed)
+    # The saved form ($ prices, blanks as "") is the same rows to the ledger
+    assert aggregates.update(prepare_for_save(changed), None) == (0, 0)
+
+
+def test_totals(inventory_file):
+    aggregates = FileAggregates()
+    aggregates.update(load_inventory_file(inventory_file), None)
+    suppliers = aggregates.table(0)  # SUPPLIER
+    assert suppliers.loc["LUX", ["PRODUCTS", "UNITS", "RETAIL VALUE", "COST VALUE"]].tolist() == [3, 6, 900.0, 400.0]
+    assert suppliers.loc["SAF", ["PRODUCTS", "UNITS", "UNPRICED"]].tolist() == [2, 1, 1]
+
+
+def test_report_catches_up_with_outside_changes(inventory_file, services):
+    analytics = services["analytics"]
+    saved_inventory(inventory_file)
+    first = analytics.report(inventory_file)
+    assert first["synced"] == (5, 0)
+    assert analytics.report(inventory_file)["synced"] is None
+    outside = load_inventory_file(inventory_file)
+    outside.loc[outside["FRAMENUM"].eq("F30"), "QUANTITY"] = "4"
+    atomic_write_table(prepare_for_save(outside), inventory_file)
+    report = analytics.report(inventory_file)
+    assert report["synced"] == (1, 1)
+    assert report["totals"]["UNITS"] == first["totals"]["UNITS"] + 3
+
+
+def test_writer_commits_keep_the_totals_current(inventory_file, services):
+    analytics = services["analytics"]
+    analytics.report(inventory_file)
+    def sell_out(current):
+        return prepare_for_save(current[current["FRAMENUM"].ne("F20")])
+    get_writer().apply(inventory_file, sell_out)
+    deadline = time.time() + 5
+    while analytics._aggregates(inventory_file).signature != file_signature(inventory_file) and time.time() < deadline:
+        time.sleep(0.01)
+    report = analytics.report(inventory_file)
+    assert report["synced"] is None
+    assert report["totals"]["PRODUCTS"] == 4
+    # Saved in state/, so a new process starts from the ledger rather than from nothing
+    restarted = StockAnalytics().report(inventory_file)
+    assert restarted["synced"] is None
+    assert restarted["missing"] == report["missing"] == ["FRAMETYPE"]